@@ -0,0 +1,96 @@
+################################################################################
+### mtrk project - Benchmark of the block partitioning of                    ###
+###                extractStepInformation against the former nested-loop     ###
+###                implementation (property check in blockPartitionCheck).   ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import os
+import random
+import sys
+import time
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+from mtrkToPulseqConverter import partitionOverlappingEvents
+
+def partitionOverlappingEventsLegacy(eventSignatureList):
+    """
+    Former block partitioning of extractStepInformation.
+
+    Args:
+        eventSignatureList (list): [eventIndex, startTime, endTime] of each 
+                                   event, sorted by start time.
+
+    Returns:
+        list: The indexes of the events of each block.
+    """
+    eventSignatureList = list(eventSignatureList)
+    eventIndexBlockList = []
+    while eventSignatureList != []:
+        signature = eventSignatureList[0]
+        overlappingList = [signature[0]]
+        eventSignatureList.remove(signature)
+        for otherSignature in eventSignatureList:
+            if signature[1] <= otherSignature[2] and \
+               signature[2] > otherSignature[1]:
+                overlappingList.append(otherSignature[0])
+        for overlappingEventIndex in overlappingList:
+            for signatureFound in eventSignatureList:
+                if signatureFound[0] == overlappingEventIndex:
+                    eventSignatureList.remove(signatureFound)
+        eventIndexBlockList.append(overlappingList)
+    return eventIndexBlockList
+
+def generateEventSignatures(numberOfEvents, randomGenerator):
+    """
+    Generates sorted event signatures like the ones of extractStepInformation:
+    events on a 10 us raster, zero-duration marks, equal start times and 
+    events ending exactly when others start.
+
+    Args:
+        numberOfEvents (int): Number of events of the block.
+        randomGenerator (random.Random): The random number generator.
+
+    Returns:
+        list: [eventIndex, startTime, endTime] of each event.
+    """
+    eventSignatureList = []
+    startTime = 0
+    for eventIndex in range(0, numberOfEvents):
+        startTime += randomGenerator.choice([0, 0, 10, 20, 100, 500]) * 1e-6
+        duration = randomGenerator.choice([0, 10, 100, 500, 1000, 3000]) * 1e-6
+        eventSignatureList.append([eventIndex, startTime, startTime + duration])
+    randomGenerator.shuffle(eventSignatureList)
+    return sorted(eventSignatureList, key=lambda x: x[1])
+
+def runBlockPartitionBenchmark(eventCounts = [10, 100, 1000, 10000]):
+    """
+    Compares the partitioning times of both implementations on synthetic 
+    blocks.
+
+    Args:
+        eventCounts (list): Numbers of events of the synthetic blocks.
+
+    Returns:
+        dict: Partitioning times in seconds indexed by number of events and 
+              implementation name.
+    """
+    randomGenerator = random.Random(1)
+    results = {}
+    for numberOfEvents in eventCounts:
+        eventSignatureList = generateEventSignatures(numberOfEvents, randomGenerator)
+        results[numberOfEvents] = {}
+        for implementationName, partition in [("legacy", partitionOverlappingEventsLegacy),
+                                              ("sweep", partitionOverlappingEvents)]:
+            startTime = time.perf_counter()
+            partition(eventSignatureList)
+            results[numberOfEvents][implementationName] = time.perf_counter() - startTime
+        print(f"{numberOfEvents:>6} events   legacy "
+              f"{results[numberOfEvents]['legacy']*1e3:10.2f} ms   sweep "
+              f"{results[numberOfEvents]['sweep']*1e3:8.2f} ms")
+    return results
+
+if __name__ == "__main__":
+    runBlockPartitionBenchmark()
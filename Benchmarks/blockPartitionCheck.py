@@ -0,0 +1,67 @@
+################################################################################
+### mtrk project - Property check of the block partitioning of               ###
+###                extractStepInformation against the former nested-loop     ###
+###                implementation (timings in blockPartitionBenchmark).      ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import os
+import random
+import sys
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+from mtrkToPulseqConverter import partitionOverlappingEvents
+from blockPartitionBenchmark import partitionOverlappingEventsLegacy, \
+                                    generateEventSignatures
+
+## [eventIndex, startTime, endTime] of the events and expected blocks
+partitionCases = [
+    ## No event
+    ([], []),
+    ## An event starting when the first one ends starts a new block
+    ([[0, 0, 10e-6], [1, 0, 5e-6], [2, 10e-6, 20e-6]], [[0, 1], [2]]),
+    ## A zero-duration mark is a block of its own
+    ([[0, 0, 0], [1, 0, 10e-6]], [[0], [1]]),
+    ## Events starting before the end of the first event join its block,
+    ## even if they end after it
+    ([[0, 0, 10e-6], [1, 5e-6, 30e-6], [2, 20e-6, 40e-6]], [[0, 1], [2]]),
+]
+
+def checkPartitionCases():
+    """
+    Checks the blocks of both implementations on hand-written events.
+    """
+    for eventSignatureList, expectedBlocks in partitionCases:
+        assert partitionOverlappingEvents(eventSignatureList) == expectedBlocks, \
+               f"Unexpected partition of {eventSignatureList}"
+        assert partitionOverlappingEventsLegacy(eventSignatureList) == expectedBlocks, \
+               f"Unexpected legacy partition of {eventSignatureList}"
+
+def checkPartitionProperty(numberOfCases = 5000, seed = 0):
+    """
+    Checks that both implementations give the same blocks on random events,
+    each event being in exactly one block.
+
+    Args:
+        numberOfCases (int): Number of random blocks to check.
+        seed (int): Seed of the random number generator.
+    """
+    randomGenerator = random.Random(seed)
+    for _ in range(0, numberOfCases):
+        eventSignatureList = generateEventSignatures(
+                                    randomGenerator.randint(0, 60), randomGenerator)
+        eventIndexBlockList = partitionOverlappingEvents(eventSignatureList)
+        assert eventIndexBlockList == partitionOverlappingEventsLegacy(eventSignatureList), \
+               f"Partitions differ for {eventSignatureList}"
+        assert sorted(eventIndex for block in eventIndexBlockList
+                      for eventIndex in block) == \
+               sorted(signature[0] for signature in eventSignatureList), \
+               f"Events lost or duplicated for {eventSignatureList}"
+
+if __name__ == "__main__":
+    checkPartitionCases()
+    checkPartitionProperty()
+    print("Block partition checks passed")
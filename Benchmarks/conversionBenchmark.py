@@ -0,0 +1,327 @@
+################################################################################
+### mtrk project - Benchmark suite of the mtrk to Pulseq conversion. Each    ###
+###                sequence is converted in its own process and the wall     ###
+###                time, peak memory and blocks per second of every stage    ###
+###                are recorded, and can be compared with a previous run.    ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+sys.path.append(os.path.join(repositoryPath, "ReadoutBlocks"))
+import pypulseq
+import mtrkToPulseqConverter
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlBinaryContainer import loadTextSdlFile
+from SDL_read_write.sdlWriter import writeSdlFile
+from sdlArrayLoadingBenchmark import getPeakMemory
+
+stageNames = ["load", "extractStepInformation", "executeLoopingStructure",
+              "check_timing", "write"]
+readoutTypes = ["cartesian", "radial", "spiral", "epi"]
+
+################################################################################
+## Benchmark sequences
+################################################################################
+
+def generateLineSequence(fileName, numberOfLines):
+    """
+    Writes gre2d with another number of phase encoding lines.
+
+    Args:
+        fileName (str): The path of the .mtrk file to create.
+        numberOfLines (int): Number of phase encoding lines.
+
+    Returns:
+        None
+    """
+    sequence_data = loadTextSdlFile(os.path.join(repositoryPath, "testData",
+                                                 "gre2d.mtrk"))
+    sequence_data.instructions["block_phaseEncoding"].steps[1].range = numberOfLines
+    sequence_data.equations["phaseencoding"].equation = \
+                 f"{0.3555*128/numberOfLines}*(ctr(2)-{numberOfLines/2 + 0.5})"
+    writeSdlFile(sequence_data, fileName)
+
+def generateSliceSequence(fileName, numberOfSlices):
+    """
+    Writes gre2d with its outer loop repeated, as for a multi-slice sequence.
+
+    Args:
+        fileName (str): The path of the .mtrk file to create.
+        numberOfSlices (int): Number of iterations of the outer loop.
+
+    Returns:
+        None
+    """
+    sequence_data = loadTextSdlFile(os.path.join(repositoryPath, "testData",
+                                                 "gre2d.mtrk"))
+    sequence_data.instructions["main"].steps[0].range = numberOfSlices
+    writeSdlFile(sequence_data, fileName)
+
+def generateReadoutSequence(fileName, readoutType, resolution = 64):
+    """
+    Writes gre2d with a readout block of ReadoutBlocks run after each TR.
+
+    Args:
+        fileName (str): The path of the .mtrk file to create.
+        readoutType (str): "cartesian", "radial", "spiral" or "epi".
+        resolution (int): The resolution of the readout.
+
+    Returns:
+        None
+    """
+    import mtrkReadoutBlockGenerator
+    sequence_data = loadTextSdlFile(os.path.join(repositoryPath, "testData",
+                                                 "gre2d.mtrk"))
+    ## The generators insert the readout next to a run_block step of a block
+    lineLoop = sequence_data.instructions["block_phaseEncoding"].steps[1]
+    sequence_data.instructions["block_line"] = Instruction(
+                                                 print_counter = "off",
+                                                 print_message = "line",
+                                                 steps = lineLoop.steps)
+    lineLoop.steps = [RunBlock(block = "block_line")]
+    addReadout = getattr(mtrkReadoutBlockGenerator, "add_" + readoutType + "_readout")
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        sequence_data = addReadout(sequence_data, "block_line", "block_TR",
+                                   sequence_data.infos.fov * 1e-2, resolution)
+        writeSdlFile(sequence_data, fileName)
+
+def generateBenchmarkSequences(directory, quick = False):
+    """
+    Lists the benchmark sequences, generating the synthetic ones.
+
+    Args:
+        directory (str): Directory of the generated files.
+        quick (bool): Only uses the smallest sizes.
+
+    Returns:
+        dict: The .mtrk file of each benchmark sequence, indexed by name.
+    """
+    sequenceFiles = {
+        "gre2d": os.path.join(repositoryPath, "testData", "gre2d.mtrk"),
+        "output_sdl_file": os.path.join(repositoryPath, "testData",
+                                        "output_sdl_file.mtrk"),
+        "miniflash": os.path.join(repositoryPath, "init_data", "miniflash.mtrk")}
+    lineCounts = [64, 256] if quick else [64, 256, 1024]
+    sliceCounts = [2] if quick else [2, 8, 32]
+    for numberOfLines in lineCounts:
+        fileName = os.path.join(directory, f"lines_{numberOfLines}.mtrk")
+        generateLineSequence(fileName, numberOfLines)
+        sequenceFiles[f"lines_{numberOfLines}"] = fileName
+    for numberOfSlices in sliceCounts:
+        fileName = os.path.join(directory, f"slices_{numberOfSlices}.mtrk")
+        generateSliceSequence(fileName, numberOfSlices)
+        sequenceFiles[f"slices_{numberOfSlices}"] = fileName
+    for readoutType in readoutTypes:
+        fileName = os.path.join(directory, f"readout_{readoutType}.mtrk")
+        generateReadoutSequence(fileName, readoutType)
+        sequenceFiles[f"readout_{readoutType}"] = fileName
+    return sequenceFiles
+
+################################################################################
+## Stage measurements
+################################################################################
+
+def resetPeakMemory():
+    """
+    Resets the peak resident memory of the current process (Linux only).
+
+    Returns:
+        bool: True if the peak could be reset.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as clearRefs:
+            clearRefs.write("5")
+        return True
+    except OSError:
+        return False
+
+class StageRecorder():
+    """
+    Wraps the functions of the conversion stages to record their wall time
+    and peak memory. Recursive calls are counted in the outermost call.
+    """
+    def __init__(self):
+        self.stages = {}
+        self.depth = {}
+        self.numberOfBlocks = 0
+        self.originals = []
+
+    def wrap(self, owner, attributeName, stageName):
+        function = getattr(owner, attributeName)
+        self.originals.append((owner, attributeName, function))
+        self.depth[stageName] = 0
+
+        def timedFunction(*args, **kwargs):
+            if self.depth[stageName] > 0:
+                return function(*args, **kwargs)
+            self.depth[stageName] += 1
+            resetPeakMemory()
+            startTime = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                stage = self.stages.setdefault(stageName, {"time": 0.0, "rss": 0.0})
+                stage["time"] += time.perf_counter() - startTime
+                stage["rss"] = max(stage["rss"], getPeakMemory())
+                self.depth[stageName] -= 1
+                if stageName == "write":
+                    self.numberOfBlocks = len(args[0].block_events)
+
+        setattr(owner, attributeName, timedFunction)
+
+    def __enter__(self):
+        self.wrap(mtrkToPulseqConverter, "readSequenceFile", "load")
+        self.wrap(mtrkToPulseqConverter, "extractStepInformation",
+                  "extractStepInformation")
+        self.wrap(mtrkToPulseqConverter, "executeLoopingStructure",
+                  "executeLoopingStructure")
+        self.wrap(pypulseq.Sequence, "check_timing", "check_timing")
+        self.wrap(pypulseq.Sequence, "write", "write")
+        return self
+
+    def __exit__(self, *exceptionInfo):
+        for owner, attributeName, function in reversed(self.originals):
+            setattr(owner, attributeName, function)
+
+def benchmarkInCurrentProcess(fileName):
+    """
+    Converts an SDL file and prints the measurements of each stage as JSON.
+
+    Args:
+        fileName (str): The path of the .mtrk file to convert.
+
+    Returns:
+        None
+    """
+    with tempfile.TemporaryDirectory() as temporaryDirectory, StageRecorder() as recorder:
+        startTime = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            mtrkToPulseqConverter.mtrkToPulseqConverter(
+                              fileName, os.path.join(temporaryDirectory, "out.seq"))
+        totalTime = time.perf_counter() - startTime
+    for stage in recorder.stages.values():
+        stage["blocksPerSecond"] = recorder.numberOfBlocks / stage["time"] \
+                                   if stage["time"] > 0 else None
+    print(json.dumps({"blocks": recorder.numberOfBlocks,
+                      "time": totalTime,
+                      "rss": getPeakMemory(),
+                      "stages": recorder.stages}))
+
+################################################################################
+## Suite
+################################################################################
+
+def compareResults(results, baseline, threshold = 1.2, minimumDifference = 0.01):
+    """
+    Lists the stages slower than in a previous run.
+
+    Args:
+        results (dict): The measurements of the current run.
+        baseline (dict): The measurements of a previous run.
+        threshold (float): Ratio of the times above which a stage is reported.
+        minimumDifference (float): Time difference in seconds below which a 
+                                   stage is not reported, to ignore noise.
+
+    Returns:
+        list: (sequence, stage, time ratio) of the slower stages.
+    """
+    regressions = []
+    for sequenceName, measurement in results["sequences"].items():
+        if sequenceName not in baseline["sequences"]:
+            continue
+        for stageName, stage in measurement["stages"].items():
+            baselineStage = baseline["sequences"][sequenceName]["stages"].get(stageName)
+            if baselineStage is None or baselineStage["time"] <= 0:
+                continue
+            ratio = stage["time"] / baselineStage["time"]
+            if ratio > threshold and \
+               stage["time"] - baselineStage["time"] > minimumDifference:
+                regressions.append((sequenceName, stageName, ratio))
+    return regressions
+
+def runConversionBenchmark(outputFile = None, baselineFile = None, quick = False,
+                           sequenceNames = None):
+    """
+    Converts every benchmark sequence in its own process and reports the
+    measurements of each stage.
+
+    Args:
+        outputFile (str): JSON file where the results are saved.
+        baselineFile (str): Results of a previous run to compare with.
+        quick (bool): Only uses the smallest synthetic sequences.
+        sequenceNames (list): Only runs these sequences.
+
+    Returns:
+        dict: The measurements indexed by sequence name.
+    """
+    results = {"python": platform.python_version(),
+               "pypulseq": pypulseq.__version__,
+               "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+               "sequences": {}}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        sequenceFiles = generateBenchmarkSequences(temporaryDirectory, quick)
+        for sequenceName, fileName in sequenceFiles.items():
+            if sequenceNames is not None and sequenceName not in sequenceNames:
+                continue
+            output = subprocess.run([sys.executable, os.path.abspath(__file__),
+                                     "--run", fileName],
+                                    capture_output = True, text = True,
+                                    check = True).stdout
+            measurement = json.loads(output.strip().splitlines()[-1])
+            results["sequences"][sequenceName] = measurement
+            print(f"{sequenceName} ({measurement['blocks']} blocks, "
+                  f"{measurement['time']:.2f} s, {measurement['rss']:.0f} MB)")
+            for stageName in stageNames:
+                stage = measurement["stages"].get(stageName)
+                if stage is None:
+                    continue
+                blocksPerSecond = f"{stage['blocksPerSecond']:12.0f}" \
+                                  if stage["blocksPerSecond"] else f"{'-':>12}"
+                print(f"    {stageName:<24} {stage['time']*1e3:10.1f} ms "
+                      f"{stage['rss']:8.1f} MB {blocksPerSecond} blocks/s")
+
+    if outputFile is not None:
+        with open(outputFile, "w") as resultFile:
+            json.dump(results, resultFile, indent = 4)
+    if baselineFile is not None:
+        with open(baselineFile) as resultFile:
+            baseline = json.load(resultFile)
+        regressions = compareResults(results, baseline)
+        for sequenceName, stageName, ratio in regressions:
+            print(f"REGRESSION {sequenceName} {stageName}: {ratio:.2f}x slower")
+        if regressions == []:
+            print("No stage slower than in the baseline.")
+    return results
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Benchmark of the mtrk to "
+                                                   "Pulseq conversion stages.")
+    parser.add_argument("--output", help = "JSON file where the results are saved.")
+    parser.add_argument("--baseline", help = "Results of a previous run to compare with.")
+    parser.add_argument("--quick", action = "store_true",
+                        help = "Only uses the smallest synthetic sequences.")
+    parser.add_argument("--sequences", nargs = "+", help = "Sequences to run.")
+    parser.add_argument("--run", help = argparse.SUPPRESS)
+    arguments = parser.parse_args()
+    if arguments.run is not None:
+        benchmarkInCurrentProcess(arguments.run)
+    else:
+        runConversionBenchmark(arguments.output, arguments.baseline,
+                               arguments.quick, arguments.sequences)
@@ -0,0 +1,103 @@
+################################################################################
+### mtrk project - Latency of the conversion server compared with a          ###
+###                conversion in a new Python process.                       ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+from conversionServer import ConversionServer
+
+def getSequenceVariants(fileName, numberOfVariants):
+    """
+    Creates variants of an SDL file differing by their sequence name, so
+    that the server cannot reuse the result of a previous request.
+
+    Args:
+        fileName (str): The SDL file.
+        numberOfVariants (int): The number of variants.
+
+    Returns:
+        list: The SDL file contents.
+    """
+    with open(fileName) as sdlFile:
+        sdlData = json.load(sdlFile)
+    variants = []
+    for variantIndex in range(numberOfVariants):
+        sdlData["infos"]["seqstring"] = "benchmark_" + str(variantIndex)
+        variants.append(json.dumps(sdlData).encode())
+    return variants
+
+def timeColdConversion(fileName):
+    """
+    Converts an SDL file in a new Python process, as done without the server.
+
+    Args:
+        fileName (str): The SDL file.
+
+    Returns:
+        float: The conversion time in seconds, imports included.
+    """
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        startTime = time.perf_counter()
+        subprocess.run([sys.executable, "-c",
+                        "from mtrkToPulseqConverter import mtrkToPulseqConverter; "
+                        f"mtrkToPulseqConverter({fileName!r}, "
+                        f"{os.path.join(temporaryDirectory, 'cold.seq')!r})"],
+                       cwd = repositoryPath, capture_output = True, check = True)
+        return time.perf_counter() - startTime
+
+def runConversionServerBenchmark(fileName, numberOfRequests = 16, numberOfClients = 4,
+                                 numberOfWorkers = 2):
+    """
+    Sends conversion requests to a local server from concurrent clients.
+
+    Args:
+        fileName (str): The SDL file to convert.
+        numberOfRequests (int): The number of requests.
+        numberOfClients (int): The number of concurrent clients.
+        numberOfWorkers (int): The number of worker processes of the server.
+
+    Returns:
+        dict: The latency statistics of the server.
+    """
+    server = ConversionServer(("127.0.0.1", 0), numberOfWorkers)
+    serverThread = threading.Thread(target = server.serve_forever, daemon = True)
+    serverThread.start()
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    variants = getSequenceVariants(fileName, numberOfRequests)
+
+    def runClient(clientIndex):
+        for sdlText in variants[clientIndex::numberOfClients]:
+            with urllib.request.urlopen(url + "/convert", data = sdlText) as response:
+                response.read()
+
+    clients = [threading.Thread(target = runClient, args = (clientIndex,))
+               for clientIndex in range(numberOfClients)]
+    for client in clients:
+        client.start()
+    for client in clients:
+        client.join()
+    with urllib.request.urlopen(url + "/stats") as response:
+        statistics = json.load(response)
+    server.shutdown()
+    server.server_close()
+    return statistics
+
+if __name__ == "__main__":
+    fileName = os.path.join(repositoryPath, "testData", "gre2d.mtrk")
+    print(f"Cold conversion in a new process: {timeColdConversion(fileName)*1e3:.0f} ms")
+    statistics = runConversionServerBenchmark(fileName)["/convert"]
+    print(f"Server ({statistics['requests']} requests, 4 clients): "
+          f"p50 {statistics['p50']:.0f} ms, p90 {statistics['p90']:.0f} ms, "
+          f"p99 {statistics['p99']:.0f} ms")
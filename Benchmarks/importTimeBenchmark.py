@@ -0,0 +1,87 @@
+################################################################################
+### mtrk project - Import time budget of the mtrk modules. Modules used to   ###
+###                load, modify and write SDL files must not import the      ###
+###                heavy plotting and conversion dependencies, which are     ###
+###                imported by the features using them.                      ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import os
+import subprocess
+import sys
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+## Dependencies that the light modules must not import
+heavyModules = ["matplotlib", "scipy", "sigpy", "pypulseq"]
+
+## Import time budget in seconds of the modules of the SDL load path
+importTimeBudgets = {"SDL_read_write.pydanticSDLHandler": 1.0,
+                     "SDL_read_write.sdlBinaryContainer": 1.0,
+                     "SDL_read_write.sdlWriter": 1.0,
+                     "modifySetting": 1.0,
+                     "sdlFileCreator": 1.0,
+                     "backendToUi": 1.0,
+                     "simpleWaveformGenerator": 1.0,
+                     "ReadoutBlocks.mtrkReadoutBlockGenerator": 1.0,
+                     "camrieConverter": 1.0}
+
+def measureImportTime(moduleName):
+    """
+    Imports a module in a new interpreter with python -X importtime.
+
+    Args:
+        moduleName (str): The name of the module to import.
+
+    Returns:
+        tuple: The total import time in seconds and the set of the top-level
+               packages imported.
+    """
+    environment = dict(os.environ)
+    environment["PYTHONPATH"] = os.pathsep.join(
+                                  [repositoryPath,
+                                   os.path.join(repositoryPath, "PrototypeFunctions"),
+                                   os.path.join(repositoryPath, "ReadoutBlocks")])
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c",
+                              "import " + moduleName],
+                             cwd = repositoryPath, env = environment,
+                             capture_output = True, text = True)
+    if process.returncode != 0:
+        raise ImportError(f"{moduleName} could not be imported:\n{process.stderr}")
+    importTime = 0
+    importedPackages = set()
+    for line in process.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        selfTime, _, name = line[len("import time:"):].split("|")
+        importTime += int(selfTime)
+        importedPackages.add(name.strip().split(".")[0])
+    return importTime * 1e-6, importedPackages
+
+def runImportTimeBenchmark():
+    """
+    Measures the import time of the light modules and checks them against
+    their budget and the list of heavy dependencies.
+
+    Returns:
+        list: The budget violations, empty if all the modules are light.
+    """
+    violations = []
+    for moduleName, budget in importTimeBudgets.items():
+        importTime, importedPackages = measureImportTime(moduleName)
+        heavyImports = sorted(set(heavyModules) & importedPackages)
+        print(f"{moduleName:45s} {importTime:6.3f} s  "
+              f"{', '.join(heavyImports) if heavyImports else ''}")
+        if importTime > budget:
+            violations.append(f"{moduleName} takes {importTime:.3f} s to import "
+                              f"(budget {budget:.3f} s).")
+        if heavyImports != []:
+            violations.append(f"{moduleName} imports {', '.join(heavyImports)}.")
+    return violations
+
+if __name__ == "__main__":
+    violations = runImportTimeBenchmark()
+    for violation in violations:
+        print(violation)
+    sys.exit(1 if violations != [] else 0)
@@ -0,0 +1,66 @@
+################################################################################
+### mtrk project - Benchmark of the SDL limits checker against the pypulseq  ###
+###                timing check run after the conversion.                    ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+import pypulseq
+from SDL_read_write.sdlBinaryContainer import loadTextSdlFile
+from SDL_read_write.sdlLimitsChecker import checkSequenceLimits
+from mtrkToPulseqConverter import fillSequence, getSystemLimits
+from streamingWriterBenchmark import generateLongSdlFile
+
+def runLimitsCheckerBenchmark(numberOfRepetitions = 16):
+    """
+    Times the SDL limits checker and the pypulseq timing check on a long
+    sequence.
+
+    Args:
+        numberOfRepetitions (int): Number of iterations of the outer loop.
+
+    Returns:
+        dict: Checking times in seconds indexed by checker name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, "long.mtrk")
+        generateLongSdlFile(fileName, numberOfRepetitions)
+        sequence_data = loadTextSdlFile(fileName)
+
+        startTime = time.perf_counter()
+        ok, error_report = checkSequenceLimits(sequence_data, getSystemLimits())
+        results["sdl"] = time.perf_counter() - startTime
+        print(f"SDL limits check     {results['sdl']*1e3:10.2f} ms   ok: {ok}")
+
+        ## The timing check needs the converted sequence
+        checkTiming = pypulseq.Sequence.check_timing
+        def timeCheckTiming(seq, *args, **kwargs):
+            startTime = time.perf_counter()
+            result = checkTiming(seq, *args, **kwargs)
+            results["pypulseq"] = time.perf_counter() - startTime
+            return result
+        pypulseq.Sequence.check_timing = timeCheckTiming
+        try:
+            startTime = time.perf_counter()
+            with contextlib.redirect_stdout(io.StringIO()):
+                fillSequence(sequence_data, plot = False, write_seq = False)
+            conversionTime = time.perf_counter() - startTime
+        finally:
+            pypulseq.Sequence.check_timing = checkTiming
+        print(f"pypulseq check_timing {results['pypulseq']*1e3:10.2f} ms "
+              f"(after a {conversionTime:.1f} s conversion)")
+    return results
+
+if __name__ == "__main__":
+    runLimitsCheckerBenchmark()
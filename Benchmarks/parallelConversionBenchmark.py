@@ -0,0 +1,51 @@
+################################################################################
+### mtrk project - Benchmark of the parallel Pulseq conversion against the   ###
+###                serial one, with a check that both give the same file.    ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import os
+import sys
+import tempfile
+import time
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+from mtrkToPulseqConverter import mtrkToPulseqConverter
+
+def runParallelConversionBenchmark(fileToConvert = os.path.join(repositoryPath,
+                                                   "testData", "output_sdl_file.mtrk"),
+                                   workerCounts = [1, 2, 4]):
+    """
+    Converts an SDL file with different numbers of workers and checks that
+    all the .seq files are identical to the serial one.
+
+    Args:
+        fileToConvert (str): The path of the .mtrk file to convert.
+        workerCounts (list): Numbers of workers to compare.
+
+    Returns:
+        dict: Conversion times in seconds indexed by number of workers.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        seqFiles = {}
+        for numberOfWorkers in workerCounts:
+            seqFiles[numberOfWorkers] = os.path.join(temporaryDirectory,
+                                                     f"workers{numberOfWorkers}.seq")
+            startTime = time.perf_counter()
+            mtrkToPulseqConverter(fileToConvert, seqFiles[numberOfWorkers],
+                                  numberOfWorkers = numberOfWorkers)
+            results[numberOfWorkers] = time.perf_counter() - startTime
+        with open(seqFiles[workerCounts[0]]) as seqFile:
+            referenceSeq = seqFile.read()
+        for numberOfWorkers in workerCounts:
+            with open(seqFiles[numberOfWorkers]) as seqFile:
+                identical = seqFile.read() == referenceSeq
+            print(f"{numberOfWorkers:>2} workers {results[numberOfWorkers]:8.2f} s"
+                  f"   identical: {identical}")
+    return results
+
+if __name__ == "__main__":
+    runParallelConversionBenchmark()
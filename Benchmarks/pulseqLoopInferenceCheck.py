@@ -0,0 +1,155 @@
+################################################################################
+### mtrk project - Check of the loop structure inferred by pulseqToMtrk: the ###
+###                SDL instructions are expanded block by block and compared ###
+###                with the blocks and gradient amplitudes of the .seq file. ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "PrototypeFunctions"))
+import numpy as np
+import pypulseq
+from pulseqToMtrk import readPulseq
+from pulseqLoopInference import inferSdlStructure, getCanonicalEventIDs, \
+                                gradientAxes, gyromagneticRatio, fitTolerance
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlEquationCompiler import EquationCompiler
+
+def expandInstruction(sequence_data, steps, equationCompiler, counters = None,
+                      expandedBlocks = None):
+    """
+    Lists the blocks run by SDL steps, with the objects of each block and
+    the amplitudes given by its equations.
+
+    Args:
+        sequence_data (PulseSequence): The inferred SDL sequence.
+        steps (list): The SDL steps to expand.
+        equationCompiler (EquationCompiler): The compiled equations.
+        counters (list): The values of ctr(1), ctr(2)... of the steps.
+        expandedBlocks (list): Result being filled.
+
+    Returns:
+        list: (objects, amplitudes, duration) of each block, the objects and
+              the amplitudes (Hz/m, None if constant) being indexed by
+              action or axis name and the duration being in us.
+    """
+    if counters is None:
+        counters = []
+    if expandedBlocks is None:
+        expandedBlocks = []
+    for step in steps:
+        if step.action == "loop":
+            for iteration in range(step.range):
+                expandInstruction(sequence_data, step.steps, equationCompiler,
+                                  counters + [iteration], expandedBlocks)
+        elif step.action == "run_block":
+            objects = {}
+            amplitudes = {}
+            duration = None
+            for blockStep in sequence_data.instructions[step.block].steps:
+                if blockStep.action == "grad":
+                    objects[blockStep.axis] = blockStep.object
+                    amplitudes[blockStep.axis] = None
+                    if "amplitude" in dict(blockStep):
+                        amplitudes[blockStep.axis] = gyromagneticRatio * \
+                            equationCompiler.evaluate(blockStep.amplitude.equation,
+                                                      {counterIndex + 1: counter for
+                                                       counterIndex, counter
+                                                       in enumerate(counters)})
+                elif blockStep.action in ["rf", "adc"]:
+                    objects[blockStep.action] = blockStep.object
+                elif blockStep.action == "mark":
+                    duration = blockStep.time
+            expandedBlocks.append((objects, amplitudes, duration))
+    return expandedBlocks
+
+def checkLoopInference(seqFileName):
+    """
+    Infers the SDL structure of a Pulseq file and checks that its expansion
+    gives back the events, durations and gradient amplitudes of each block.
+
+    Args:
+        seqFileName (str): The .seq file to check.
+
+    Returns:
+        PulseSequence: The inferred SDL sequence.
+    """
+    seq = pypulseq.Sequence()
+    with contextlib.redirect_stdout(io.StringIO()):
+        readPulseq(seq, seqFileName)
+    sequence_data = PulseSequence()
+    inferSdlStructure(seq, sequence_data)
+    rfIDs, gradientIDs, gradientShapes = getCanonicalEventIDs(seq)
+    expandedBlocks = expandInstruction(sequence_data, sequence_data.instructions["main"].steps,
+                                       EquationCompiler(sequence_data.equations))
+    ## The amplitudes are fitted with a tolerance relative to the largest one
+    amplitudeTolerance = fitTolerance * max([abs(data[0]) for data 
+                                             in seq.gradLibrary.data.values()], default = 0)
+    assert len(expandedBlocks) == len(seq.blockEvents), \
+           f"{len(expandedBlocks)} blocks expanded instead of {len(seq.blockEvents)}"
+    for blockIndex, (objects, amplitudes, duration) in enumerate(expandedBlocks):
+        blockEvents = seq.blockEvents[blockIndex]
+        expectedObjects = {}
+        if blockEvents[1] != 0:
+            expectedObjects["rf"] = f"rf_{rfIDs[blockEvents[1]]}"
+        if blockEvents[5] != 0:
+            expectedObjects["adc"] = f"adc_{blockEvents[5]}"
+        for column, axis in gradientAxes.items():
+            if blockEvents[column] == 0:
+                continue
+            objectID = int(objects.get(axis, "grad_0").split("_")[1])
+            assert gradientShapes.get(objectID) == gradientShapes[blockEvents[column]] and \
+                   gradientIDs[objectID] == objectID, \
+                   f"Block {blockIndex}: wrong {axis} gradient {objects.get(axis)}"
+            expectedObjects[axis] = objects[axis]
+            amplitude = seq.gradLibrary.data[blockEvents[column]][0]
+            expandedAmplitude = amplitudes[axis] if amplitudes[axis] is not None \
+                                else seq.gradLibrary.data[objectID][0]
+            assert abs(expandedAmplitude - amplitude) <= amplitudeTolerance, \
+                   f"Block {blockIndex}: {axis} amplitude {expandedAmplitude} " \
+                   f"instead of {amplitude}"
+        assert objects == expectedObjects, \
+               f"Block {blockIndex}: objects {objects} instead of {expectedObjects}"
+        if len(seq.blockDurations) > blockIndex:
+            assert duration == round(seq.blockDurations[blockIndex] * 1e6), \
+                   f"Block {blockIndex}: duration {duration} us"
+    return sequence_data
+
+def checkEmptySequence():
+    """
+    Checks that a Pulseq file without blocks gives an empty main
+    instruction.
+    """
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        seqFileName = os.path.join(temporaryDirectory, "empty.seq")
+        with open(seqFileName, "w") as seqFile:
+            seqFile.write("[VERSION]\nmajor 1\nminor 4\nrevision 1\n\n"
+                          "[DEFINITIONS]\nBlockDurationRaster 1e-05\n"
+                          "GradientRasterTime 1e-05\nRadiofrequencyRasterTime 1e-06\n"
+                          "AdcRasterTime 1e-07\n\n")
+        sequence_data = checkLoopInference(seqFileName)
+    assert list(sequence_data.instructions) == ["main"]
+    assert sequence_data.instructions["main"].steps == []
+    assert sequence_data.equations == {}
+
+if __name__ == "__main__":
+    testDataPath = os.path.join(repositoryPath, "testData")
+    checkLoopInference(os.path.join(testDataPath, "gre2d.seq"))
+    ## The converted file stores a new shape for each gradient event, its 768
+    ## blocks are a loop over 128 lines of 6 blocks
+    sequence_data = checkLoopInference(os.path.join(testDataPath, "output_sdl_file.seq"))
+    mainSteps = sequence_data.instructions["main"].steps
+    assert len(mainSteps) == 1 and mainSteps[0].action == "loop" and \
+           mainSteps[0].range == 128 and len(mainSteps[0].steps) == 6
+    assert [equation.equation for equation in sequence_data.equations.values()] == \
+           ["0.3555*ctr(1) - 22.9297"]
+    checkEmptySequence()
+    print("Loop inference checks passed")
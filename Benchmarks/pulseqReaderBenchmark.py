@@ -0,0 +1,153 @@
+################################################################################
+### mtrk project - Benchmark of the Pulseq file reader, of the block         ###
+###                periodicity analysis and of the loop structure inference  ###
+###                of pulseqToMtrk on a long sequence, and of the reading of ###
+###                a large [SHAPES] section.                                 ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+sys.path.append(os.path.join(repositoryPath, "PrototypeFunctions"))
+import numpy as np
+import pypulseq
+from mtrkToPulseqConverter import mtrkToPulseqConverter
+from pulseqToMtrk import readPulseq, evaluatePeriodicity
+from pulseqLoopInference import inferSdlStructure
+from SDL_read_write.pydanticSDLHandler import *
+from streamingWriterBenchmark import generateLongSdlFile
+
+def timePulseqReader(seqFileName, numberOfRuns = 3):
+    """
+    Reads a Pulseq file several times and keeps the fastest run.
+
+    Args:
+        seqFileName (str): The .seq file to read.
+        numberOfRuns (int): The number of runs.
+
+    Returns:
+        tuple: The reading time in seconds and the sequence read.
+    """
+    readingTime = float("inf")
+    for _ in range(numberOfRuns):
+        seq = pypulseq.Sequence()
+        startTime = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            readPulseq(seq, seqFileName)
+        readingTime = min(readingTime, time.perf_counter() - startTime)
+    return readingTime, seq
+
+def runPulseqReaderBenchmark(numberOfRepetitions = 64):
+    """
+    Converts a long SDL sequence to Pulseq and measures the reading time
+    of the .seq file, the time of the periodicity analysis of its blocks
+    and the time of the inference of its loop structure.
+
+    Args:
+        numberOfRepetitions (int): Number of iterations of the outer loop.
+
+    Returns:
+        dict: File size (MB), number of blocks, reading time (s), 
+              throughput (MB/s), periodicity analysis time (s) and loop
+              inference time (s).
+    """
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, "long.mtrk")
+        seqFileName = os.path.join(temporaryDirectory, "long.seq")
+        generateLongSdlFile(fileName, numberOfRepetitions)
+        with contextlib.redirect_stdout(io.StringIO()):
+            mtrkToPulseqConverter(fileName, seqFileName, streamingWriter = True)
+        fileSize = os.path.getsize(seqFileName) / 1e6
+        readingTime, seq = timePulseqReader(seqFileName)
+    startTime = time.perf_counter()
+    periodicEvents, variableEvents, _ = evaluatePeriodicity(seq.blockEvents)
+    periodicityTime = time.perf_counter() - startTime
+    sequence_data = PulseSequence(file = File(), settings = Settings(), infos = Info(),
+                                  instructions = {}, objects = {}, arrays = {},
+                                  equations = {})
+    startTime = time.perf_counter()
+    inferSdlStructure(seq, sequence_data)
+    inferenceTime = time.perf_counter() - startTime
+    results = {"size": fileSize, "blocks": len(seq.blockEvents),
+               "time": readingTime, "throughput": fileSize / readingTime,
+               "periodicityTime": periodicityTime, "inferenceTime": inferenceTime}
+    print(f"{results['size']:.1f} MB, {results['blocks']} blocks read in "
+          f"{results['time']*1e3:.0f} ms ({results['throughput']:.1f} MB/s)")
+    print(f"{len(periodicEvents)} periodic and {len(variableEvents)} variable events "
+          f"found in {results['periodicityTime']*1e3:.0f} ms")
+    print(f"{len(sequence_data.instructions)} instructions and "
+          f"{len(sequence_data.equations)} equations inferred in "
+          f"{results['inferenceTime']*1e3:.0f} ms")
+    return results
+
+def generateLargeShapeFile(seqFileName, numberOfShapes, numberOfSamples):
+    """
+    Writes a Pulseq file with a single RF block and a large [SHAPES] section
+    of random (incompressible) shapes, as in long spiral or diffusion files.
+
+    Args:
+        seqFileName (str): The .seq file to write.
+        numberOfShapes (int): The number of shapes.
+        numberOfSamples (int): The number of samples of each shape.
+    """
+    randomGenerator = np.random.default_rng(0)
+    with open(seqFileName, "w") as seqFile:
+        seqFile.write("[VERSION]\nmajor 1\nminor 4\nrevision 1\n\n"
+                      "[DEFINITIONS]\nBlockDurationRaster 1e-05\n"
+                      "GradientRasterTime 1e-05\nRadiofrequencyRasterTime 1e-06\n"
+                      "AdcRasterTime 1e-07\n\n"
+                      "[BLOCKS]\n1 100 1 0 0 0 0 0\n\n"
+                      "[RF]\n1 250 1 2 0 100 0 0\n\n[SHAPES]\n\n")
+        for shapeID in range(1, numberOfShapes + 1):
+            samples = randomGenerator.random(numberOfSamples)
+            seqFile.write(f"shape_id {shapeID}\nnum_samples {numberOfSamples}\n")
+            seqFile.write("\n".join(f"{sample:.9g}" for sample in samples) + "\n\n")
+
+def runShapeLibraryBenchmark(numberOfShapes = 400, numberOfSamples = 12000):
+    """
+    Reads a Pulseq file with a large [SHAPES] section and accesses the two
+    shapes of its RF pulse, measuring the time and the memory allocated.
+
+    Args:
+        numberOfShapes (int): The number of shapes.
+        numberOfSamples (int): The number of samples of each shape.
+
+    Returns:
+        dict: File size (MB), reading time (s), memory allocated after the
+              reading and after accessing the RF shapes (MB).
+    """
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        seqFileName = os.path.join(temporaryDirectory, "shapes.seq")
+        generateLargeShapeFile(seqFileName, numberOfShapes, numberOfSamples)
+        fileSize = os.path.getsize(seqFileName) / 1e6
+        readingTime, _ = timePulseqReader(seqFileName)
+        seq = pypulseq.Sequence()
+        tracemalloc.start()
+        with contextlib.redirect_stdout(io.StringIO()):
+            readPulseq(seq, seqFileName)
+        readingMemory = tracemalloc.get_traced_memory()[0] / 1e6
+        rfFormat = seq.rfLibrary.data[1]
+        rfShapes = [seq.shapeLibrary.data[rfFormat[1]], seq.shapeLibrary.data[rfFormat[2]]]
+        accessMemory = tracemalloc.get_traced_memory()[0] / 1e6
+        tracemalloc.stop()
+        del seq
+    results = {"size": fileSize, "time": readingTime,
+               "readingMemory": readingMemory, "accessMemory": accessMemory}
+    print(f"{results['size']:.1f} MB of shapes read in {results['time']*1e3:.0f} ms, "
+          f"{results['readingMemory']:.1f} MB allocated, {results['accessMemory']:.1f} MB "
+          f"after accessing {len(rfShapes)} shapes")
+    return results
+
+if __name__ == "__main__":
+    runPulseqReaderBenchmark()
+    runShapeLibraryBenchmark()
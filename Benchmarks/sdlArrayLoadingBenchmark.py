@@ -0,0 +1,124 @@
+################################################################################
+### mtrk project - Benchmark of the standard and NumPy-buffer loading of SDL ###
+###                files with large arrays and of their binary container     ###
+###                (load time and peak memory).                              ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlArrayLoader import loadSdlFileWithArrays
+from SDL_read_write.sdlBinaryContainer import convertMtrkToBinary, loadBinarySdlFile
+
+def generateLargeArraySdlFile(fileName, numberOfArrays = 8,
+                              samplesPerArray = 250000,
+                              templateFileName = os.path.join(repositoryPath,
+                                                              "testData",
+                                                              "gre2d.mtrk")):
+    """
+    Writes an SDL file with spiral-like arrays of many samples.
+
+    Args:
+        fileName (str): The path of the file to create.
+        numberOfArrays (int): The number of arrays to add.
+        samplesPerArray (int): The number of samples of each array.
+        templateFileName (str): The SDL file providing the other sections.
+
+    Returns:
+        None
+    """
+    with open(templateFileName) as sdlFile:
+        sdlData = json.load(sdlFile)
+    time = np.linspace(0, 1, samplesPerArray)
+    for arrayIndex in range(0, numberOfArrays):
+        waveform = time * np.cos(2 * np.pi * 16 * time + arrayIndex * np.pi / 2)
+        sdlData["arrays"]["spiral_" + str(arrayIndex)] = {
+                                           "encoding": "text",
+                                           "type": "float",
+                                           "size": samplesPerArray,
+                                           "data": waveform.tolist()}
+    with open(fileName, "w") as sdlFile:
+        json.dump(sdlData, sdlFile)
+
+def getPeakMemory():
+    """
+    Returns the peak resident memory of the current process. On Linux it is
+    read from /proc since ru_maxrss also counts the parent process before
+    the child was started.
+
+    Returns:
+        float: The peak RSS in MB.
+    """
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as statusFile:
+            for line in statusFile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def loadInCurrentProcess(fileName, loadingMode):
+    """
+    Loads an SDL file and prints the loading time and peak memory.
+
+    Args:
+        fileName (str): The path of the .mtrk file.
+        loadingMode (str): "standard", "float64", "float32" or "binary".
+
+    Returns:
+        None
+    """
+    startTime = time.perf_counter()
+    if loadingMode == "standard":
+        with open(fileName) as sdlFile:
+            sequence_data = PulseSequence(**json.load(sdlFile))
+    elif loadingMode == "binary":
+        sequence_data = loadBinarySdlFile(fileName + "b")
+    else:
+        sequence_data = loadSdlFileWithArrays(fileName, np.dtype(loadingMode))
+    loadingTime = time.perf_counter() - startTime
+    peakMemory = getPeakMemory()
+    print(json.dumps({"time": loadingTime, "rss": peakMemory}))
+
+def runSdlArrayLoadingBenchmark():
+    """
+    Compares the loading modes on a synthetic file, each mode being run in
+    its own process to measure its peak memory.
+
+    Returns:
+        dict: Loading time (s) and peak RSS (MB) indexed by loading mode.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, "large_arrays.mtrk")
+        generateLargeArraySdlFile(fileName)
+        fileSize = os.path.getsize(fileName) / 1024**2
+        convertMtrkToBinary(fileName, fileName + "b")
+        binaryFileSize = os.path.getsize(fileName + "b") / 1024**2
+        print(f"Synthetic file: {fileSize:.1f} MB, binary container: "
+              f"{binaryFileSize:.1f} MB")
+        for loadingMode in ["standard", "float64", "float32", "binary"]:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__),
+                                     fileName, loadingMode],
+                                    capture_output = True, text = True,
+                                    check = True).stdout
+            results[loadingMode] = json.loads(output.strip().splitlines()[-1])
+            print(f"{loadingMode:<10} {results[loadingMode]['time']*1e3:10.1f} ms"
+                  f" {results[loadingMode]['rss']:10.1f} MB peak RSS")
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) == 3:
+        loadInCurrentProcess(sys.argv[1], sys.argv[2])
+    else:
+        runSdlArrayLoadingBenchmark()
@@ -0,0 +1,104 @@
+################################################################################
+### mtrk project - Benchmark of the pydantic SDL loader on the test files    ###
+###                and on a synthetic file with many steps.                  ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import copy
+import glob
+import json
+import os
+import sys
+import tempfile
+import time
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+from SDL_read_write.pydanticSDLHandler import *
+
+def loadSdlFile(fileName):
+    """
+    Loads an SDL file into a PulseSequence object.
+
+    Args:
+        fileName (str): The path of the .mtrk file.
+
+    Returns:
+        PulseSequence: The loaded sequence.
+    """
+    with open(fileName) as sdlFile:
+        sdlData = json.load(sdlFile)
+    return PulseSequence(**sdlData)
+
+def generateSyntheticSdlFile(fileName, numberOfSteps,
+                             templateFileName = os.path.join(repositoryPath,
+                                                             "testData",
+                                                             "gre2d.mtrk")):
+    """
+    Writes an SDL file whose TR block is repeated until it holds the requested
+    number of steps.
+
+    Args:
+        fileName (str): The path of the file to create.
+        numberOfSteps (int): The number of steps in the generated block.
+        templateFileName (str): The SDL file providing the block to repeat.
+
+    Returns:
+        None
+    """
+    with open(templateFileName) as sdlFile:
+        sdlData = json.load(sdlFile)
+    templateSteps = sdlData["instructions"]["block_TR"]["steps"]
+    steps = []
+    while len(steps) < numberOfSteps:
+        steps.append(copy.deepcopy(templateSteps[len(steps) % len(templateSteps)]))
+    sdlData["instructions"]["block_TR"]["steps"] = steps
+    with open(fileName, "w") as sdlFile:
+        json.dump(sdlData, sdlFile)
+
+def timeLoading(fileName, repetitions = 5):
+    """
+    Measures the loading time of an SDL file.
+
+    Args:
+        fileName (str): The path of the .mtrk file.
+        repetitions (int): The number of measurements.
+
+    Returns:
+        float: The best loading time in seconds.
+    """
+    bestTime = float("inf")
+    for repetition in range(0, repetitions):
+        startTime = time.perf_counter()
+        loadSdlFile(fileName)
+        bestTime = min(bestTime, time.perf_counter() - startTime)
+    return bestTime
+
+def runSdlLoadingBenchmark(numberOfSteps = 100000):
+    """
+    Prints the loading times of the test files and of a synthetic file.
+
+    Args:
+        numberOfSteps (int): The number of steps of the synthetic file.
+
+    Returns:
+        dict: Loading times in seconds indexed by file name.
+    """
+    results = {}
+    testFiles = sorted(glob.glob(os.path.join(repositoryPath, "testData", "*.mtrk")))
+    for fileName in testFiles:
+        results[os.path.basename(fileName)] = timeLoading(fileName)
+
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        syntheticFileName = os.path.join(temporaryDirectory, "synthetic.mtrk")
+        generateSyntheticSdlFile(syntheticFileName, numberOfSteps)
+        results["synthetic_" + str(numberOfSteps) + "_steps"] = \
+                                     timeLoading(syntheticFileName, repetitions = 1)
+
+    for name, loadingTime in results.items():
+        print(f"{name:<32} {loadingTime*1e3:10.2f} ms")
+    return results
+
+if __name__ == "__main__":
+    runSdlLoadingBenchmark()
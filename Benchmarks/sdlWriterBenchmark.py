@@ -0,0 +1,90 @@
+################################################################################
+### mtrk project - Benchmark of the streaming SDL writer against the former  ###
+###                jsbeautifier-based writer, with a check that both give    ###
+###                the same file.                                            ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import glob
+import io
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import jsbeautifier
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlWriter import writeSdlToFileHandle
+from SDL_read_write.sdlBinaryContainer import loadTextSdlFile
+from sdlArrayLoadingBenchmark import generateLargeArraySdlFile
+
+def beautifySdl(sequence_data):
+    """
+    Formats a PulseSequence object like the former jsbeautifier-based writer.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to format.
+
+    Returns:
+        str: The content of the SDL file.
+    """
+    options = jsbeautifier.default_options()
+    options.indent_size = 4
+    data_to_print = jsbeautifier.beautify(\
+                     json.dumps(sequence_data.model_dump(mode="json")), options)
+    return re.sub(r'}, {', '},\n            {', data_to_print)
+
+def streamSdl(sequence_data):
+    """
+    Formats a PulseSequence object with the streaming writer.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to format.
+
+    Returns:
+        str: The content of the SDL file.
+    """
+    sdlText = io.StringIO()
+    writeSdlToFileHandle(sequence_data, sdlText)
+    return sdlText.getvalue()
+
+def runSdlWriterBenchmark():
+    """
+    Checks that both writers give the same files for the test files and
+    compares their speed on a synthetic 10 MB file.
+
+    Returns:
+        dict: Writing times in seconds indexed by writer name.
+    """
+    testFiles = sorted(glob.glob(os.path.join(repositoryPath, "testData", "*.mtrk")))
+    testFiles.append(os.path.join(repositoryPath, "init_data", "miniflash.mtrk"))
+    for fileName in testFiles:
+        sequence_data = loadTextSdlFile(fileName)
+        identical = streamSdl(sequence_data) == beautifySdl(sequence_data)
+        print(f"{os.path.basename(fileName):<32} identical: {identical}")
+
+    results = {}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, "large_arrays.mtrk")
+        generateLargeArraySdlFile(fileName, numberOfArrays = 2,
+                                  samplesPerArray = 250000)
+        print(f"Synthetic file: {os.path.getsize(fileName) / 1024**2:.1f} MB")
+        sequence_data = loadTextSdlFile(fileName)
+        sdlTexts = {}
+        for writerName, writer in [("jsbeautifier", beautifySdl),
+                                   ("streaming", streamSdl)]:
+            startTime = time.perf_counter()
+            sdlTexts[writerName] = writer(sequence_data)
+            results[writerName] = time.perf_counter() - startTime
+            print(f"{writerName:<14} {results[writerName]*1e3:10.1f} ms")
+        print(f"identical: {sdlTexts['streaming'] == sdlTexts['jsbeautifier']}")
+    return results
+
+if __name__ == "__main__":
+    runSdlWriterBenchmark()
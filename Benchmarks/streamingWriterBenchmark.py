@@ -0,0 +1,104 @@
+################################################################################
+### mtrk project - Benchmark of the streaming Pulseq writer against the      ###
+###                in-memory pypulseq sequence, with a check that both give  ###
+###                the same .seq file.                                       ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import contextlib
+import filecmp
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+repositoryPath = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(repositoryPath)
+sys.path.append(os.path.join(repositoryPath, "Benchmarks"))
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlBinaryContainer import loadTextSdlFile
+from SDL_read_write.sdlWriter import writeSdlFile
+from mtrkToPulseqConverter import mtrkToPulseqConverter
+from sdlArrayLoadingBenchmark import getPeakMemory
+
+def generateLongSdlFile(fileName, numberOfRepetitions = 64,
+                        templateFile = os.path.join(repositoryPath, "testData",
+                                                    "gre2d.mtrk")):
+    """
+    Writes a copy of an SDL file whose outer loop is repeated, for instance
+    to simulate averages or slices.
+
+    Args:
+        fileName (str): The path of the .mtrk file to create.
+        numberOfRepetitions (int): Number of iterations of the outer loop.
+        templateFile (str): The SDL file to repeat.
+
+    Returns:
+        None
+    """
+    sequence_data = loadTextSdlFile(templateFile)
+    for step in sequence_data.instructions["main"].steps:
+        if step.action == "loop":
+            step.range = numberOfRepetitions
+            break
+    writeSdlFile(sequence_data, fileName)
+
+def convertInCurrentProcess(fileName, outputFile, streamingWriter):
+    """
+    Converts an SDL file and prints the conversion time and peak memory as 
+    JSON.
+
+    Args:
+        fileName (str): The path of the .mtrk file to convert.
+        outputFile (str): The path of the .seq file to create.
+        streamingWriter (bool): Uses the streaming writer.
+
+    Returns:
+        None
+    """
+    startTime = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        mtrkToPulseqConverter(fileName, outputFile, streamingWriter = streamingWriter)
+    print(json.dumps({"time": time.perf_counter() - startTime,
+                      "rss": getPeakMemory()}))
+
+def runStreamingWriterBenchmark(numberOfRepetitions = 64):
+    """
+    Compares the in-memory and streaming writers on a long sequence, each of 
+    them being run in its own process to measure its peak memory.
+
+    Args:
+        numberOfRepetitions (int): Number of iterations of the outer loop.
+
+    Returns:
+        dict: Conversion time (s) and peak RSS (MB) indexed by writer name.
+    """
+    results = {}
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        fileName = os.path.join(temporaryDirectory, "long.mtrk")
+        generateLongSdlFile(fileName, numberOfRepetitions)
+        seqFiles = {}
+        for writerName in ["in-memory", "streaming"]:
+            seqFiles[writerName] = os.path.join(temporaryDirectory, writerName + ".seq")
+            output = subprocess.run([sys.executable, os.path.abspath(__file__),
+                                     fileName, seqFiles[writerName],
+                                     str(writerName == "streaming")],
+                                    capture_output = True, text = True,
+                                    check = True).stdout
+            results[writerName] = json.loads(output.strip().splitlines()[-1])
+            print(f"{writerName:<10} {results[writerName]['time']:8.2f} s"
+                  f" {results[writerName]['rss']:10.1f} MB peak RSS")
+        identical = filecmp.cmp(seqFiles["in-memory"], seqFiles["streaming"],
+                                shallow = False)
+        print(f"identical: {identical}")
+    return results
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4:
+        convertInCurrentProcess(sys.argv[1], sys.argv[2], sys.argv[3] == "True")
+    else:
+        runStreamingWriterBenchmark()
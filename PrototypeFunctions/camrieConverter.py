@@ -5,41 +5,63 @@
 ################################################################################  
 
 from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlEquationCompiler import EquationCompiler
+from conversionProfiler import activeProfiler, profiling
 import numpy as np
 from typing import List
-import matplotlib.pyplot as plt
 import struct
 import math
 from struct import pack, unpack
 import io
+import os
+import shutil
+import tempfile
 
-def camrieConverter(sequence_data):
+def camrieConverter(sequence_data, plotSequence = False, textDump = False, 
+                    profile = None):
     """
     Converts sequence data to the desired format using the CAMRIE conversion process.
 
     Args:
         sequence_data (str): The input sequence data in SDL format.
+        plotSequence (bool): Plots the chronogram of the whole sequence, which 
+                             requires holding the whole sequence in memory.
+        textDump (bool): Also writes the sequence as text in Sequence.txt, one
+                         value per line.
+        profile (bool or str): Reports the duration of each stage of the 
+                               conversion as JSON, to stderr (True) or to the 
+                               given file. None uses the MTRK_PROFILE 
+                               environment variable.
 
     Returns:
         None
     """
-    ### Retrieving useful data from SDL format
-    firstRawData = extractDataFromSDL(sequence_data)
-    sortedLoopRanges, sortedLoopBlocks = generateLoopStructure(firstRawData)
-
-    ### Plotting first sequence TR
-    firstFormattedTRData = formattingTR(firstRawData)
-    plotTR(firstFormattedTRData)
-
-    ### Generating the full sequence timing
-    sequenceTiming = generateSequenceTiming(sequence_data, sortedLoopRanges, 
-                                            sortedLoopBlocks)
-
-    ### Plotting whole sequence chronogram
-    plotChronogram(sequenceTiming)
-
-    ### Converting to PSUdoMRI format
-    convertToPsudomri(sequenceTiming)
+    with profiling("camrieConverter", profile) as profiler:
+        ### Retrieving useful data from SDL format
+        with profiler.stage("extraction"):
+            firstRawData = extractDataFromSDL(sequence_data)
+            sortedLoopRanges, sortedLoopBlocks = generateLoopStructure(firstRawData)
+
+        ### Plotting first sequence TR
+        with profiler.stage("plotTR"):
+            firstFormattedTRData = formattingTR(firstRawData)
+            plotTR(firstFormattedTRData)
+
+        ### Plotting whole sequence chronogram
+        if plotSequence:
+            with profiler.stage("plotChronogram"):
+                sequenceTiming = generateSequenceTiming(sequence_data, 
+                                                        sortedLoopRanges, 
+                                                        sortedLoopBlocks)
+                plotChronogram(sequenceTiming)
+
+        ### Converting to PSUdoMRI format one TR at a time
+        with profiler.stage("streamToPsudomri"):
+            totalNumberOfData = streamToPsudomri(sequence_data, sortedLoopRanges, 
+                                                 sortedLoopBlocks, 
+                                                 textFileName = 'Sequence.txt' 
+                                                                if textDump else None)
+        profiler.setCounter("samplesPerChannel", totalNumberOfData)
     
 
 def extractDataFromSDL(sequence_data, counter = 0):
@@ -144,87 +166,99 @@ def extractDataFromSDL(sequence_data, counter = 0):
             gradStartTimes, gradArrays, rfStartTimes, rfMagnArrays, 
             rfPhaseArrays, adcStartTimes, adcArrays]
 
-def formattingTR(rawData):
+def formattingTR(rawData, dtype = np.float32):
     """
     Formats the raw data into separate axes and applies interpolation to achieve a 10us raster time.
 
     Args:
         rawData (list): The raw data to be formatted.
+        dtype (numpy.dtype): The type of the gradient and ADC axes, float32 as
+                             in the .seqn file. The RF axes stay in float64 
+                             (see upsampleRfAxis).
 
     Returns:
         tuple: A tuple containing the following formatted data:
             - repetitionTimes (list): The repetition times.
-            - rfSampledMagnAxisTR (list): The sampled RF magnitude axis with a 10us raster time.
-            - rfSampledPhaseAxisTR (list): The sampled RF phase axis with a 10us raster time.
-            - zAxisTR (list): The z-axis gradients with a 10us raster time.
-            - yAxisTR (list): The y-axis gradients with a 10us raster time.
-            - xAxisTR (list): The x-axis gradients with a 10us raster time.
-            - adcAxisTR (list): The ADC axis with a 10us raster time.
+            - rfSampledMagnAxisTR (ndarray): The sampled RF magnitude axis with a 10us raster time.
+            - rfSampledPhaseAxisTR (ndarray): The sampled RF phase axis with a 10us raster time.
+            - zAxisTR (ndarray): The z-axis gradients with a 10us raster time.
+            - yAxisTR (ndarray): The y-axis gradients with a 10us raster time.
+            - xAxisTR (ndarray): The x-axis gradients with a 10us raster time.
+            - adcAxisTR (ndarray): The ADC axis with a 10us raster time.
     """
     loopCounters, loopRanges, loopBlocks, repetitionTimes, gradAxis, \
     gradStartTimes, gradArrays, rfStartTimes, rfMagnArrays, \
     rfPhaseArrays, adcStartTimes, adcArrays = decodeRawData(rawData)
 
     ### Separating each axis and formatting the data on a 10us raster time
-    xGradientsArrays = []
-    yGradientsArrays = []
-    zGradientsArrays = []
-    xGradientStartTimes = []
-    yGradientStartTimes = []
-    zGradientStartTimes = []
+    xAxisTR = np.zeros(int(repetitionTimes[0]/10), dtype=dtype) # Gradient raster time 10 us
+    yAxisTR = np.zeros(int(repetitionTimes[0]/10), dtype=dtype) # Gradient raster time 10 us
+    zAxisTR = np.zeros(int(repetitionTimes[0]/10), dtype=dtype) # Gradient raster time 10 us
+    gradientAxesTR = {'read': xAxisTR, 'phase': yAxisTR, 'slice': zAxisTR}
     for gradIndex in range(0, len(gradAxis)):
-        if gradAxis[gradIndex] == 'read':
-            xGradientStartTimes.append(gradStartTimes[gradIndex])
-            xGradientsArrays.append(gradArrays[gradIndex])
-        elif gradAxis[gradIndex] == 'phase':
-            yGradientStartTimes.append(gradStartTimes[gradIndex])
-            yGradientsArrays.append(gradArrays[gradIndex])
-        elif gradAxis[gradIndex] == 'slice':
-            zGradientStartTimes.append(gradStartTimes[gradIndex])
-            zGradientsArrays.append(gradArrays[gradIndex])
+        if gradAxis[gradIndex] in gradientAxesTR:
+            placeEventOnRaster(gradientAxesTR[gradAxis[gradIndex]], 
+                               gradStartTimes[gradIndex], gradArrays[gradIndex])
         else:
             print("Wrong axis name: " + str(gradAxis[gradIndex]))
 
-    xAxisTR = [0.0]*(int(repetitionTimes[0]/10)) # Gradient raster time 10 us
-    for xstartTimeIndex in range(0, len(xGradientStartTimes)):
-        for modifyIndex in range(int(xGradientStartTimes[xstartTimeIndex]/10), int(xGradientStartTimes[xstartTimeIndex]/10)+len(xGradientsArrays[xstartTimeIndex])):
-            xAxisTR[modifyIndex] = xGradientsArrays[xstartTimeIndex][modifyIndex - int(xGradientStartTimes[xstartTimeIndex]/10)]
-
-    yAxisTR = [0.0]*(int(repetitionTimes[0]/10)) # Gradient raster time 10 us
-    for ystartTimeIndex in range(0, len(yGradientStartTimes)):
-        for modifyIndex in range(int(yGradientStartTimes[ystartTimeIndex]/10), int(yGradientStartTimes[ystartTimeIndex]/10)+len(yGradientsArrays[ystartTimeIndex])):
-            yAxisTR[modifyIndex] = yGradientsArrays[ystartTimeIndex][modifyIndex - int(yGradientStartTimes[ystartTimeIndex]/10)]
-
-    zAxisTR = [0.0]*(int(repetitionTimes[0]/10)) # Gradient raster time 10 us
-    for zstartTimeIndex in range(0, len(zGradientStartTimes)):
-        for modifyIndex in range(int(zGradientStartTimes[zstartTimeIndex]/10), int(zGradientStartTimes[zstartTimeIndex]/10)+len(zGradientsArrays[zstartTimeIndex])):
-            zAxisTR[modifyIndex] = zGradientsArrays[zstartTimeIndex][modifyIndex - int(zGradientStartTimes[zstartTimeIndex]/10)]
-    
-    rfMagnAxisTR = [0.0]*(int(repetitionTimes[0]/20)) # RF raster time 20 us
-    rfPhaseAxisTR = [0.0]*(int(repetitionTimes[0]/20)) # RF raster time 20 us
+    rfMagnAxisTR = np.zeros(int(repetitionTimes[0]/20)) # RF raster time 20 us
+    rfPhaseAxisTR = np.zeros(int(repetitionTimes[0]/20)) # RF raster time 20 us
     for rfstartTimeIndex in range(0, len(rfStartTimes)):
-        for modifyIndex in range(int(rfStartTimes[rfstartTimeIndex]/10), int(rfStartTimes[rfstartTimeIndex]/10)+len(rfMagnArrays[rfstartTimeIndex])):
-            rfMagnAxisTR[modifyIndex] = rfMagnArrays[rfstartTimeIndex][modifyIndex - int(rfStartTimes[rfstartTimeIndex]/10)]
-            rfPhaseAxisTR[modifyIndex] = rfPhaseArrays[rfstartTimeIndex][modifyIndex - int(rfStartTimes[rfstartTimeIndex]/10)]
+        placeEventOnRaster(rfMagnAxisTR, rfStartTimes[rfstartTimeIndex], 
+                           rfMagnArrays[rfstartTimeIndex])
+        placeEventOnRaster(rfPhaseAxisTR, rfStartTimes[rfstartTimeIndex], 
+                           rfPhaseArrays[rfstartTimeIndex])
 
     # interpolating points to go from the 20us sampled RF pulse to a 10us sampled RF pulse
     rfTimeSampling = np.arange(0, repetitionTimes[0], 20)
-    rfSampledMagnAxisTR = list(np.arange(0.0, repetitionTimes[0], 10))
-    rfSampledPhaseAxisTR = list(np.arange(0.0, repetitionTimes[0], 10))
-    for rfSampledIndex in range(0, len(rfSampledMagnAxisTR)):
-        if rfSampledIndex%2 == 0:
-            rfSampledMagnAxisTR[rfSampledIndex] = rfMagnAxisTR[int(rfSampledIndex/2)]
-            rfSampledPhaseAxisTR[rfSampledIndex] = rfPhaseAxisTR[int(rfSampledIndex/2)]
-        else:
-            rfSampledMagnAxisTR[rfSampledIndex] = np.interp(rfSampledIndex*10, rfTimeSampling, rfMagnAxisTR)
-            rfSampledPhaseAxisTR[rfSampledIndex] = np.interp(rfSampledIndex*10, rfTimeSampling, rfPhaseAxisTR)
+    rfSampledTimes = np.arange(0.0, repetitionTimes[0], 10)
+    rfSampledMagnAxisTR = upsampleRfAxis(rfSampledTimes, rfTimeSampling, rfMagnAxisTR)
+    rfSampledPhaseAxisTR = upsampleRfAxis(rfSampledTimes, rfTimeSampling, rfPhaseAxisTR)
 
-    adcAxisTR = [0.0]*(int(repetitionTimes[0]/10)) # ADC raster time 10 us
+    adcAxisTR = np.zeros(int(repetitionTimes[0]/10), dtype=dtype) # ADC raster time 10 us
     for adcstartTimeIndex in range(0, len(adcStartTimes)):
-        for modifyIndex in range(int(adcStartTimes[adcstartTimeIndex]/10), int(adcStartTimes[adcstartTimeIndex]/10)+len(adcArrays[adcstartTimeIndex])):
-            adcAxisTR[modifyIndex] = adcArrays[adcstartTimeIndex][modifyIndex - int(adcStartTimes[adcstartTimeIndex]/10)]      
+        placeEventOnRaster(adcAxisTR, adcStartTimes[adcstartTimeIndex], 
+                           adcArrays[adcstartTimeIndex])
     return repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, zAxisTR, yAxisTR, xAxisTR, adcAxisTR
 
+def placeEventOnRaster(axisTR, startTime, eventArray):
+    """
+    Copies an event waveform in a raster array, starting at the raster index 
+    int(startTime/10).
+
+    Args:
+        axisTR (ndarray): The raster array of the channel (modified in place).
+        startTime (float): The start time of the event in us.
+        eventArray (list): The waveform of the event.
+
+    Returns:
+        None
+    """
+    startIndex = int(startTime/10)
+    if startIndex < 0 or startIndex + len(eventArray) > len(axisTR):
+        raise IndexError("Event starting at " + str(startTime) + 
+                         " us does not fit in the TR raster.")
+    axisTR[startIndex:startIndex + len(eventArray)] = eventArray
+
+def upsampleRfAxis(sampledTimes, rfTimeSampling, rfAxisTR):
+    """
+    Interpolates an RF axis sampled every 20us on the given times in a single 
+    call. Samples falling on the 20us raster are copied as they are.
+
+    Args:
+        sampledTimes (ndarray): The times of the output samples (10us raster).
+        rfTimeSampling (ndarray): The times of the RF samples (20us raster).
+        rfAxisTR (ndarray): The RF samples.
+
+    Returns:
+        ndarray: The upsampled RF axis, kept in double precision since the 
+                 phase goes through cos and sin before the float32 export.
+    """
+    rfSampledAxisTR = np.interp(sampledTimes, rfTimeSampling, rfAxisTR)
+    rfSampledAxisTR[0::2] = rfAxisTR[:len(rfSampledAxisTR[0::2])]
+    return rfSampledAxisTR
+
 def plotTR(formattedTRData):
     """
     Plots the TR (repetition time) data.
@@ -235,6 +269,7 @@ def plotTR(formattedTRData):
     Returns:
     None
     """
+    import matplotlib.pyplot as plt
     repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, zAxisTR, yAxisTR, \
     xAxisTR, adcAxisTR = decodeFormattedTRData(formattedTRData)
     
@@ -275,6 +310,141 @@ def generateLoopStructure(rawData):
     
     return sortedLoopRanges, sortedLoopBlocks
 
+def generateTRSchedule(sortedLoopRanges, sortedLoopBlocks):
+    """
+    Lists the counter values of the TRs played by the sequence, in order.
+    Each iteration of block_phaseEncoding with a non-zero counter repeats the 
+    TRs scheduled before the loop.
+
+    Args:
+        sortedLoopRanges (list): The sorted loop ranges.
+        sortedLoopBlocks (list): The sorted loop blocks.
+
+    Returns:
+        list: The counter value of each TR.
+    """
+    trCounters = []
+    for loopIndex in range(0, len(sortedLoopRanges)):
+        trCountersBeforeLoop = list(trCounters)
+        for counter in range(0, sortedLoopRanges[loopIndex]):
+            print(sortedLoopBlocks[loopIndex] + " iteration " + str(counter))
+            if(sortedLoopBlocks[loopIndex] == "block_TR"):
+                trCounters.append(counter)
+            elif(sortedLoopBlocks[loopIndex] == "block_phaseEncoding"):
+                if(counter != 0):
+                    trCounters += trCountersBeforeLoop
+                else:
+                    pass
+            else:
+                print("Block name " + sortedLoopBlocks[loopIndex] + " not recognized.")
+    return trCounters
+
+class TRRasterCache():
+    """
+    Incremental renderer of the TR rasters. The part of the TR that does not 
+    depend on the counter is extracted and formatted once; each TR then only 
+    writes the gradients whose amplitude is given by an equation, scaled from
+    their normalized waveform.
+    """
+    def __init__(self, sequence_data, dtype = np.float32):
+        self.equationCompiler = EquationCompiler(sequence_data.equations, 
+                                                 sequence_data.settings)
+        rawData = extractDataFromSDL(sequence_data, counter = 0)
+        loopCounters, loopRanges, loopBlocks, repetitionTimes, gradAxis, \
+        gradStartTimes, gradArrays, rfStartTimes, rfMagnArrays, \
+        rfPhaseArrays, adcStartTimes, adcArrays = decodeRawData(rawData)
+
+        ### Finding the gradients with an equation amplitude (same order as gradAxis)
+        self.variableGradients = []
+        variableGradientIndexes = {}
+        gradIndex = 0
+        for instruction in sequence_data.instructions:
+            for step in sequence_data.instructions[instruction].steps:
+                if step.action != "grad":
+                    continue
+                if 'amplitude' in dict(step) and \
+                   ('type', 'equation') in list(step.amplitude):
+                    gradObject = sequence_data.objects[step.object]
+                    variableGradientIndexes[gradIndex] = len(self.variableGradients)
+                    self.variableGradients.append(
+                        {"equation": dict(step.amplitude)['equation'],
+                         "axis": gradAxis[gradIndex],
+                         "normalizedArray": np.asarray(
+                             sequence_data.arrays[gradObject.array].data, dtype=float),
+                         "amplitude": gradObject.amplitude})
+                    gradArrays[gradIndex] = [0.0]*len(gradArrays[gradIndex])
+                gradIndex += 1
+
+        ### Formatting the invariant part, variable gradients being set to zero
+        self.invariantTR = formattingTR(rawData, dtype)
+
+        ### Keeping the raster indexes where each variable gradient is not 
+        ### overwritten by a later gradient on the same axis
+        axisLength = int(repetitionTimes[0]/10)
+        gradientOwners = {'read': np.full(axisLength, -1), 
+                          'phase': np.full(axisLength, -1), 
+                          'slice': np.full(axisLength, -1)}
+        for gradIndex in range(0, len(gradAxis)):
+            if gradAxis[gradIndex] in gradientOwners:
+                placeEventOnRaster(gradientOwners[gradAxis[gradIndex]], 
+                                   gradStartTimes[gradIndex], 
+                                   [gradIndex]*len(gradArrays[gradIndex]))
+        for gradIndex, variableIndex in variableGradientIndexes.items():
+            variableGradient = self.variableGradients[variableIndex]
+            startIndex = int(gradStartTimes[gradIndex]/10)
+            endIndex = startIndex + len(gradArrays[gradIndex])
+            if variableGradient["axis"] in gradientOwners:
+                visibleIndexes = np.nonzero(gradientOwners[variableGradient["axis"]]
+                                            [startIndex:endIndex] == gradIndex)[0]
+            else:
+                visibleIndexes = np.empty(0, dtype=int)
+            variableGradient["rasterIndexes"] = visibleIndexes + startIndex
+            variableGradient["normalizedArray"] = \
+                          variableGradient["normalizedArray"][visibleIndexes]
+
+    def render(self, counter):
+        """
+        Returns the formatted data of the TR for a counter value. The RF and 
+        ADC axes are shared between TRs and must not be modified.
+
+        Args:
+            counter (int): The counter value of the TR.
+
+        Returns:
+            tuple: The formatted TR data (see formattingTR).
+        """
+        repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, zAxisTR, yAxisTR, \
+        xAxisTR, adcAxisTR = decodeFormattedTRData(self.invariantTR)
+        gradientAxesTR = {'read': xAxisTR.copy(), 'phase': yAxisTR.copy(), 
+                          'slice': zAxisTR.copy()}
+        for variableGradient in self.variableGradients:
+            if variableGradient["axis"] not in gradientAxesTR:
+                continue
+            mulitplicator = self.equationCompiler.evaluate(
+                                      variableGradient["equation"], {1: counter})
+            gradientAxesTR[variableGradient["axis"]][variableGradient["rasterIndexes"]] = \
+                mulitplicator*variableGradient["normalizedArray"]*variableGradient["amplitude"]
+        return repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, \
+               gradientAxesTR['slice'], gradientAxesTR['phase'], \
+               gradientAxesTR['read'], adcAxisTR
+
+def iterateTRs(sequence_data, trCounters, dtype = np.float32):
+    """
+    Generates the formatted data of each TR, one TR at a time.
+
+    Args:
+        sequence_data (SequenceData): The SDL sequence data.
+        trCounters (list): The counter value of each TR.
+        dtype (numpy.dtype): The type of the gradient and ADC axes.
+
+    Yields:
+        tuple: The formatted TR data (see formattingTR).
+    """
+    trRasterCache = TRRasterCache(sequence_data, dtype)
+    for counter in trCounters:
+        activeProfiler().count("TRsRendered")
+        yield trRasterCache.render(counter)
+
 def generateSequenceTiming(sequence_data, sortedLoopRanges, sortedLoopBlocks):
     """
     Generate sequence timing based on the given sequence data, sorted loop ranges, and sorted loop blocks.
@@ -301,33 +471,22 @@ def generateSequenceTiming(sequence_data, sortedLoopRanges, sortedLoopBlocks):
     zAxis = []
     adcAxis = []
     timeAxis = []
-    for loopIndex in range(0, len(sortedLoopRanges)):
-        for counter in range(0, sortedLoopRanges[loopIndex]):
-            print(sortedLoopBlocks[loopIndex] + " iteration " + str(counter))
-            if(sortedLoopBlocks[loopIndex] == "block_TR"):
-                ### Separating each axis and formatting the data on a 10us raster time
-                rawData = extractDataFromSDL(sequence_data, counter = counter)
-                formattedTRData = formattingTR(rawData)
-                repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, zAxisTR, yAxisTR, \
-                xAxisTR, adcAxisTR = decodeFormattedTRData(formattedTRData)
-                rfMagnAxis += rfSampledMagnAxisTR
-                rfPhaseAxis += rfSampledPhaseAxisTR
-                xAxis += xAxisTR
-                yAxis += yAxisTR
-                zAxis += zAxisTR
-                adcAxis += adcAxisTR
-            elif(sortedLoopBlocks[loopIndex] == "block_phaseEncoding"):
-                if(counter != 0):
-                    rfMagnAxis += rfMagnAxis
-                    rfPhaseAxis += rfPhaseAxis
-                    xAxis += xAxis
-                    yAxis += yAxis
-                    zAxis += zAxis
-                    adcAxis += adcAxis
-                else:
-                    pass
-            else:
-                print("Block name " + sortedLoopBlocks[loopIndex] + " not recognized.")
+    trCounters = generateTRSchedule(sortedLoopRanges, sortedLoopBlocks)
+    for formattedTRData in iterateTRs(sequence_data, trCounters):
+        repetitionTimes, rfSampledMagnAxisTR, rfSampledPhaseAxisTR, zAxisTR, yAxisTR, \
+        xAxisTR, adcAxisTR = decodeFormattedTRData(formattedTRData)
+        rfMagnAxis.append(rfSampledMagnAxisTR)
+        rfPhaseAxis.append(rfSampledPhaseAxisTR)
+        xAxis.append(xAxisTR)
+        yAxis.append(yAxisTR)
+        zAxis.append(zAxisTR)
+        adcAxis.append(adcAxisTR)
+    rfMagnAxis = list(np.concatenate(rfMagnAxis)) if rfMagnAxis else []
+    rfPhaseAxis = list(np.concatenate(rfPhaseAxis)) if rfPhaseAxis else []
+    xAxis = list(np.concatenate(xAxis)) if xAxis else []
+    yAxis = list(np.concatenate(yAxis)) if yAxis else []
+    zAxis = list(np.concatenate(zAxis)) if zAxis else []
+    adcAxis = list(np.concatenate(adcAxis)) if adcAxis else []
     
     refLength = len(xAxis)
     if(len(rfMagnAxis) == refLength and len(rfPhaseAxis) == refLength and \
@@ -349,6 +508,7 @@ def plotChronogram(sequenceTiming):
     Returns:
     None
     """
+    import matplotlib.pyplot as plt
     rfMagnAxis, rfPhaseAxis, xAxis, yAxis, zAxis, adcAxis, timeAxis = \
     decodeSequenceTiming(sequenceTiming)
 
@@ -413,6 +573,111 @@ def convertToPsudomri(sequenceTiming):
     dumpToTextFile(dataToDump)
     dumpToBinaryFile(dataToDump)
 
+def streamToPsudomri(sequence_data, sortedLoopRanges, sortedLoopBlocks, 
+                     fileName = 'Sequence.seqn', textFileName = None):
+    """
+    Converts the sequence to a binary PSudoMRI file one TR at a time. Each 
+    channel is appended to its own temporary file with ndarray.tofile and the
+    .seqn file is assembled at the end, once the number of samples is known,
+    so that the memory used is bounded by one TR. The text dump, if any, is
+    streamed the same way.
+
+    Args:
+        sequence_data (SequenceData): The SDL sequence data.
+        sortedLoopRanges (list): The sorted loop ranges.
+        sortedLoopBlocks (list): The sorted loop blocks.
+        fileName (str): The path of the .seqn file to create.
+        textFileName (str): The path of the text file to create (same values
+                            as the .seqn file, one per line), None to skip it.
+
+    Returns:
+        int: The number of samples per channel (totalNumberOfData).
+    """
+    nbOfTransmitCoils = 1 # TO DO: Extract info from SDL?
+    numberOfReceiveCoils = 1 # TO DO: Extract info from SDL?
+    channelNames = ["adc", "rf", "x", "y", "z"]
+    trCounters = generateTRSchedule(sortedLoopRanges, sortedLoopBlocks)
+    outputDirectory = os.path.dirname(os.path.abspath(fileName))
+    with tempfile.TemporaryDirectory(dir = outputDirectory) as spillDirectory:
+        spillFiles = {channelName: open(os.path.join(spillDirectory, channelName), 'wb')
+                      for channelName in channelNames}
+        textSpillFiles = {channelName: open(os.path.join(spillDirectory, channelName + '.txt'), 
+                                            'w')
+                          for channelName in channelNames} if textFileName else {}
+        totalNumberOfData = 0
+        try:
+            ## The text dump prints the values before their float32 rounding
+            for formattedTRData in iterateTRs(sequence_data, trCounters, 
+                                              np.float64 if textFileName else np.float32):
+                repetitionTimes, rfMagnAxisTR, rfPhaseAxisTR, zAxisTR, yAxisTR, \
+                xAxisTR, adcAxisTR = decodeFormattedTRData(formattedTRData)
+                refLength = len(xAxisTR)
+                if(len(rfMagnAxisTR) != refLength or len(rfPhaseAxisTR) != refLength or \
+                   len(yAxisTR) != refLength or len(zAxisTR) != refLength or \
+                   len(adcAxisTR) != refLength):
+                    raise ValueError("Mismatch between axis lengths.")
+                # For each time step, RF provides real, imaginary, and offset parts
+                realRf = rfMagnAxisTR*np.cos(rfPhaseAxisTR)
+                imaginaryRf = rfMagnAxisTR*np.sin(rfPhaseAxisTR)
+                combinedRf = np.zeros((refLength, 3), dtype=np.float32)
+                combinedRf[:, 0] = realRf
+                combinedRf[:, 1] = imaginaryRf
+                np.asarray(adcAxisTR, dtype=np.float32).tofile(spillFiles["adc"])
+                combinedRf.tofile(spillFiles["rf"])
+                np.asarray(xAxisTR, dtype=np.float32).tofile(spillFiles["x"])
+                np.asarray(yAxisTR, dtype=np.float32).tofile(spillFiles["y"])
+                np.asarray(zAxisTR, dtype=np.float32).tofile(spillFiles["z"])
+                if textSpillFiles:
+                    ## The ADC windows are integer ones on a float zero background
+                    textSpillFiles["adc"].writelines("1\n" if value == 1 else f"{value}\n" 
+                                                     for value in np.asarray(adcAxisTR, dtype=np.float64).tolist())
+                    textSpillFiles["rf"].writelines(f"{real}\n{imaginary}\n0\n" for real, imaginary 
+                                                    in zip(np.asarray(realRf, dtype=np.float64).tolist(), 
+                                                           np.asarray(imaginaryRf, dtype=np.float64).tolist()))
+                    writeTextValues(textSpillFiles["x"], xAxisTR)
+                    writeTextValues(textSpillFiles["y"], yAxisTR)
+                    writeTextValues(textSpillFiles["z"], zAxisTR)
+                totalNumberOfData += refLength
+        finally:
+            for spillFile in list(spillFiles.values()) + list(textSpillFiles.values()):
+                spillFile.close()
+
+        ### Assembling the sections now that the counts are known
+        with open(fileName, 'wb') as sequenceFile:
+            sectionHeader = np.array([totalNumberOfData, 1], dtype=np.float32)
+            np.array([totalNumberOfData, nbOfTransmitCoils, numberOfReceiveCoils, 
+                      totalNumberOfData, 1], dtype=np.float32).tofile(sequenceFile)
+            timeChunk = np.full(min(totalNumberOfData, 1 << 20), 0.01, dtype=np.float32)
+            for chunkStart in range(0, totalNumberOfData, len(timeChunk)):
+                timeChunk[:totalNumberOfData - chunkStart].tofile(sequenceFile)
+            for channelName in channelNames:
+                sectionHeader.tofile(sequenceFile)
+                with open(os.path.join(spillDirectory, channelName), 'rb') as spillFile:
+                    shutil.copyfileobj(spillFile, sequenceFile, 1 << 20)
+
+        ### Same layout in the text file, as written by dumpToTextFile
+        if textFileName:
+            with open(textFileName, 'w') as textSequenceFile:
+                textSequenceFile.write(f"{totalNumberOfData}\n{nbOfTransmitCoils}\n"
+                                       f"{numberOfReceiveCoils}\n{totalNumberOfData}\n1\n")
+                for chunkStart in range(0, totalNumberOfData, 1 << 20):
+                    textSequenceFile.write("0.01\n" * min(totalNumberOfData - chunkStart, 1 << 20))
+                for channelName in channelNames:
+                    textSequenceFile.write(f"{totalNumberOfData}\n1\n")
+                    with open(os.path.join(spillDirectory, channelName + '.txt')) as spillFile:
+                        shutil.copyfileobj(spillFile, textSequenceFile, 1 << 20)
+    return totalNumberOfData
+
+def writeTextValues(textFile, values):
+    """
+    Appends values to a text file, one per line.
+
+    Args:
+        textFile (file): The text file.
+        values (ndarray): The values.
+    """
+    textFile.writelines(f"{value}\n" for value in np.asarray(values, dtype=np.float64).tolist())
+
 def dumpToTextFile(dataToDump):
     """
     Dump the given data to a text file.
@@ -0,0 +1,735 @@
+################################################################################
+### mtrk project - Inference of the SDL loop structure of a Pulseq sequence. ###
+###                Repeated block subsequences are collapsed into nested     ###
+###                loops and the gradient amplitudes changing from one       ###
+###                iteration to the next are fitted to ctr(i) equations.     ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import bisect
+import numpy as np
+
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlEquationCompiler import CompiledEquation
+
+## Columns of the x, y and z gradients in the block events and their SDL axes
+gradientAxes = {2: "read", 3: "phase", 4: "slice"}
+## Gyromagnetic ratio converting mT/m to Hz/m
+gyromagneticRatio = 42577
+## Longest repeated subsequence searched, in number of symbols
+defaultMaximumPeriod = 1024
+## Tolerance of the amplitude fits relative to the largest amplitude, the
+## .seq files store the amplitudes with 6 significant digits
+fitTolerance = 1e-5
+## Minimum number of iterations of a sinusoidal fit, which has 4 parameters
+minimumSinusoidIterations = 6
+
+################################################################################
+## Block templates
+################################################################################
+
+def getCanonicalEventIDs(seq):
+    """
+    Maps the RF and gradient IDs of the libraries to the first ID with the
+    same content, the shape IDs of the events being replaced by the first
+    shape ID with the same samples. The Pulseq files written by the 
+    converter store a new shape for each gradient event, even when its 
+    samples are already in the library.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+
+    Returns:
+        tuple: The canonical ID of each RF ID and of each gradient ID 
+               (arrays indexed by ID, 0 meaning no event) and the shape of
+               each gradient ID, with canonical shape IDs.
+    """
+    canonicalShapeIDs = {0: 0}
+    firstShapeIDs = {}
+    for shapeID in seq.shapeLibrary.data:
+        samples = np.asarray(seq.shapeLibrary.data[shapeID], dtype = np.float64).tobytes()
+        canonicalShapeIDs[shapeID] = firstShapeIDs.setdefault(samples, shapeID)
+
+    ## The magnitude, phase and (from version 1.4) time shape IDs follow the
+    ## amplitude, the RF delay being the third last field
+    rfIDs = np.zeros(max(seq.rfLibrary.data, default = 0) + 1, dtype = np.int64)
+    firstRfIDs = {}
+    for rfID, data in seq.rfLibrary.data.items():
+        shapeIDs = tuple(canonicalShapeIDs.get(shapeID, shapeID) for shapeID in data[1:-3])
+        rfIDs[rfID] = firstRfIDs.setdefault((data[0], shapeIDs) + tuple(data[-3:]), rfID)
+
+    ## Arbitrary gradients store the shape ID and (from version 1.4) the
+    ## time shape ID between the amplitude and the delay
+    gradientIDs = np.zeros(max(seq.gradLibrary.data, default = 0) + 1, dtype = np.int64)
+    firstGradientIDs = {}
+    gradientShapes = {}
+    for gradID, data in seq.gradLibrary.data.items():
+        gradientType = seq.gradLibrary.type[gradID]
+        shape = tuple(data[1:])
+        if gradientType == "g":
+            shape = tuple(canonicalShapeIDs.get(shapeID, shapeID) 
+                          for shapeID in data[1:-1]) + (data[-1],)
+        gradientShapes[gradID] = (gradientType, shape)
+        gradientIDs[gradID] = firstGradientIDs.setdefault((gradientType, data[0]) + shape,
+                                                          gradID)
+    return rfIDs, gradientIDs, gradientShapes
+
+def getBlockTemplates(seq, concreteGradients = frozenset(), canonicalEventIDs = None):
+    """
+    Replaces each block by a template ID. Blocks differing only by the
+    amplitudes of their gradients share the same template, the events being
+    compared by content rather than by library ID.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        concreteGradients (set): (column, shape) of the gradients whose
+                                 amplitude is part of the template.
+        canonicalEventIDs (tuple): The result of getCanonicalEventIDs,
+                                   computed if not given.
+
+    Returns:
+        tuple: The template ID of each block, the gradient amplitudes (Hz/m)
+               of each block (one column per gradient axis) and the shape of
+               each gradient ID.
+    """
+    if canonicalEventIDs is None:
+        canonicalEventIDs = getCanonicalEventIDs(seq)
+    rfIDs, _, gradientShapes = canonicalEventIDs
+    blockTable = np.asarray(seq.blockEvents, dtype = np.int64).reshape(len(seq.blockEvents), -1)
+    numberOfGradients = max(seq.gradLibrary.data, default = 0) + 1
+    gradientAmplitudes = np.zeros(numberOfGradients)
+    for gradID, data in seq.gradLibrary.data.items():
+        gradientAmplitudes[gradID] = data[0]
+
+    gradientColumns = list(gradientAxes)
+    keyTable = blockTable.copy()
+    ## Block durations in ns, the first column of the block events being unused
+    if len(seq.blockDurations) == len(blockTable):
+        keyTable[:, 0] = np.rint(np.asarray(seq.blockDurations) * 1e9)
+    keyTable[:, 1] = rfIDs[blockTable[:, 1]]
+    shapeKeys = {}
+    for column in gradientColumns:
+        gradientKeys = np.zeros(numberOfGradients, dtype = np.int64)
+        for gradID, shape in gradientShapes.items():
+            shapeKey = shape + (gradientAmplitudes[gradID],) \
+                       if (column, shape) in concreteGradients else shape
+            gradientKeys[gradID] = shapeKeys.setdefault(shapeKey, len(shapeKeys) + 1)
+        keyTable[:, column] = gradientKeys[blockTable[:, column]]
+    ## Sorting the rows with lexsort is much faster than np.unique(axis = 0)
+    order = np.lexsort(keyTable.T[::-1])
+    sortedKeys = keyTable[order]
+    isNewTemplate = np.any(sortedKeys[1:] != sortedKeys[:-1], axis = 1)
+    templateIDs = np.empty(len(keyTable), dtype = np.int64)
+    templateIDs[order] = np.concatenate([[0], np.cumsum(isNewTemplate)])
+    return templateIDs, gradientAmplitudes[blockTable[:, gradientColumns]], \
+           gradientShapes
+
+################################################################################
+## Loop structure
+################################################################################
+
+def findRepeats(symbols, period, symbolOffsets = None, boundaries = None):
+    """
+    Finds the runs of at least two consecutive copies of a subsequence of
+    a given length, in a single comparison of the sequence with itself
+    shifted by this length. Runs are cut at the boundaries they cannot
+    cross.
+
+    Args:
+        symbols (ndarray): The sequence of symbols.
+        period (int): The length of the repeated subsequence.
+        symbolOffsets (ndarray): The first block of each symbol, followed
+                                 by the number of blocks.
+        boundaries (dict): The blocks where a loop iteration must start,
+                           mapped to the body length (in blocks) up to
+                           which loops cannot contain them at all.
+
+    Returns:
+        list: The start index and number of copies of each run, the runs
+              not overlapping.
+    """
+    ## Symbols starting at a boundary and the body length of the boundary
+    boundarySymbols = {}
+    for boundary, maximumBodyLength in (boundaries or {}).items():
+        symbolIndex = np.searchsorted(symbolOffsets, boundary)
+        if symbolIndex < len(symbols) and symbolOffsets[symbolIndex] == boundary:
+            boundarySymbols[int(symbolIndex)] = maximumBodyLength
+    boundaryIndexes = sorted(boundarySymbols)
+
+    matches = np.concatenate(([False], symbols[period:] == symbols[:-period], [False]))
+    edges = np.flatnonzero(matches[1:] != matches[:-1])
+    repeats = []
+    regionEnd = 0
+    for start, end in zip(edges[::2].tolist(), edges[1::2].tolist()):
+        start = max(start, regionEnd)
+        while end - start >= period:
+            numberOfCopies = (end - start) // period + 1
+            regionStop = start + numberOfCopies * period
+            if boundaryIndexes != []:
+                bodyLength = symbolOffsets[start + period] - symbolOffsets[start]
+                firstBoundary = bisect.bisect_right(boundaryIndexes, start)
+                for boundarySymbol in boundaryIndexes[firstBoundary:]:
+                    if boundarySymbol >= regionStop:
+                        break
+                    if bodyLength <= boundarySymbols[boundarySymbol] or \
+                       (boundarySymbol - start) % period != 0:
+                        numberOfCopies = (boundarySymbol - start) // period
+                        regionStop = boundarySymbol
+                        break
+            if numberOfCopies >= 2:
+                repeats.append((start, numberOfCopies))
+                regionEnd = start + numberOfCopies * period
+            start = regionStop
+    return repeats
+
+def inferLoopStructure(templateIDs, maximumPeriod = defaultMaximumPeriod, boundaries = None):
+    """
+    Compresses the sequence of block templates into a grammar of nested
+    loops. The repeated subsequences are collapsed from the shortest to the
+    longest, each collapsed loop becoming a new symbol, so that the loops
+    over lines found first are repeated as a whole by the loops over slices
+    or averages.
+
+    Args:
+        templateIDs (ndarray): The template ID of each block.
+        maximumPeriod (int): The longest repeated subsequence searched.
+        boundaries (dict): See findRepeats.
+
+    Returns:
+        tuple: The top-level symbols and the loop symbols, mapped to their
+               number of iterations and their body symbols. Symbols that are
+               not loops are template IDs.
+    """
+    symbols = np.asarray(templateIDs, dtype = np.int64)
+    symbolLengths = np.ones(len(symbols), dtype = np.int64)
+    nextSymbol = int(symbols.max()) + 1 if len(symbols) > 0 else 0
+    loops = {}
+    loopSymbols = {}
+    period = 1
+    while period <= min(maximumPeriod, len(symbols) // 2):
+        symbolOffsets = np.concatenate(([0], np.cumsum(symbolLengths)))
+        repeats = findRepeats(symbols, period, symbolOffsets, boundaries)
+        if repeats == []:
+            period += 1
+            continue
+        pieces = []
+        lengthPieces = []
+        position = 0
+        for start, numberOfCopies in repeats:
+            loop = (numberOfCopies, tuple(symbols[start:start + period].tolist()))
+            if loop not in loopSymbols:
+                loopSymbols[loop] = nextSymbol
+                loops[nextSymbol] = loop
+                nextSymbol += 1
+            pieces += [symbols[position:start], [loopSymbols[loop]]]
+            lengthPieces += [symbolLengths[position:start],
+                             [numberOfCopies * symbolLengths[start:start + period].sum()]]
+            position = start + numberOfCopies * period
+        pieces.append(symbols[position:])
+        lengthPieces.append(symbolLengths[position:])
+        symbols = np.concatenate(pieces)
+        symbolLengths = np.concatenate(lengthPieces).astype(np.int64)
+        ## Collapsing may have created new repeats of any length
+        period = 1
+    return symbols.tolist(), loops
+
+def buildLoopTree(symbols, loops):
+    """
+    Expands the grammar into a tree with one node per SDL step, loops
+    found several times being duplicated so that each of them can have
+    its own amplitude equations.
+
+    Args:
+        symbols (list): The symbols of the steps.
+        loops (dict): The loops of the grammar (see inferLoopStructure).
+
+    Returns:
+        list: The nodes of the steps, either {"template", "length"} or
+              {"range", "steps", "length"}, length being the number of
+              blocks.
+    """
+    steps = []
+    for symbol in symbols:
+        if symbol in loops:
+            numberOfIterations, body = loops[symbol]
+            bodySteps = buildLoopTree(body, loops)
+            steps.append({"range": numberOfIterations, "steps": bodySteps,
+                          "length": numberOfIterations *
+                                    sum(step["length"] for step in bodySteps)})
+        else:
+            steps.append({"template": symbol, "length": 1})
+    return steps
+
+def collectExecutions(steps, blockOffsets = None, counters = None, 
+                      enclosingLoops = None, executions = None, loopStarts = None):
+    """
+    Lists the blocks executed by each template node of the tree, with the
+    loop counters of each execution.
+
+    Args:
+        steps (list): The nodes of the steps (see buildLoopTree).
+        blockOffsets (ndarray): The first block of each execution of steps.
+        counters (list): The values of ctr(1), ctr(2)... for each execution.
+        enclosingLoops (list): The loop nodes around steps.
+        executions (list): Result being filled.
+        loopStarts (dict): Filled with the first block of each execution of
+                           each loop node, indexed by node id.
+
+    Returns:
+        list: (node, block indexes, counter values, enclosing loop nodes) of
+              each template node.
+    """
+    if blockOffsets is None:
+        blockOffsets = np.zeros(1, dtype = np.int64)
+    if counters is None:
+        counters = []
+    if enclosingLoops is None:
+        enclosingLoops = []
+    if executions is None:
+        executions = []
+    if loopStarts is None:
+        loopStarts = {}
+    offset = 0
+    for node in steps:
+        if "template" in node:
+            executions.append((node, blockOffsets + offset, counters, enclosingLoops))
+        else:
+            loopStarts[id(node)] = blockOffsets + offset
+            iterations = np.arange(node["range"])
+            bodyLength = node["length"] // node["range"]
+            loopOffsets = (blockOffsets[:, None] + offset +
+                           iterations[None, :] * bodyLength).ravel()
+            loopCounters = [np.repeat(counter, node["range"]) for counter in counters] + \
+                           [np.tile(iterations, len(blockOffsets))]
+            collectExecutions(node["steps"], loopOffsets, loopCounters,
+                              enclosingLoops + [node], executions, loopStarts)
+        offset += node["length"]
+    return executions
+
+def splitLoop(loop, innerRange):
+    """
+    Splits a loop into an outer loop around an inner loop, for instance a
+    loop over averages and slices into a loop over averages around a loop
+    over slices.
+
+    Args:
+        loop (dict): The loop node, modified in place.
+        innerRange (int): The number of iterations of the inner loop, a 
+                          divisor of the number of iterations of the loop.
+
+    Returns:
+        dict: The inner loop node.
+    """
+    innerLoop = {"range": innerRange, "steps": loop["steps"],
+                 "length": loop["length"] * innerRange // loop["range"]}
+    loop["range"] //= innerRange
+    loop["steps"] = [innerLoop]
+    return innerLoop
+
+################################################################################
+## Amplitude equations
+################################################################################
+
+def isEquationValid(equation, values, counters, tolerance):
+    """
+    Evaluates an equation with the SDL equation compiler and compares it
+    with the expected values.
+
+    Args:
+        equation (str): The equation.
+        values (ndarray): The expected values.
+        counters (list): The values of ctr(1), ctr(2)...
+        tolerance (float): The maximum error.
+
+    Returns:
+        bool: True if the equation gives the values.
+    """
+    counterValues = {counterIndex + 1: counter for counterIndex, counter in enumerate(counters)}
+    equationValues = CompiledEquation("fit", equation).evaluate(counterValues)
+    return bool(np.all(np.abs(equationValues - values) <= tolerance))
+
+def formatSum(terms, values, counters, tolerance):
+    """
+    Writes the shortest equation giving the expected values, the numbers of
+    the terms being rounded to 4 to 12 significant digits.
+
+    Args:
+        terms (list): The terms of the sum, format strings whose fields are
+                      the numbers of the term.
+        values (ndarray): The expected values.
+        counters (list): The values of ctr(1), ctr(2)...
+        tolerance (float): The maximum error.
+
+    Returns:
+        str: The equation, None if it does not give the values.
+    """
+    for digits in range(4, 13):
+        equation = " + ".join(term.format(*[f"{number:.{digits}g}" for number in numbers])
+                              for term, numbers in terms).replace("+ -", "- ")
+        if isEquationValid(equation, values, counters, tolerance):
+            return equation
+    return None
+
+def fitLinearEquation(values, counters, tolerance):
+    """
+    Fits values to a linear function of the loop counters.
+
+    Args:
+        values (ndarray): The values to fit.
+        counters (list): The values of ctr(1), ctr(2)...
+        tolerance (float): The maximum error.
+
+    Returns:
+        str: The equation, None if the values are not linear.
+    """
+    design = np.column_stack(counters + [np.ones(len(values))]).astype(np.float64)
+    coefficients = np.linalg.lstsq(design, values, rcond = None)[0]
+    terms = [(f"{{}}*ctr({counterIndex + 1})", [coefficient])
+             for counterIndex, coefficient in enumerate(coefficients[:-1])
+             if abs(coefficient) * max(np.abs(counters[counterIndex]).max(), 1) > tolerance]
+    if abs(coefficients[-1]) > tolerance or terms == []:
+        terms.append(("{}", [coefficients[-1]]))
+    return formatSum(terms, values, counters, tolerance)
+
+def fitSinusoidalEquation(values, counters, tolerance):
+    """
+    Fits values to a sinusoidal function of one of the loop counters. Samples
+    of y = a*sin(w*k) + b*cos(w*k) + c verify y[k+1] + y[k-1] = 2*cos(w)*y[k]
+    + 2*c*(1 - cos(w)), so a two-parameter linear fit of this recurrence
+    rejects the other values cheaply and gives the starting frequency, which
+    is refined by successive grid searches.
+
+    Args:
+        values (ndarray): The values to fit.
+        counters (list): The values of ctr(1), ctr(2)...
+        tolerance (float): The maximum error.
+
+    Returns:
+        str: The equation, None if the values are not sinusoidal.
+    """
+    for counterIndex, counter in enumerate(counters):
+        numberOfIterations = int(counter.max()) + 1
+        if numberOfIterations < minimumSinusoidIterations:
+            continue
+        ## The values must depend on this counter only
+        iterationValues = np.bincount(counter, weights = values) / \
+                          np.maximum(np.bincount(counter), 1)
+        if np.abs(iterationValues[counter] - values).max() > tolerance:
+            continue
+        neighbourSums = iterationValues[2:] + iterationValues[:-2]
+        recurrence = np.column_stack([iterationValues[1:-1],
+                                      np.ones(numberOfIterations - 2)])
+        recurrenceCoefficients = np.linalg.lstsq(recurrence, neighbourSums, rcond = None)[0]
+        ## The rounding errors of the three samples add up in the recurrence
+        if np.abs(recurrence @ recurrenceCoefficients - neighbourSums).max() > 4 * tolerance:
+            continue
+        frequency = np.arccos(np.clip(recurrenceCoefficients[0] / 2, -1, 1))
+        if frequency == 0:
+            continue
+        iterations = np.arange(numberOfIterations)
+        step = frequency / 2
+        for _ in range(8):
+            bestError = np.inf
+            for candidate in np.linspace(frequency - step, frequency + step, 21):
+                design = np.column_stack([np.sin(candidate * iterations),
+                                          np.cos(candidate * iterations),
+                                          np.ones(numberOfIterations)])
+                coefficients = np.linalg.lstsq(design, iterationValues, rcond = None)[0]
+                error = np.abs(design @ coefficients - iterationValues).max()
+                if error < bestError:
+                    bestError, bestFrequency, bestCoefficients = error, candidate, coefficients
+            frequency = bestFrequency
+            step /= 5
+        counterName = f"ctr({counterIndex + 1})"
+        terms = [("{}*sin({}*" + counterName + ")", [bestCoefficients[0], frequency]),
+                 ("{}*cos({}*" + counterName + ")", [bestCoefficients[1], frequency])]
+        terms = [term for term, coefficient in zip(terms, bestCoefficients)
+                 if abs(coefficient) > tolerance]
+        if abs(bestCoefficients[2]) > tolerance:
+            terms.append(("{}", [bestCoefficients[2]]))
+        equation = formatSum(terms, values, counters, tolerance)
+        if equation is not None:
+            return equation
+    return None
+
+def fitAmplitude(amplitudes, counters):
+    """
+    Fits the amplitudes of a gradient over the iterations of its loops.
+
+    Args:
+        amplitudes (ndarray): The amplitude (Hz/m) of each execution.
+        counters (list): The values of ctr(1), ctr(2)... of each execution.
+
+    Returns:
+        float or str: The constant amplitude or the equation (mT/m), None if
+                      the amplitudes are neither constant, linear or
+                      sinusoidal.
+    """
+    values = amplitudes / gyromagneticRatio
+    tolerance = fitTolerance * max(np.abs(values).max(), 1e-9)
+    if np.ptp(values) <= tolerance:
+        return float(values[0])
+    return fitLinearEquation(values, counters, tolerance) or \
+           fitSinusoidalEquation(values, counters, tolerance)
+
+################################################################################
+## SDL instructions
+################################################################################
+
+def buildBlockInstruction(seq, blockEvents, blockDuration, amplitudeEquations,
+                          canonicalEventIDs):
+    """
+    Creates the SDL instruction of a Pulseq block. Objects are named after
+    the Pulseq library entries of the block, the first one executed by the 
+    instruction, library entries with the same content sharing their name.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        blockEvents (list): The event IDs of the block.
+        blockDuration (float): The block duration in seconds.
+        amplitudeEquations (dict): The equation name of each gradient column
+                                   whose amplitude changes.
+        canonicalEventIDs (tuple): The result of getCanonicalEventIDs.
+
+    Returns:
+        Instruction: The instruction of the block.
+    """
+    rfIDs, gradientIDs, _ = canonicalEventIDs
+    steps = [Init(gradients = "logical")]
+    if blockEvents[1] != 0:
+        ## The RF delay is the third last field in all format versions
+        steps.append(Rf(object = f"rf_{rfIDs[blockEvents[1]]}",
+                        time = round(seq.rfLibrary.data[blockEvents[1]][-3] * 1e6),
+                        added_phase = AddedPhase(type = "float", float = 0)))
+    for column, axis in gradientAxes.items():
+        if blockEvents[column] == 0:
+            continue
+        ## The gradient delay is the last field of both gradient types
+        gradientTime = round(seq.gradLibrary.data[blockEvents[column]][-1] * 1e6)
+        gradientName = f"grad_{gradientIDs[blockEvents[column]]}"
+        if column in amplitudeEquations:
+            steps.append(GradWithAmplitude(axis = axis, object = gradientName,
+                                           time = gradientTime,
+                                           amplitude = EquationRef(
+                                                       equation = amplitudeEquations[column])))
+        else:
+            steps.append(Grad(axis = axis, object = gradientName,
+                              time = gradientTime))
+    if blockEvents[5] != 0:
+        steps.append(Adc(object = f"adc_{blockEvents[5]}",
+                         time = round(seq.adcLibrary.data[blockEvents[5]][2] * 1e6),
+                         frequency = 0, phase = 0,
+                         added_phase = AddedPhase(type = "float", float = 0),
+                         mdh = {}))
+    steps += [Mark(time = round(blockDuration * 1e6)), Submit()]
+    return Instruction(print_counter = "off", print_message = "Running Pulseq block",
+                       steps = steps)
+
+def buildSdlSteps(steps, seq, sequence_data, equationNames, canonicalEventIDs, depth = 0):
+    """
+    Converts the nodes of the loop tree into SDL steps, adding an instruction
+    for each template node and the amplitude equations to sequence_data.
+
+    Args:
+        steps (list): The nodes of the steps (see buildLoopTree).
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        sequence_data (PulseSequence): The SDL sequence being filled.
+        equationNames (dict): The name of each equation already added.
+        canonicalEventIDs (tuple): The result of getCanonicalEventIDs.
+        depth (int): The number of enclosing loops.
+
+    Returns:
+        list: The SDL steps.
+    """
+    sdlSteps = []
+    for node in steps:
+        if "template" in node:
+            amplitudeEquations = {}
+            for column, equation in node["amplitudes"].items():
+                if equation not in equationNames:
+                    equationNames[equation] = f"amplitude_{len(equationNames) + 1}"
+                    sequence_data.equations[equationNames[equation]] = \
+                        Equation(equation = equation)
+                amplitudeEquations[column] = equationNames[equation]
+            blockName = f"block_{len(sequence_data.instructions)}"
+            firstBlock = node["firstBlock"]
+            blockDuration = seq.blockDurations[firstBlock] \
+                            if len(seq.blockDurations) > firstBlock else 0
+            sequence_data.instructions[blockName] = \
+                buildBlockInstruction(seq, seq.blockEvents[firstBlock], blockDuration,
+                                      amplitudeEquations, canonicalEventIDs)
+            sdlSteps.append(RunBlock(block = blockName))
+        else:
+            sdlSteps.append(Loop(counter = depth + 1, range = node["range"],
+                                 steps = buildSdlSteps(node["steps"], seq, sequence_data,
+                                                       equationNames, canonicalEventIDs,
+                                                       depth + 1)))
+    return sdlSteps
+
+def fitTreeAmplitudes(steps, seq, amplitudes):
+    """
+    Fits the gradient amplitudes of each template node over its loop
+    iterations and stores them in the "amplitudes" of the node, with the
+    index of its first block in "firstBlock".
+
+    Args:
+        steps (list): The nodes of the steps (see buildLoopTree).
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        amplitudes (ndarray): The gradient amplitudes of each block.
+
+    Returns:
+        list: (node, gradient column, enclosing loop nodes) of the gradients
+              whose amplitudes could not be fitted.
+    """
+    failures = []
+    for node, blockIndexes, counters, enclosingLoops in collectExecutions(steps):
+        node["amplitudes"] = {}
+        node["firstBlock"] = int(blockIndexes[0])
+        firstBlockEvents = seq.blockEvents[node["firstBlock"]]
+        for columnIndex, column in enumerate(gradientAxes):
+            if firstBlockEvents[column] == 0:
+                continue
+            amplitude = fitAmplitude(amplitudes[blockIndexes, columnIndex], counters)
+            if amplitude is None:
+                failures.append((node, column, enclosingLoops))
+            elif isinstance(amplitude, str):
+                node["amplitudes"][column] = amplitude
+    return failures
+
+def splitLoopsToFit(steps, failedNode, column, enclosingLoops, amplitudes):
+    """
+    Looks for an enclosing loop whose split into two nested loops makes
+    the amplitudes of a gradient fit, for instance a gradient changing with
+    the slice in a single loop over averages and slices. The first split
+    found is kept.
+
+    Args:
+        steps (list): The nodes of the steps (see buildLoopTree).
+        failedNode (dict): The template node of the gradient.
+        column (int): The column of the gradient in the block events.
+        enclosingLoops (list): The loop nodes around the template node.
+        amplitudes (ndarray): The gradient amplitudes of each block.
+
+    Returns:
+        bool: True if a loop was split.
+    """
+    columnIndex = list(gradientAxes).index(column)
+    for loop in reversed(enclosingLoops):
+        for innerRange in range(2, loop["range"]):
+            if loop["range"] % innerRange != 0:
+                continue
+            innerLoop = splitLoop(loop, innerRange)
+            for node, blockIndexes, counters, _ in collectExecutions(steps):
+                if node is failedNode:
+                    break
+            if fitAmplitude(amplitudes[blockIndexes, columnIndex], counters) is not None:
+                return True
+            ## Merges the loops back
+            loop["range"] *= innerRange
+            loop["steps"] = innerLoop["steps"]
+    return False
+
+def findLoopBoundaries(steps, failures, amplitudes):
+    """
+    Finds, for each gradient whose amplitudes could not be fitted, the
+    first iteration of an enclosing loop from which they stop fitting, for
+    instance the first line of the next average in a loop over the lines of
+    two averages. The loop must be cut before this iteration in all its
+    executions.
+
+    Args:
+        steps (list): The nodes of the steps (see buildLoopTree).
+        failures (list): The failures of fitTreeAmplitudes.
+        amplitudes (ndarray): The gradient amplitudes of each block.
+
+    Returns:
+        dict: The boundaries to pass to inferLoopStructure.
+    """
+    loopStarts = {}
+    executions = {id(node): (blockIndexes, counters) for node, blockIndexes, counters, _
+                  in collectExecutions(steps, loopStarts = loopStarts)}
+    boundaries = {}
+    for failedNode, column, enclosingLoops in failures:
+        blockIndexes, counters = executions[id(failedNode)]
+        values = amplitudes[blockIndexes, list(gradientAxes).index(column)]
+        for depth in reversed(range(len(enclosingLoops))):
+            loop = enclosingLoops[depth]
+            ## Binary search of the longest prefix of iterations that fits
+            fittedIterations, unfittedIterations = 0, loop["range"]
+            while unfittedIterations - fittedIterations > 1:
+                numberOfIterations = (fittedIterations + unfittedIterations) // 2
+                prefix = counters[depth] < numberOfIterations
+                if fitAmplitude(values[prefix], [counter[prefix] for counter in counters]) \
+                   is None:
+                    unfittedIterations = numberOfIterations
+                else:
+                    fittedIterations = numberOfIterations
+            if fittedIterations > 0:
+                bodyLength = loop["length"] // loop["range"]
+                for loopStart in loopStarts[id(loop)].tolist():
+                    boundary = loopStart + fittedIterations * bodyLength
+                    boundaries[boundary] = max(boundaries.get(boundary, 0), bodyLength)
+                break
+    return boundaries
+
+def inferSdlStructure(seq, sequence_data, maximumPeriod = defaultMaximumPeriod):
+    """
+    Rebuilds the nested loops of a Pulseq sequence as SDL instructions.
+    When the amplitudes of a gradient cannot be fitted over its loop 
+    iterations, its enclosing loops are split into nested loops. If no 
+    split fits them, the structure is inferred again with the loops cut 
+    where the amplitudes stop fitting. As a last resort, the gradient keeps
+    its amplitude in the block templates, which unrolls the loops it
+    belongs to.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        sequence_data (PulseSequence): The SDL sequence, whose instructions
+                                       and equations are replaced.
+        maximumPeriod (int): The longest repeated subsequence searched.
+
+    Returns:
+        list: The nodes of the top-level steps (see buildLoopTree), the
+              template nodes having the fitted amplitude of each gradient.
+    """
+    sequence_data.instructions = {}
+    sequence_data.equations = {}
+    if len(seq.blockEvents) == 0:
+        sequence_data.instructions = {"main": Instruction(print_counter = "off",
+                                                          print_message = "Running main loop",
+                                                          steps = [])}
+        return []
+
+    canonicalEventIDs = getCanonicalEventIDs(seq)
+    concreteGradients = set()
+    boundaries = {}
+    while True:
+        templateIDs, amplitudes, gradientShapes = \
+            getBlockTemplates(seq, concreteGradients, canonicalEventIDs)
+        symbols, loops = inferLoopStructure(templateIDs, maximumPeriod, boundaries)
+        steps = buildLoopTree(symbols, loops)
+        failures = fitTreeAmplitudes(steps, seq, amplitudes)
+        if failures != []:
+            for node, column, enclosingLoops in failures:
+                splitLoopsToFit(steps, node, column, enclosingLoops, amplitudes)
+            ## The counters of the other gradients changed with the splits
+            failures = fitTreeAmplitudes(steps, seq, amplitudes)
+        if failures == []:
+            break
+        newBoundaries = findLoopBoundaries(steps, failures, amplitudes)
+        if any(boundaries.get(boundary, 0) < bodyLength 
+               for boundary, bodyLength in newBoundaries.items()):
+            for boundary, bodyLength in newBoundaries.items():
+                boundaries[boundary] = max(boundaries.get(boundary, 0), bodyLength)
+            continue
+        for node, column, _ in failures:
+            gradID = seq.blockEvents[node["firstBlock"]][column]
+            concreteGradients.add((column, gradientShapes[gradID]))
+
+    mainSteps = buildSdlSteps(steps, seq, sequence_data, {}, canonicalEventIDs)
+    sequence_data.instructions = {"main": Instruction(print_counter = "off",
+                                                      print_message = "Running main loop",
+                                                      steps = mainSteps),
+                                  **sequence_data.instructions}
+    return steps
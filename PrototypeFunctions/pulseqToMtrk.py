@@ -4,21 +4,45 @@
 ### Anais Artiges and the mtrk project team at NYU - 04/29/2024              ###
 ################################################################################
 
+import collections
+import collections.abc
+import io
+import mmap
+import os
+import re
 import numpy as np
 from numpy import linspace
-from scipy import interpolate
-from scipy.integrate import simpson
 import sys
 import math 
 import pypulseq
 from pypulseq.event_lib import EventLibrary
 from pypulseq.supported_labels_rf_use import get_supported_labels
 from types import SimpleNamespace
-import matplotlib.pyplot as plt
 
 from SDL_read_write.pydanticSDLHandler import *
+from pulseqLoopInference import inferSdlStructure
+
+## Number of decoded shapes kept in memory by LazyShapeLibrary
+shapeCacheSize = 256
 
 def pulseqToMtrk(file_path):
+    """
+    Reads a Pulseq file and infers the SDL instructions and equations of its
+    nested loops.
+
+    The rf_<id>, grad_<id> and adc_<id> objects referenced by the
+    instructions are named after the Pulseq library entries (the first one
+    with the same content), but they are not created yet: the objects and
+    arrays of the SDL sequence stay empty, so it cannot be converted back
+    to Pulseq without them.
+
+    Args:
+        file_path (str): The .seq file to read.
+
+    Returns:
+        tuple: The sequence read (pypulseq.Sequence, with the libraries of
+               the file) and the SDL sequence (PulseSequence).
+    """
     sequence_data = PulseSequence(file = File(), 
                                   settings = Settings(), 
                                   infos = Info(),
@@ -68,7 +92,9 @@ def pulseqToMtrk(file_path):
 
     periodicEvents, variableEvents, variableIndexes = evaluatePeriodicity(seq.blockEvents)
     extractRFevents(seq, periodicEvents, variableEvents, variableIndexes)
-    return seq
+    ## Nested loops and amplitude equations instead of unrolled blocks
+    inferSdlStructure(seq, sequence_data)
+    return seq, sequence_data
 
 def readPulseq(obj, filename, *args):
     # READ Load sequence from file.
@@ -91,7 +117,11 @@ def readPulseq(obj, filename, *args):
     if args and 'detectRFuse' in args:
         detectRFuse = True
 
-    fid = open(filename)
+    ## The file is memory-mapped so that the shapes are only read when used
+    with open(filename, "rb") as fid:
+        fileData = mmap.mmap(fid.fileno(), 0, access = mmap.ACCESS_READ) \
+                   if os.fstat(fid.fileno()).st_size else b""
+    sections = indexPulseqSections(fileData)
 
     # Clear sequence data
     obj.blockEvents = []
@@ -108,15 +138,14 @@ def readPulseq(obj, filename, *args):
 
     version_combined = 0
 
-    # Load data from file
-    while True:
-        section = ""
-        lineData = fid.readline().strip()
-        if lineData != "" and lineData[0] == '[':
-            section = lineData
-
+    # Load data from file, one section at a time
+    for section, sectionStart, sectionEnd in sections:
+        if section == '[SHAPES]':
+            obj.shapeLibrary = readShapes(fileData, sectionStart, sectionEnd, False)
+            continue
+        sectionText = getSectionText(fileData, sectionStart, sectionEnd)
         if section == '[DEFINITIONS]':
-            obj.definitions = readDefinitions(fid)
+            obj.definitions = readDefinitions(io.StringIO(sectionText))
             v = obj.get_definition('GradientRasterTime')
             if v:
                 obj.gradRasterTime = v
@@ -130,7 +159,7 @@ def readPulseq(obj, filename, *args):
             if v:
                 obj.blockDurationRaster = v
         elif section == '[SIGNATURE]':
-            tmpSignDefs = readDefinitions(fid)
+            tmpSignDefs = readDefinitions(io.StringIO(sectionText))
             if 'Type' in tmpSignDefs:
                 obj.signatureType = tmpSignDefs['Type']
             if 'Hash' in tmpSignDefs:
@@ -138,7 +167,7 @@ def readPulseq(obj, filename, *args):
                 obj.signatureFile = 'Text'  # we are reading a text file, so much is known for sure
                 break
         elif section == '[VERSION]':
-            version_major, version_minor, version_revision = readVersion(fid)
+            version_major, version_minor, version_revision = readVersion(io.StringIO(sectionText))
             assert version_major == obj.version_major, 'Unsupported version_major {}'.format(version_major)
             version_combined = 1000000 * version_major + 1000 * version_minor + version_revision
             if version_combined < 1002000:
@@ -148,49 +177,45 @@ def readPulseq(obj, filename, *args):
         elif section == '[BLOCKS]':
             if 'version_major' not in locals():
                 raise ValueError('Pulseq file MUST include [VERSION] section prior to [BLOCKS] section')
-            obj.blockEvents, obj.blockDurations, delayInd_tmp = readBlocks(fid, obj.blockDurationRaster, version_combined)
+            obj.blockEvents, obj.blockDurations, delayInd_tmp = readBlocks(sectionText, obj.blockDurationRaster, version_combined)
         elif section == '[RF]':
             if version_combined >= 1004000:
-                obj.rfLibrary = readEvents(fid, [1, 1, 1, 1, 1e-6, 1, 1])  # this is 1.4.x format
+                obj.rfLibrary = readEvents(sectionText, [1, 1, 1, 1, 1e-6, 1, 1])  # this is 1.4.x format
             else:
-                obj.rfLibrary = readEvents(fid, [1, 1, 1, 1e-6, 1, 1])  # this is 1.3.x and below
+                obj.rfLibrary = readEvents(sectionText, [1, 1, 1, 1e-6, 1, 1])  # this is 1.3.x and below
         elif section == '[GRADIENTS]':
             if version_combined >= 1004000:
-                obj.gradLibrary = readEvents(fid, [1, 1, 1, 1e-6], 'g', obj.gradLibrary)  # this is 1.4.x format
+                obj.gradLibrary = readEvents(sectionText, [1, 1, 1, 1e-6], 'g', obj.gradLibrary)  # this is 1.4.x format
             else:
-                obj.gradLibrary = readEvents(fid, [1, 1, 1e-6], 'g', obj.gradLibrary)  # this is 1.3.x and below
+                obj.gradLibrary = readEvents(sectionText, [1, 1, 1e-6], 'g', obj.gradLibrary)  # this is 1.3.x and below
         elif section == '[TRAP]':
-            obj.gradLibrary = readEvents(fid, [1, 1e-6, 1e-6, 1e-6, 1e-6], 't', obj.gradLibrary)
+            obj.gradLibrary = readEvents(sectionText, [1, 1e-6, 1e-6, 1e-6, 1e-6], 't', obj.gradLibrary)
         elif section == '[ADC]':
-            obj.adcLibrary = readEvents(fid, [1, 1e-9, 1e-6, 1, 1])
+            obj.adcLibrary = readEvents(sectionText, [1, 1e-9, 1e-6, 1, 1])
         elif section == '[DELAYS]':
             if version_combined >= 1004000:
                 raise ValueError('Pulseq file revision 1.4.0 and above MUST NOT contain [DELAYS] section')
-            tmp_delayLibrary = readEvents(fid, 1e-6)
-        elif section == '[SHAPES]':
-            obj.shapeLibrary = readShapes(fid, False)
+            tmp_delayLibrary = readEvents(sectionText, [1e-6])
         elif section == '[EXTENSIONS]':
-            obj.extensionLibrary = readEvents(fid)
+            obj.extensionLibrary = readEvents(sectionText)
         elif section == "":
             pass
         else:
             if section.startswith('extension TRIGGERS'):
                 id = int(section[19:])
                 obj.setExtensionStringAndID('TRIGGERS', id)
-                obj.trigLibrary = readEvents(fid, [1, 1, 1e-6, 1e-6])
+                obj.trigLibrary = readEvents(sectionText, [1, 1, 1e-6, 1e-6])
             elif section.startswith('extension LABELSET'):
                 id = int(section[19:])
                 obj.setExtensionStringAndID('LABELSET', id)
-                obj.labelsetLibrary = readAndParseEvents(fid, int, get_supported_labels())
+                obj.labelsetLibrary = readAndParseEvents(io.StringIO(sectionText), int, get_supported_labels())
             elif section.startswith('extension LABELINC'):
                 id = int(section[19:])
                 obj.setExtensionStringAndID('LABELINC', id)
-                obj.labelincLibrary = readAndParseEvents(fid, int, get_supported_labels())
+                obj.labelincLibrary = readAndParseEvents(io.StringIO(sectionText), int, get_supported_labels())
             else:
                 raise ValueError('Unknown section code: {}'.format(section))
 
-    fid.close()
-
     # if version_combined < 1002000:
     #     raise ValueError('Unsupported version {:07d}, only file format revision 1.2.0 (1002000) and above are supported'.format(version_combined))
 
@@ -281,6 +306,65 @@ def readPulseq(obj, filename, *args):
 
     return
 
+def indexPulseqSections(fileData):
+    """
+    Finds the sections of a Pulseq file in a single pass.
+
+    Args:
+        fileData (bytes): The content of the .seq file, or its memory map.
+
+    Returns:
+        list: (section header, start, end) in file order, the start and end
+              being the byte offsets of the section content.
+    """
+    headerPattern = rb"[ \t]*(\[[^\n]*?)[ \t\r]*(?=\n|\Z)"
+    ## The first line is matched apart, an alternation with \A being much slower
+    firstHeader = re.match(headerPattern, fileData)
+    headers = ([firstHeader] if firstHeader else []) + \
+              list(re.finditer(rb"\n" + headerPattern, fileData))
+    sections = []
+    for headerIndex, header in enumerate(headers):
+        sectionEnd = headers[headerIndex + 1].start() if headerIndex + 1 < len(headers) \
+                     else len(fileData)
+        sections.append((header.group(1).decode(), min(header.end() + 1, sectionEnd),
+                         sectionEnd))
+    return sections
+
+def getSectionText(fileData, sectionStart, sectionEnd):
+    """
+    Decodes a part of a Pulseq file.
+
+    Args:
+        fileData (bytes): The content of the .seq file, or its memory map.
+        sectionStart (int): The byte offset of the start.
+        sectionEnd (int): The byte offset of the end.
+
+    Returns:
+        str: The text, with Unix line endings.
+    """
+    return fileData[sectionStart:sectionEnd].decode().replace("\r\n", "\n")
+
+def parseTable(sectionText, numberOfColumns = None, dtype = np.float64):
+    """
+    Parses the rows of a section until its first empty or comment line.
+
+    Args:
+        sectionText (str): The text of the section.
+        numberOfColumns (int): The number of columns, the number of values 
+                               of the first row if None.
+        dtype (type): The type of the values.
+
+    Returns:
+        ndarray: The table of values, one row per line.
+    """
+    ## A line feed is added so that an empty first line ends the table too
+    tableEnd = re.search(r"\n[ \t]*(?:#|\n|$)", "\n" + sectionText)
+    tableText = sectionText[:tableEnd.start()] if tableEnd else sectionText
+    if numberOfColumns is None:
+        numberOfColumns = len(tableText.split("\n", 1)[0].split())
+    values = np.fromstring(tableText, dtype=dtype, sep=" ")
+    return values.reshape(-1, max(numberOfColumns, 1))
+
 def readDefinitions(fid):
     def_dict = {}
     line = fid.readline().strip()
@@ -315,37 +399,55 @@ def readVersion(fid):
         line = fid.readline().strip()
     return major, minor, revision
 
-def readBlocks(fid, blockDurationRaster, version_combined):
-    eventTable = []
-    blockDurations = []
-    delayIDs_tmp = []
-    line = fid.readline().strip()
-    ### Warning : the .append() might be an issue as the original code was adding at index blockEvent[0] instead
-    while line and not (line.isspace() or line.startswith('#')):
-        blockEvents = [int(i) for i in line.split()]
-        eventTable.append([0] + blockEvents[2:] + [0]) if version_combined <= 1002001 else eventTable.append([0] + blockEvents[2:])
-        if version_combined >= 1004000:
-            blockDurations.append(blockEvents[1] * blockDurationRaster)
-        else:
-            delayIDs_tmp.append(blockEvents[1])
-        line = fid.readline().strip()
-    return eventTable, blockDurations, delayIDs_tmp
-
-def readEvents(fid, scale, type=None, eventLibrary=None):
+def readBlocks(sectionText, blockDurationRaster, version_combined):
+    """
+    Parses the [BLOCKS] section in bulk.
+
+    Args:
+        sectionText (str): The text of the section.
+        blockDurationRaster (float): The block duration raster in seconds.
+        version_combined (int): The Pulseq file format version.
+
+    Returns:
+        tuple: The event table (one list of event IDs per block), the block 
+               durations (format 1.4 and above) and the delay IDs (below 1.4).
+    """
+    blockTable = parseTable(sectionText, dtype=np.int64)
+    eventTable = blockTable[:, 1:].copy()
+    eventTable[:, 0] = 0
+    if version_combined <= 1002001:
+        eventTable = np.hstack([eventTable, np.zeros((len(eventTable), 1), dtype=np.int64)])
+    if version_combined >= 1004000:
+        return eventTable.tolist(), (blockTable[:, 1] * blockDurationRaster).tolist(), []
+    return eventTable.tolist(), [], blockTable[:, 1].tolist()
+
+def readEvents(sectionText, scale, type=None, eventLibrary=None):
+    """
+    Parses an event section in bulk and fills the event library. Only the
+    columns with a scale are kept.
+
+    Args:
+        sectionText (str): The text of the section.
+        scale (list): The scale of each column after the ID.
+        type (str): The event type stored in the library.
+        eventLibrary (EventLibrary): The library to fill, a new one if None.
+
+    Returns:
+        EventLibrary: The filled library.
+    """
     if not scale:
         scale = [1]
     if not eventLibrary:
         eventLibrary = EventLibrary()
-    line = fid.readline().strip()
-    while line and not (line.isspace() or line.startswith('#')):
-        data = list(map(float, line.split()))
-        id = int(data[0])
-        data = [x * y for x, y in zip(scale, data[1:])]
+    eventTable = parseTable(sectionText)
+    numberOfColumns = min(len(scale), eventTable.shape[1] - 1)
+    eventData = (eventTable[:, 1:numberOfColumns + 1] * 
+                 np.array(scale[:numberOfColumns])).tolist()
+    for id, data in zip(eventTable[:, 0].astype(np.int64).tolist(), eventData):
         if type:
             eventLibrary.insert(id, data, type)
         else:
             eventLibrary.insert(id, data)
-        line = fid.readline().strip()
     return eventLibrary
 
 def readAndParseEvents(fid, *parsers):
@@ -364,32 +466,82 @@ def readAndParseEvents(fid, *parsers):
         line = fid.readline().strip()
     return eventLibrary
 
-def readShapes(fid, forceConvertUncompressed):
-    shapeLibrary = EventLibrary()
-    line = fid.readline().strip()
-    line = fid.readline().strip()
-    while line and not line.isspace():
-        tok = line.split()
-        id = int(tok[1])
-        line = fid.readline().strip()
-        tok = line.split()
-        num_samples = int(tok[1])
-        data = []
-        line = fid.readline().strip()
-        while line and not (line.isspace() or line.startswith('#')):
-            data.extend(list(map(float, line.split())))
-            line = fid.readline().strip()
-
-        line = fid.readline().strip()
-
-        if len(data) != num_samples:
-            compressed_shape = SimpleNamespace(num_samples = num_samples, data = np.array(data))
-            shape = list(pypulseq.decompress_shape.decompress_shape(compressed_shape))
-            data = [num_samples] + shape
-        else:
-            data = [num_samples] + data
-        shapeLibrary.insert(id, data)
-    return shapeLibrary
+def readShapes(fileData, sectionStart, sectionEnd, forceConvertUncompressed):
+    """
+    Indexes the [SHAPES] section. The shapes are parsed when they are used.
+
+    Args:
+        fileData (bytes): The content of the .seq file, or its memory map.
+        sectionStart (int): The byte offset of the section content.
+        sectionEnd (int): The byte offset of the end of the section.
+        forceConvertUncompressed (bool): Unused, kept for compatibility.
+
+    Returns:
+        LazyShapeLibrary: The shape library.
+    """
+    return LazyShapeLibrary(fileData, sectionStart, sectionEnd)
+
+def parseShape(shapeText):
+    """
+    Parses a shape of the [SHAPES] section. The samples are converted in a
+    single NumPy call and compressed shapes are decompressed.
+
+    Args:
+        shapeText (str): The text of the shape, from its num_samples line.
+
+    Returns:
+        list: The number of samples followed by the samples.
+    """
+    samplesLine, samplesText = (shapeText + "\n").split("\n", 1)
+    num_samples = int(samplesLine.split()[1])
+    samples = parseTable(samplesText, 1)[:, 0]
+    if len(samples) != num_samples:
+        compressed_shape = SimpleNamespace(num_samples = num_samples, data = samples)
+        samples = pypulseq.decompress_shape.decompress_shape(compressed_shape)
+    return [num_samples] + samples.tolist()
+
+class LazyShapeLibrary(collections.abc.Mapping):
+    """
+    Shape library of a memory-mapped Pulseq file. Only the byte offsets of
+    the shapes are read when the file is loaded. A shape is parsed and
+    decompressed when it is accessed, and the last shapeCacheSize decoded
+    shapes are kept in memory. Shapes are accessed by shape ID through
+    data, as in EventLibrary.
+    """
+    def __init__(self, fileData, sectionStart, sectionEnd, cacheSize = shapeCacheSize):
+        self.fileData = fileData
+        self.cacheSize = cacheSize
+        self.shapeCache = collections.OrderedDict()
+        self.shapeOffsets = {}
+        ## A pattern starting with a literal is searched much faster than one
+        ## starting with a line feed, the line start being checked afterwards
+        shapeHeaders = [header for header in re.compile(rb"shape_id[ \t]+(\d+)[^\n]*\n").finditer(
+                            fileData, sectionStart, sectionEnd)
+                        if fileData[header.start() - 1:header.start()] == b"\n"]
+        for headerIndex, header in enumerate(shapeHeaders):
+            shapeEnd = shapeHeaders[headerIndex + 1].start() \
+                       if headerIndex + 1 < len(shapeHeaders) else sectionEnd
+            self.shapeOffsets[int(header.group(1))] = (header.end(), shapeEnd)
+
+    @property
+    def data(self):
+        return self
+
+    def __getitem__(self, id):
+        if id in self.shapeCache:
+            self.shapeCache.move_to_end(id)
+            return self.shapeCache[id]
+        shape = parseShape(getSectionText(self.fileData, *self.shapeOffsets[id]))
+        self.shapeCache[id] = shape
+        if len(self.shapeCache) > self.cacheSize:
+            self.shapeCache.popitem(last = False)
+        return shape
+
+    def __iter__(self):
+        return iter(self.shapeOffsets)
+
+    def __len__(self):
+        return len(self.shapeOffsets)
 
 def is_float(element: any) -> bool:
     try:
@@ -398,134 +550,164 @@ def is_float(element: any) -> bool:
     except ValueError:
         return False
             
-def findPeriodicPattern(listOfEvents, currentPattern):
-    # If no pattern is found, returns 0
-    # If the list is empty, returns -1
-
-    if len(listOfEvents) == 0:
-        return -1
-    elif len(listOfEvents) == 1:
-        return 0
-    else:
-        counter = 0
-        for event in listOfEvents:
-            if event == currentPattern:
-                counter += 1
-        period = int(len(listOfEvents) / counter)
-        return period
-    
 def findVariableIndexes(variableEvents):
-    variableIndexesList = []
-    for event in variableEvents:
-        for index in range(0, len(event)):
-            if index not in variableIndexesList and event[index] != variableEvents[0][index]:
-                variableIndexesList.append(index)
-    return variableIndexesList
+    """
+    Finds the columns of the block table that differ from the first 
+    variable event, with a single comparison over the whole table.
+
+    Args:
+        variableEvents (list): The variable events (lists of event IDs).
+
+    Returns:
+        list: The indexes of the varying columns, in the order in which the
+              events first make them differ.
+    """
+    if len(variableEvents) == 0:
+        return []
+    eventTable = np.asarray(variableEvents)
+    differences = eventTable != eventTable[0]
+    variableIndexes = np.flatnonzero(differences.any(axis=0))
+    firstDifferences = differences[:, variableIndexes].argmax(axis=0)
+    return variableIndexes[np.lexsort((variableIndexes, firstDifferences))].tolist()
 
 def evaluatePeriodicity(listOfEvents):
+    """
+    Sorts the block events into periodic events, which are repeated, and 
+    variable events, which appear only once. The events are hashed as tuples 
+    and counted in a single pass over the blocks.
+
+    Args:
+        listOfEvents (list): The event IDs of each block.
+
+    Returns:
+        tuple: The periodic events ([event, period] in order of first 
+               occurrence, the period being the number of blocks divided by
+               the number of occurrences), the variable events and the 
+               indexes of the columns varying between variable events.
+    """
+    numberOfEvents = len(listOfEvents)
     periodicEvents = []
     variableEvents = []
-    for event in listOfEvents:
-        eventFound = False
-        for periodicEvent in periodicEvents:
-            if event == periodicEvent[0]:
-                eventFound = True
-        if eventFound == True:
-            continue
+    ## Counter keeps the order of the first occurrences
+    for event, counter in collections.Counter(map(tuple, listOfEvents)).items():
+        if numberOfEvents == 1:
+            periodicEvents.append([list(event), 0])
+        elif counter > 1:
+            periodicEvents.append([list(event), numberOfEvents // counter])
         else:
-            period = findPeriodicPattern(listOfEvents, event)
-            if period != len(listOfEvents):
-                periodicEvents.append([event, period])
-            else:
-                variableEvents.append(event)
-                
+            variableEvents.append(list(event))
+
     variableIndexes = findVariableIndexes(variableEvents)
 
     return periodicEvents, variableEvents, variableIndexes
     
-def extractRFevents(seq, periodicEvents, variableEvents, variableIndexes):
+def analyzeRf(seq, rfID, rfCache = None):
+    """
+    Characterizes an RF pulse of the library: flip angle, lobe widths,
+    bandwidth and time-bandwidth product. The results only depend on the RF
+    library entry and on its shapes, so they are memoized by RF ID and shape
+    IDs in rfCache.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        rfID (int): The RF library ID.
+        rfCache (dict): Results of the previous calls, indexed by RF ID and
+                        shape IDs.
+
+    Returns:
+        dict: The interleaved magnitude and phase waveform, the duration (us),
+              the flip angle (degrees), the lobe widths (s), the bandwidth
+              (Hz) and the time-bandwidth product of the pulse.
+    """
+    from scipy.integrate import simpson
+    rfFormat = seq.rfLibrary.data[rfID]
+    cacheKey = (rfID,) + tuple(rfFormat[1:4])
+    if rfCache is not None and cacheKey in rfCache:
+        return rfCache[cacheKey]
+    rfAmplitude = rfFormat[0]
+    rfMagWaveform = np.asarray(seq.shapeLibrary.data[rfFormat[1]][1:], dtype = np.float64)
+    rfPhaseWaveform = np.asarray(seq.shapeLibrary.data[rfFormat[2]][1:], dtype = np.float64)
+    # TO DO correct the *2 in the durations after the original file is corrected
+    pulseDuration = len(rfMagWaveform) * 2 * seq.rfRasterTime
+
+    # Calculating flip angle for SinC RF pulse using area under curve
+    gamma = 42.58 # MHz/T gyromagnetic ratio
+    # TO DO check the 1.35 value, it should be 1.
+    areaUnderCurve = simpson(rfMagWaveform * rfAmplitude * 1.35, dx = seq.rfRasterTime)
+    flipAngle = int(areaUnderCurve * gamma * 2 * np.pi)
+
+    # Calculating bandwith time product for SinC RF pulse from the widths of
+    # the lobes up to the central one, delimited by the minima of the magnitude
+    curvature = np.diff(np.sign(np.diff(rfMagWaveform)))
+    rfMinIndex = np.flatnonzero(curvature > 0)
+    numberOfLobes = min(np.count_nonzero(curvature < 0), len(rfMinIndex) // 2 + 1)
+    lobeWidths = np.diff(rfMinIndex[:numberOfLobes], prepend = 0) * seq.rfRasterTime * 2
+    ## Pulses without side lobes are a single lobe
+    peakHalfWidth = lobeWidths.max() / 2 if len(lobeWidths) else pulseDuration / 2
+    bandWidth = 0.65 / peakHalfWidth
+    timeBwProduct = pulseDuration * bandWidth
+
+    rfAnalysis = {"waveform": np.column_stack([rfMagWaveform, rfPhaseWaveform]).ravel().tolist(),
+                  "duration": pulseDuration * 1e6,
+                  "flipAngle": flipAngle,
+                  "lobeWidths": lobeWidths.tolist(),
+                  "bandWidth": bandWidth,
+                  "timeBwProduct": timeBwProduct}
+    if rfCache is not None:
+        rfCache[cacheKey] = rfAnalysis
+    return rfAnalysis
+
+def analyzeRfLibrary(seq, rfCache = None):
+    """
+    Characterizes all the RF pulses of the library with analyzeRf.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        rfCache (dict): Results of the previous calls, indexed by RF ID and
+                        shape IDs.
+
+    Returns:
+        dict: The results of analyzeRf indexed by RF ID.
+    """
+    if rfCache is None:
+        rfCache = {}
+    return {rfID: analyzeRf(seq, rfID, rfCache) for rfID in seq.rfLibrary.data}
+
+def getSliceThickness(seq, bandWidth, sliceGradientID):
+    """
+    Computes the slice thickness selected by an RF pulse.
+
+    Args:
+        seq (pypulseq.Sequence): The sequence read by readPulseq.
+        bandWidth (float): The bandwidth of the RF pulse (Hz).
+        sliceGradientID (int): The gradient library ID of the slice selection
+                               gradient, 0 if there is none.
+
+    Returns:
+        float: The slice thickness in mm, 5 mm by default.
+    """
+    gamma = 42.58 # MHz/T gyromagnetic ratio
+    if sliceGradientID == 0:
+        return 5.0
+    sliceSelectionGradientAmplitude = seq.gradLibrary.data[sliceGradientID][0]
+    correctedAmplitude_mTm = (sliceSelectionGradientAmplitude * 1e-3) / gamma
+    return bandWidth / (gamma * correctedAmplitude_mTm)
+
+def extractRFevents(seq, periodicEvents, variableEvents, variableIndexes, rfCache = None):
     if 1 in variableIndexes:
         pass
     else:
+        rfAnalyses = analyzeRfLibrary(seq, rfCache)
         for event in periodicEvents:
             if event[0][1] != 0:
                 rfFormat = seq.rfLibrary.data[event[0][1]]
-                rfAmplitude = rfFormat[0]
-                rfMagWaveform = seq.shapeLibrary.data[rfFormat[1]][1:]
-                rfPhaseWaveform = seq.shapeLibrary.data[rfFormat[2]][1:]
-                rfWaveform = []
-                for i in range(0,len(rfMagWaveform)):
-                    rfWaveform.append(rfMagWaveform[i])
-                    rfWaveform.append(rfPhaseWaveform[i])
-                rfTimeShape = seq.shapeLibrary.data[rfFormat[3]][1:]
-                rfDelayUs = rfFormat[4]
-                rfFrequencyOffset = rfFormat[5]
+                rfAnalysis = rfAnalyses[event[0][1]]
                 rfPhaseOffset = rfFormat[6]
 
-                # Calculating flip angle for SinC RF pulse using area under curve
-                gamma = 42.58 # MHz/T gyromagnetic ratio
-                rfMagWaveformAmpl = []
-                for value in rfMagWaveform:
-                    rfMagWaveformAmpl.append(value * rfAmplitude * 1.35) # TO DO check the 1.35 value, it should be 1.
-                areaUnderCurve = simpson(rfMagWaveformAmpl, dx=seq.rfRasterTime)
-                flipAngle = int(areaUnderCurve * gamma * 2 * np.pi) 
-                print("flipAngle", flipAngle)
-
-                # Calculating bandwith time product for SinC RF pulse
-                rfMagWaveform = np.array(rfMagWaveform)
-                # fftRfWaveform = np.fft.fftshift(np.abs(np.fft.fft(rfMagWaveform/rfMagWaveform.max()))) / np.sqrt(len(rfMagWaveform))
-                # preciseFftRfWaveformEq = interpolate.InterpolatedUnivariateSpline(rfTimeShape, fftRfWaveform)
-                # preciseFftRfWaveform = list(preciseFftRfWaveformEq(linspace(0, rfTimeShape[-1], 64000)))
-                rfMagWaveform = list(rfMagWaveform)
-                diffRfMagWaveform = np.diff(np.sign(np.diff(rfMagWaveform)))
-                # plt.plot(rfMagWaveform)
-                # plt.show()
-                rfMinIndex = []
-                for index in range(0, len(diffRfMagWaveform)):
-                    if diffRfMagWaveform[index] > 0:
-                        rfMinIndex.append(index)
-                rfMaxIndex = []
-                for index in range(0, len(diffRfMagWaveform)):
-                    if diffRfMagWaveform[index] < 0:
-                        rfMaxIndex.append(index)
-                print("rfMinIndex", rfMinIndex)
-                print("rfMaxIndex", rfMaxIndex)
-                centralMaxIndex = int(len(rfMinIndex)/2)
-                print("centralMaxIndex", centralMaxIndex)
-                peakHalfWidth = (rfMaxIndex[centralMaxIndex] - rfMinIndex[centralMaxIndex-1]) * seq.rfRasterTime * 2
-                print("peakHalfWidth", peakHalfWidth)
-                lobeWidthTable =[]
-                for index in range(0, len(rfMaxIndex)):
-                    if index <= centralMaxIndex:
-                        if index == 0:
-                            lobeWidth = rfMinIndex[index] * seq.rfRasterTime * 2
-                        else:
-                            lobeWidth = (rfMinIndex[index] - rfMinIndex[index-1]) * seq.rfRasterTime * 2
-                        lobeWidthTable.append(lobeWidth)
-                print("lobeWidthTable", lobeWidthTable)
-                peakHalfWidth= max(lobeWidthTable)/2
-                # TO DO remove the *2 in bandWith and timeBwProduct when the original file is corrected
-                bandWidth = 0.65 / (peakHalfWidth) 
-                timeBwProduct = len(rfMagWaveform) * 2 * seq.rfRasterTime * bandWidth
-                print("timeBwProduct", timeBwProduct)
-
-                # Calculating slice thickness
-                gamma = 42.58 # MHz/T gyromagnetic ratio
-                sliceThickness = 5.0 # default value in mm
-                if event[0][4] != 0:
-                    sliceSelectionGradient = seq.gradLibrary.data[event[0][4]]
-                    sliceSelectionGradientAmplitude = sliceSelectionGradient[0]
-                    correctedAmplitude_mTm = (sliceSelectionGradientAmplitude * 1e-3) / gamma
-                    sliceThickness = bandWidth / (gamma * correctedAmplitude_mTm) # in mm
-                print("sliceThickness", sliceThickness)
-                
-
                 # sdlRfEvent = Rf()
                 sdlRfExcitation = RfExcitation()
-                sdlRfExcitation.array = rfWaveform
-                # TO DO correct duration after the orignal file is corrected
-                sdlRfExcitation.duration = len(rfMagWaveform) * 2 * seq.rfRasterTime * 1e6
+                sdlRfExcitation.array = rfAnalysis["waveform"]
+                sdlRfExcitation.duration = rfAnalysis["duration"]
                 sdlRfExcitation.initial_phase = rfPhaseOffset
-                sdlRfExcitation.thickness = sliceThickness
-                # print(seq.timeBwProduct)
-
+                sdlRfExcitation.thickness = getSliceThickness(seq, rfAnalysis["bandWidth"],
+                                                              event[0][4])
@@ -1,6 +1,5 @@
 import ReadoutBlocks.readoutWaveformGenerator as rwg
 # import readoutWaveformGenerator as rwg
-import matplotlib.pyplot as plt
 import numpy as np
 import sys
 import os
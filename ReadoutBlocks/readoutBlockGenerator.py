@@ -1,7 +1,8 @@
 from mtrkReadoutBlockGenerator import *
+from SDL_read_write.sdlBinaryContainer import readSequenceFile, writeSequenceFile
+from SDL_read_write.sdlWriter import writeSdlFile
+from conversionProfiler import profiling
 import json
-import jsbeautifier
-import re
 
 inputFilename = 'C:/Users/artiga02/mtrk_designer_gui/app/mtrk_designer_api/mtrk_designer_api.mtrk'
 readoutList = ["cartesian", "radial", "spiral", "epi"]
@@ -11,72 +12,83 @@ outputFilename = 'updated_sdl.mtrk'
 insertion_block = "block_spinEcho" # block name to insert 
 previous_block = "block_refocusing" # previous step name
 
+## Counting the SDL elements added by a readout generator
+def countAddedElements(profiler, sectionSizes, output_sequence):
+    for sectionName, sectionSize in sectionSizes.items():
+        profiler.setCounter(sectionName + "Added", 
+                            len(getattr(output_sequence, sectionName)) - sectionSize)
+
 ## Generating a readout block and inserting it in the base sequence
 ## Getting fov and resolution from base sequence
 def automaticReadoutBlockGenerator(readoutType = readoutType, inputFilename = inputFilename, 
-                          insertion_block = insertion_block, previous_block = previous_block):
-    ## Opening the base sequence file and loading it into a PulseSequence object
-    with open(inputFilename) as sdlFile:
-        sdlData = json.load(sdlFile)
-        base_sequence = PulseSequence(**sdlData)
+                          insertion_block = insertion_block, previous_block = previous_block,
+                          profile = None):
+    with profiling("automaticReadoutBlockGenerator", profile) as profiler:
+        ## Opening the base sequence file (.mtrk or .mtrkb) and loading it into a PulseSequence object
+        with profiler.stage("load"):
+            base_sequence = readSequenceFile(inputFilename)
+        sectionSizes = {sectionName: len(getattr(base_sequence, sectionName))
+                        for sectionName in ["objects", "arrays", "equations", "instructions"]}
 
-    ## Setting the fov and resolution according to the base sequence object
-    fov = base_sequence.infos.fov * 1e-2 # imaging field of view
-    resolution = base_sequence.infos.pelines # resolution
+        ## Setting the fov and resolution according to the base sequence object
+        fov = base_sequence.infos.fov * 1e-2 # imaging field of view
+        resolution = base_sequence.infos.pelines # resolution
     
 
-    ## Adding the readout block to the base sequence
-    if readoutType == "cartesian":
-        print("+-+-+ Generating cartesian readout")
-        output_sequence = add_cartesian_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "radial":
-        print("+-+-+ Generating radial readout")
-        output_sequence = add_radial_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "spiral":
-        print("+-+-+ Generating spiral readout")
-        output_sequence = add_spiral_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "epi":
-        print("+-+-+ Generating epi readout")
-        output_sequence = add_epi_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+        ## Adding the readout block to the base sequence
+        with profiler.stage("readoutGeneration"):
+            if readoutType == "cartesian":
+                print("+-+-+ Generating cartesian readout")
+                output_sequence = add_cartesian_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "radial":
+                print("+-+-+ Generating radial readout")
+                output_sequence = add_radial_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "spiral":
+                print("+-+-+ Generating spiral readout")
+                output_sequence = add_spiral_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "epi":
+                print("+-+-+ Generating epi readout")
+                output_sequence = add_epi_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+        countAddedElements(profiler, sectionSizes, output_sequence)
 
-    ## Generating the output sequence file
-    with open(outputFilename, 'w') as sdlFileOut:
-        options = jsbeautifier.default_options()
-        options.indent_size = 4
-        data_to_print = jsbeautifier.beautify(json.dumps(output_sequence.model_dump(mode="json")), options)
-        sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) #purely aesthetic 
+        ## Generating the output sequence file (binary container if outputFilename ends with .mtrkb)
+        with profiler.stage("write"):
+            writeSequenceFile(output_sequence, outputFilename)
 
 ## Generating a readout block and inserting it in the base sequence
 ## Force setting fov and resolution
 def manualReadoutBlockGenerator(readoutType = readoutType, inputFilename = inputFilename, 
                           insertion_block = insertion_block, previous_block = previous_block,
-                          fov = 260, resolution = 128):
-    ## Opening the base sequence file and loading it into a PulseSequence object
-    with open(inputFilename) as sdlFile:
-        sdlData = json.load(sdlFile)
-        base_sequence = PulseSequence(**sdlData)
+                          fov = 260, resolution = 128, profile = None):
+    with profiling("manualReadoutBlockGenerator", profile) as profiler:
+        ## Opening the base sequence file and loading it into a PulseSequence object
+        with profiler.stage("load"):
+            with open(inputFilename) as sdlFile:
+                sdlData = json.load(sdlFile)
+                base_sequence = PulseSequence(**sdlData)
+        sectionSizes = {sectionName: len(getattr(base_sequence, sectionName))
+                        for sectionName in ["objects", "arrays", "equations", "instructions"]}
 
-    ## Setting the base sequence fov and resolution according to the provided values
-    base_sequence.infos.fov = fov # imaging field of view
-    fov = fov * 1e-2
-    base_sequence.infos.pelines = resolution # resolution (warning, this is not changing the iteration number for now)
+        ## Setting the base sequence fov and resolution according to the provided values
+        base_sequence.infos.fov = fov # imaging field of view
+        fov = fov * 1e-2
+        base_sequence.infos.pelines = resolution # resolution (warning, this is not changing the iteration number for now)
     
-    ## Adding the readout block to the base sequence
-    if readoutType == "cartesian":
-        output_sequence = add_cartesian_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "radial":
-        output_sequence = add_radial_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "spiral":
-        output_sequence = add_spiral_readout(base_sequence, insertion_block, previous_block, fov, resolution)
-    elif readoutType == "epi":
-        output_sequence = add_epi_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+        ## Adding the readout block to the base sequence
+        with profiler.stage("readoutGeneration"):
+            if readoutType == "cartesian":
+                output_sequence = add_cartesian_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "radial":
+                output_sequence = add_radial_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "spiral":
+                output_sequence = add_spiral_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+            elif readoutType == "epi":
+                output_sequence = add_epi_readout(base_sequence, insertion_block, previous_block, fov, resolution)
+        countAddedElements(profiler, sectionSizes, output_sequence)
 
-    ## Generating the output sequence file
-    with open(outputFilename, 'w') as sdlFileOut:
-        options = jsbeautifier.default_options()
-        options.indent_size = 4
-        data_to_print = jsbeautifier.beautify(json.dumps(output_sequence.model_dump(mode="json")), options)
-        sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) #purely aesthetic
+        ## Generating the output sequence file
+        with profiler.stage("write"):
+            writeSdlFile(output_sequence, outputFilename)
 
 ## Testing functions
 
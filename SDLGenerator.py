@@ -30,16 +30,14 @@
 ################################################################################   
 
 import json
-import jsbeautifier
-import re
 
+## The converters (matplotlib, pypulseq, scipy) are imported where they are 
+## called, so that loading and writing SDL files stays fast
 from miniFlashModifier import miniFlashModifier
 from mtrkConsoleUI import mtrkConsoleUI
-from camrieConverter import camrieConverter
-from mtrkToPulseqConverter import mtrkToPulseqConverter
-from pulseqToMtrk import pulseqToMtrk
 
 from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlWriter import writeSdlFile
 
 """@package docstring
 Documentation for this module.
@@ -176,20 +174,19 @@ equationList = [phaseEncodingEquation]
 # sequence_data = mtrkConsoleUI(sequence_data)
 
 ### converting SDL format to PSUdoMRI format
+# from camrieConverter import camrieConverter
 # camrieConverter(sequence_data)
 
 ### converting SDL format to Pulseq format
+from mtrkToPulseqConverter import mtrkToPulseqConverter
 mtrkToPulseqConverter(sequence_data)
 
 ### converting Pulseq format to SDL format
+# from pulseqToMtrk import pulseqToMtrk
 # pulseqToMtrk("sdl_pypulseq_test.seq")
 
 ### writing of json schema to SDL file with formatting options
 ## WARNING - The path needs to be adapted to your local implementation. 
-with open('test.mtrk', 'w') as sdlFileOut:
-    options = jsbeautifier.default_options()
-    options.indent_size = 4
-    data_to_print = jsbeautifier.beautify(json.dumps(sequence_data.model_dump(mode="json")), options)
-    sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) #purely aesthetic 
+writeSdlFile(sequence_data, 'test.mtrk')
   
   
\ No newline at end of file
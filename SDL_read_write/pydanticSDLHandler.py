@@ -10,7 +10,8 @@ from __future__ import annotations
 
 from typing import List, Optional, Union
 from typing_extensions import Literal, Any 
-from pydantic import BaseModel, SerializeAsAny, Extra, root_validator
+from pydantic import BaseModel, SerializeAsAny, Extra, root_validator, \
+                     field_serializer
 from decimal import Decimal
 
 ### file section
@@ -58,6 +59,9 @@ class Info(BaseModel):
 
 ### instructions section
 step_subclass_registry = {}
+## Step subclasses indexed by the set of their field names, the first 
+## registered subclass wins when two subclasses have the same fields
+step_dispatch_index = {}
 
 
 class Step(BaseModel):
@@ -67,6 +71,11 @@ class Step(BaseModel):
         super().__init_subclass__(**kwargs)
         step_subclass_registry[cls.__name__] = cls    
 
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        step_dispatch_index.setdefault(frozenset(cls.model_fields.keys()), cls)
+
     class Config:
         extra = "allow" 
 
@@ -76,18 +85,10 @@ class HasSteps():
         for index in range(len(kwargs['steps'])):
             current_step = kwargs['steps'][index]
             if isinstance(current_step, dict):
-                item_step_keys = sorted(current_step.keys())
-                for name, cls in step_subclass_registry.items():
-                    registery_step_keys = sorted(cls.model_fields.keys())
-                    if item_step_keys == registery_step_keys:
-                        try:
-                            current_step = cls(**current_step)
-                        except: 
-                            pass
-                        break
-                else:
+                cls = step_dispatch_index.get(frozenset(current_step.keys()))
+                if cls is None:
                     raise Exception(f"Unknown step action \"{current_step['action']}\"")
-                kwargs['steps'][index] = current_step
+                kwargs['steps'][index] = cls(**current_step)
         super().__init__(**kwargs)
 
     # def __init__(self, **kwargs):
@@ -272,6 +273,15 @@ class GradientTemplate(BaseModel):
     size: int = 9999
     data: List[float] = []
 
+    @field_serializer("data")
+    def serializeData(self, data):
+        ## data loaded by sdlArrayLoader is a NumPy buffer
+        if hasattr(data, "tolist"):
+            if data.dtype.itemsize < 8:
+                return [float(str(value)) for value in data]
+            return data.tolist()
+        return data
+
 
 ### equations section
 class Equation(BaseModel):
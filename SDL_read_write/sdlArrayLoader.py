@@ -0,0 +1,112 @@
+################################################################################
+### mtrk project - Fast SDL loader storing the data of the arrays section as ###
+###                contiguous NumPy buffers instead of lists of floats.      ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import json
+import mmap
+import re
+import numpy as np
+from SDL_read_write.pydanticSDLHandler import *
+
+## Start of a "data" list, the only list of numbers in the SDL arrays section
+dataListPattern = re.compile(rb'"data"\s*:\s*\[')
+## Characters that cannot appear in a flat list of numbers
+nonNumericPattern = re.compile(rb'[\[\{"a-df-zA-DF-Z]')
+
+def parseNumericList(listBytes, dtype = np.float64):
+    """
+    Parses the content of a JSON list of numbers into a NumPy array.
+
+    Args:
+        listBytes (bytes): The text between the brackets of the list.
+        dtype (numpy.dtype): The type of the returned array.
+
+    Returns:
+        numpy.ndarray: The parsed values.
+    """
+    if listBytes.strip() == b"":
+        return np.empty(0, dtype = dtype)
+    values = np.fromstring(listBytes.decode("ascii"), dtype = np.float64,
+                           sep = ",")
+    if values.size != listBytes.count(b",") + 1:
+        raise ValueError("Array data is not a valid list of numbers: "
+                         + listBytes[:50].decode("ascii", "replace") + "...")
+    return values.astype(dtype, copy = False)
+
+def splitArrayData(sdlBuffer, dtype = np.float64):
+    """
+    Extracts the numeric "data" lists from an SDL file buffer. Each list is
+    replaced by its index in the returned metadata text so that the JSON
+    parser only handles the small part of the file.
+
+    Args:
+        sdlBuffer (bytes or mmap.mmap): The content of the SDL file.
+        dtype (numpy.dtype): The type of the extracted arrays.
+
+    Returns:
+        bytes: The SDL text with the data lists replaced by indexes.
+        list: The extracted arrays in file order.
+    """
+    metadataParts = []
+    dataArrays = []
+    position = 0
+    for match in dataListPattern.finditer(sdlBuffer):
+        listStart = match.end()
+        listEnd = sdlBuffer.find(b"]", listStart)
+        if listEnd == -1:
+            break
+        listBytes = sdlBuffer[listStart:listEnd]
+        if nonNumericPattern.search(listBytes):
+            continue
+        metadataParts.append(sdlBuffer[position:match.start()])
+        metadataParts.append(b'"data": ' + str(len(dataArrays)).encode())
+        dataArrays.append(parseNumericList(listBytes, dtype))
+        position = listEnd + 1
+    metadataParts.append(sdlBuffer[position:])
+    return b"".join(metadataParts), dataArrays
+
+def loadSdlFileWithArrays(fileName, dtype = np.float64):
+    """
+    Loads an SDL file into a PulseSequence object whose arrays data are NumPy
+    buffers. The numbers are parsed directly from the memory-mapped file and
+    are not validated one by one by pydantic. model_dump() gives back the
+    same JSON as the standard loading for float64 arrays; float32 arrays use
+    half the memory and dump the shortest representation of each value.
+
+    Args:
+        fileName (str): The path of the .mtrk file.
+        dtype (numpy.dtype): np.float64 (default) or np.float32.
+
+    Returns:
+        PulseSequence: The loaded sequence.
+    """
+    with open(fileName, "rb") as sdlFile:
+        try:
+            sdlBuffer = mmap.mmap(sdlFile.fileno(), 0, access = mmap.ACCESS_READ)
+        except ValueError:
+            ## empty files cannot be memory-mapped
+            sdlBuffer = sdlFile.read()
+        try:
+            metadata, dataArrays = splitArrayData(sdlBuffer, dtype)
+        finally:
+            if isinstance(sdlBuffer, mmap.mmap):
+                sdlBuffer.close()
+    sdlData = json.loads(metadata)
+
+    arrayIndexes = {}
+    for arrayName, arrayData in sdlData.get("arrays", {}).items():
+        if type(arrayData.get("data")) == int:
+            arrayIndexes[arrayName] = arrayData["data"]
+            arrayData["data"] = []
+    if len(arrayIndexes) != len(dataArrays):
+        ## a "data" list was found outside of the arrays section
+        with open(fileName) as sdlFile:
+            return PulseSequence(**json.load(sdlFile))
+
+    sequence_data = PulseSequence(**sdlData)
+    for arrayName, arrayIndex in arrayIndexes.items():
+        sequence_data.arrays[arrayName].data = dataArrays[arrayIndex]
+    return sequence_data
@@ -0,0 +1,201 @@
+################################################################################
+### mtrk project - Binary companion format of SDL files (.mtrkb). A JSON     ###
+###                header holds all the SDL sections except the samples of   ###
+###                the arrays, which are stored as raw little-endian blocks  ###
+###                memory-mapped into NumPy when the file is loaded.         ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import json
+import struct
+import numpy as np
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlWriter import writeSdlFile
+
+## File layout:
+##   magic (8 bytes) | header size (uint64, little-endian) | JSON header
+##   | padding to 8 bytes | array blocks, each starting on 8 bytes
+## Block offsets in the header are relative to the start of the first block.
+binaryMagic = b"MTRKB\x00\x01\x00"
+binaryPrefix = struct.Struct("<8sQ")
+blockAlignment = 8
+sampleType = "<f8"
+
+def alignedSize(size):
+    """
+    Rounds a size up to the block alignment.
+
+    Args:
+        size (int): Size in bytes.
+
+    Returns:
+        int: The aligned size in bytes.
+    """
+    return (size + blockAlignment - 1) // blockAlignment * blockAlignment
+
+def isBinarySdlFile(fileName):
+    """
+    Checks whether a file is an SDL binary container.
+
+    Args:
+        fileName (str): The path of the file.
+
+    Returns:
+        bool: True if the file starts with the .mtrkb magic bytes.
+    """
+    with open(fileName, "rb") as sdlFile:
+        return sdlFile.read(len(binaryMagic)) == binaryMagic
+
+def writeBinarySdlFile(sequence_data, fileName):
+    """
+    Writes a PulseSequence object to a binary container.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to write.
+        fileName (str): The path of the .mtrkb file.
+
+    Returns:
+        None
+    """
+    sdlData = sequence_data.model_dump(mode = "json", exclude = {"arrays"})
+    sdlData["arrays"] = {}
+    blocks = {}
+    blockData = []
+    offset = 0
+    for arrayName, array in sequence_data.arrays.items():
+        samples = np.ascontiguousarray(array.data, dtype = sampleType)
+        sdlData["arrays"][arrayName] = array.model_dump(mode = "json",
+                                                        exclude = {"data"})
+        blocks[arrayName] = {"offset": offset,
+                             "count": int(samples.size),
+                             "dtype": sampleType}
+        blockData.append(samples)
+        offset += alignedSize(samples.nbytes)
+    header = json.dumps({"sdl": sdlData, "blocks": blocks}).encode("utf-8")
+    headerEnd = binaryPrefix.size + len(header)
+
+    with open(fileName, "wb") as sdlFile:
+        sdlFile.write(binaryPrefix.pack(binaryMagic, len(header)))
+        sdlFile.write(header)
+        sdlFile.write(b"\x00" * (alignedSize(headerEnd) - headerEnd))
+        for samples in blockData:
+            sdlFile.write(samples.tobytes())
+            sdlFile.write(b"\x00" * (alignedSize(samples.nbytes) - samples.nbytes))
+
+def loadBinarySdlFile(fileName):
+    """
+    Loads a binary container into a PulseSequence object. The arrays data
+    are copy-on-write views of the memory-mapped file: no sample is copied
+    at loading and modifying them does not change the file.
+
+    Args:
+        fileName (str): The path of the .mtrkb file.
+
+    Returns:
+        PulseSequence: The loaded sequence.
+    """
+    with open(fileName, "rb") as sdlFile:
+        magic, headerSize = binaryPrefix.unpack(sdlFile.read(binaryPrefix.size))
+        if magic != binaryMagic:
+            raise ValueError(f"{fileName} is not an SDL binary container.")
+        header = json.loads(sdlFile.read(headerSize))
+    blocksStart = alignedSize(binaryPrefix.size + headerSize)
+
+    sequence_data = PulseSequence(**header["sdl"])
+    if header["blocks"] == {}:
+        return sequence_data
+    fileMap = np.memmap(fileName, dtype = np.uint8, mode = "c")
+    for arrayName, block in header["blocks"].items():
+        blockStart = blocksStart + block["offset"]
+        blockEnd = blockStart + block["count"] * np.dtype(block["dtype"]).itemsize
+        if blockEnd > fileMap.size:
+            raise ValueError(f"{fileName}: data of array \"{arrayName}\" is "
+                             "truncated.")
+        sequence_data.arrays[arrayName].data = \
+                          fileMap[blockStart:blockEnd].view(block["dtype"])
+    return sequence_data
+
+def loadTextSdlFile(fileName):
+    """
+    Loads a JSON SDL file into a PulseSequence object.
+
+    Args:
+        fileName (str): The path of the .mtrk file.
+
+    Returns:
+        PulseSequence: The loaded sequence.
+    """
+    with open(fileName) as sdlFile:
+        sdlData = json.load(sdlFile)
+    return PulseSequence(**sdlData)
+
+def writeTextSdlFile(sequence_data, fileName):
+    """
+    Writes a PulseSequence object to a JSON SDL file.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to write.
+        fileName (str): The path of the .mtrk file.
+
+    Returns:
+        None
+    """
+    writeSdlFile(sequence_data, fileName)
+
+def readSequenceFile(fileName):
+    """
+    Loads an SDL file in JSON or binary format into a PulseSequence object.
+
+    Args:
+        fileName (str): The path of the .mtrk or .mtrkb file.
+
+    Returns:
+        PulseSequence: The loaded sequence.
+    """
+    if isBinarySdlFile(fileName):
+        return loadBinarySdlFile(fileName)
+    return loadTextSdlFile(fileName)
+
+def writeSequenceFile(sequence_data, fileName):
+    """
+    Writes a PulseSequence object in binary format if the file name ends with
+    .mtrkb, in JSON format otherwise.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to write.
+        fileName (str): The path of the .mtrk or .mtrkb file.
+
+    Returns:
+        None
+    """
+    if fileName.endswith(".mtrkb"):
+        writeBinarySdlFile(sequence_data, fileName)
+    else:
+        writeTextSdlFile(sequence_data, fileName)
+
+def convertMtrkToBinary(mtrkFileName, binaryFileName):
+    """
+    Converts a JSON SDL file to a binary container.
+
+    Args:
+        mtrkFileName (str): The path of the .mtrk file to convert.
+        binaryFileName (str): The path of the .mtrkb file to create.
+
+    Returns:
+        None
+    """
+    writeBinarySdlFile(loadTextSdlFile(mtrkFileName), binaryFileName)
+
+def convertBinaryToMtrk(binaryFileName, mtrkFileName):
+    """
+    Converts a binary container to a JSON SDL file.
+
+    Args:
+        binaryFileName (str): The path of the .mtrkb file to convert.
+        mtrkFileName (str): The path of the .mtrk file to create.
+
+    Returns:
+        None
+    """
+    writeTextSdlFile(loadBinarySdlFile(binaryFileName), mtrkFileName)
@@ -0,0 +1,216 @@
+################################################################################
+### mtrk project - Compiler for the equations section of SDL files. Each     ###
+###                equation is parsed once and evaluated as a NumPy          ###
+###                expression over the ctr(i) and set(x) symbols.            ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import ast
+import numpy as np
+
+## Functions and constants that can be used in SDL equations
+equationFunctions = {"cos": np.cos,
+                     "sin": np.sin,
+                     "tan": np.tan,
+                     "arccos": np.arccos,
+                     "arcsin": np.arcsin,
+                     "arctan": np.arctan,
+                     "sqrt": np.sqrt,
+                     "exp": np.exp,
+                     "log": np.log,
+                     "abs": np.abs,
+                     "floor": np.floor,
+                     "ceil": np.ceil,
+                     "round": np.round,
+                     "pi": np.pi}
+
+allowedNodes = (ast.Expression, ast.BinOp, ast.UnaryOp, ast.Constant,
+                ast.Name, ast.Load, ast.Call, ast.Subscript, ast.Add, ast.Sub,
+                ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow, ast.USub,
+                ast.UAdd)
+
+
+class CounterSymbolTransformer(ast.NodeTransformer):
+    """
+    Rewrites the SDL symbols of a parsed equation: ctr(i) becomes a lookup in
+    the counter values and set(x) is replaced by the value of the setting.
+    """
+    def __init__(self, equationName, settings):
+        self.equationName = equationName
+        self.settings = settings
+        self.counters = set()
+
+    def visit_Call(self, node):
+        if isinstance(node.func, ast.Name) and node.func.id == "ctr":
+            if len(node.args) != 1 or \
+               not isinstance(node.args[0], ast.Constant) or \
+               type(node.args[0].value) != int:
+                raise ValueError(f"Equation \"{self.equationName}\": ctr() "
+                                 "expects a single integer counter number.")
+            counterNumber = node.args[0].value
+            self.counters.add(counterNumber)
+            return ast.Subscript(value = ast.Name(id = "_ctr", ctx = ast.Load()),
+                                 slice = ast.Constant(value = counterNumber),
+                                 ctx = ast.Load())
+        if isinstance(node.func, ast.Name) and node.func.id == "set":
+            if len(node.args) != 1 or not isinstance(node.args[0], ast.Name):
+                raise ValueError(f"Equation \"{self.equationName}\": set() "
+                                 "expects a single setting name.")
+            settingName = node.args[0].id
+            if self.settings is None or not hasattr(self.settings, settingName):
+                raise KeyError(f"Equation \"{self.equationName}\": setting "
+                               f"\"{settingName}\" not found in settings.")
+            return ast.Constant(value = int(getattr(self.settings, settingName)))
+        self.generic_visit(node)
+        if not isinstance(node.func, ast.Name) or \
+           node.func.id not in equationFunctions:
+            raise ValueError(f"Equation \"{self.equationName}\": unsupported "
+                             f"function call \"{ast.unparse(node.func)}\".")
+        return node
+
+
+class CompiledEquation():
+    """
+    SDL equation parsed once and stored as a compiled NumPy expression.
+    Counter values can be scalars or arrays, in which case the equation is
+    evaluated for all of them in a single vectorized call.
+    """
+    def __init__(self, equationName, equationString, settings = None):
+        self.name = equationName
+        self.equationString = equationString
+        try:
+            tree = ast.parse(equationString.strip(), mode = "eval")
+        except SyntaxError as error:
+            raise ValueError(f"Equation \"{equationName}\" is not a valid "
+                             f"expression: {equationString}") from error
+        transformer = CounterSymbolTransformer(equationName, settings)
+        tree = ast.fix_missing_locations(transformer.visit(tree))
+        for node in ast.walk(tree):
+            if not isinstance(node, allowedNodes):
+                raise ValueError(f"Equation \"{equationName}\": unsupported "
+                                 f"syntax \"{type(node).__name__}\".")
+            if isinstance(node, ast.Name) and node.id != "_ctr" and \
+               node.id not in equationFunctions:
+                raise ValueError(f"Equation \"{equationName}\": unknown "
+                                 f"symbol \"{node.id}\".")
+        self.counters = sorted(transformer.counters)
+        self.code = compile(tree, "<equation " + equationName + ">", "eval")
+
+    def evaluate(self, counterValues = None):
+        """
+        Evaluates the equation.
+
+        Args:
+            counterValues (dict): Counter values (int or ndarray) indexed by
+                                  counter number.
+
+        Returns:
+            float or ndarray: The value(s) of the equation.
+        """
+        if counterValues is None:
+            counterValues = {}
+        for counterNumber in self.counters:
+            if counterNumber not in counterValues:
+                raise KeyError(f"Equation \"{self.name}\": no value for "
+                               f"counter ctr({counterNumber}).")
+        return eval(self.code, {"__builtins__": {}, **equationFunctions},
+                    {"_ctr": counterValues})
+
+
+class EquationCompiler():
+    """
+    Compiles the equations of an SDL file on first use and caches them by
+    equation name.
+    """
+    def __init__(self, equations, settings = None):
+        self.equations = equations
+        self.settings = settings
+        self.compiledEquations = {}
+        self.loopValues = {}
+        ## Statistics reported by the conversion profiler
+        self.numberOfEvaluations = 0
+        self.loopValuesCacheHits = 0
+
+    def compile(self, equationName):
+        """
+        Returns the compiled version of an equation.
+
+        Args:
+            equationName (str): The name of the equation in the equations section.
+
+        Returns:
+            CompiledEquation: The compiled equation.
+        """
+        if equationName not in self.compiledEquations:
+            if equationName not in self.equations:
+                raise KeyError(f"Equation \"{equationName}\" not found in equations.")
+            self.compiledEquations[equationName] = CompiledEquation(
+                                       equationName,
+                                       self.equations[equationName].equation,
+                                       self.settings)
+        return self.compiledEquations[equationName]
+
+    def evaluate(self, equationName, counterValues = None):
+        """
+        Evaluates an equation for the given counter values.
+
+        Args:
+            equationName (str): The name of the equation.
+            counterValues (dict): Counter values indexed by counter number.
+
+        Returns:
+            float or ndarray: The value(s) of the equation.
+        """
+        self.numberOfEvaluations += 1
+        return self.compile(equationName).evaluate(counterValues)
+
+    def evaluateRange(self, equationName, counterNumber, counterRange,
+                      counterValues = None):
+        """
+        Evaluates an equation for every value of one counter in a single call.
+
+        Args:
+            equationName (str): The name of the equation.
+            counterNumber (int): The counter looping over its range.
+            counterRange (int): The number of values taken by the counter.
+            counterValues (dict): Values of the other counters.
+
+        Returns:
+            ndarray: The values of the equation, one per counter value.
+        """
+        loopCounterValues = dict(counterValues or {})
+        loopCounterValues[counterNumber] = np.arange(counterRange)
+        self.numberOfEvaluations += 1
+        values = self.compile(equationName).evaluate(loopCounterValues)
+        return np.broadcast_to(np.asarray(values, dtype = float),
+                               (counterRange,))
+
+    def evaluateInLoop(self, equationName, counterValues, counterNumber,
+                       counterRange):
+        """
+        Evaluates an equation inside a loop. The values for the whole range
+        of the loop counter are computed at once and reused for the following
+        iterations with the same outer counter values.
+
+        Args:
+            equationName (str): The name of the equation.
+            counterValues (dict): Counter values indexed by counter number.
+            counterNumber (int): The counter of the loop being executed.
+            counterRange (int): The range of the loop being executed.
+
+        Returns:
+            float: The value of the equation for the current iteration.
+        """
+        outerValues = tuple(sorted((number, value) for number, value
+                                   in counterValues.items()
+                                   if number != counterNumber))
+        key = (equationName, counterNumber, counterRange, outerValues)
+        if key not in self.loopValues:
+            self.loopValues[key] = self.evaluateRange(equationName,
+                                                      counterNumber,
+                                                      counterRange,
+                                                      dict(outerValues))
+        else:
+            self.loopValuesCacheHits += 1
+        return self.loopValues[key][counterValues[counterNumber]]
@@ -0,0 +1,265 @@
+################################################################################
+### mtrk project - Timing and hardware limits checker working directly on    ###
+###                the SDL description, before any conversion. Loop-         ###
+###                dependent gradient amplitudes are evaluated over the      ###
+###                whole counter range at once.                              ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import numpy as np
+from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlEquationCompiler import EquationCompiler
+
+## Hz/m per mT/m, as in the Pulseq converter
+gyromagneticRatio = 42577
+## Tolerance on times in seconds
+timeTolerance = 1e-9
+
+def collectLoopRanges(sequence_data, blockName = "main", loopRanges = None,
+                      blockLoopRanges = None):
+    """
+    Lists the ranges of the loops executed around each block. As in the
+    Pulseq converter, ctr(N) is the index of the N-th enclosing loop.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to check.
+        blockName (str): The block to start from.
+        loopRanges (list): Ranges of the loops around the block.
+        blockLoopRanges (dict): Result being filled.
+
+    Returns:
+        dict: For each block, the list of loop ranges of each path reaching it.
+    """
+    if loopRanges is None:
+        loopRanges = []
+    if blockLoopRanges is None:
+        blockLoopRanges = {}
+    blockLoopRanges.setdefault(blockName, [])
+    if loopRanges in blockLoopRanges[blockName]:
+        return blockLoopRanges
+    blockLoopRanges[blockName].append(loopRanges)
+
+    def visitSteps(steps, loopRanges):
+        for step in steps:
+            if step.action == "loop":
+                visitSteps(step.steps, loopRanges + [step.range])
+            elif step.action == "run_block":
+                collectLoopRanges(sequence_data, step.block, loopRanges,
+                                  blockLoopRanges)
+
+    visitSteps(sequence_data.instructions[blockName].steps, loopRanges)
+    return blockLoopRanges
+
+def evaluateOverLoops(equationCompiler, equationName, loopRanges):
+    """
+    Evaluates an equation for every combination of the enclosing loop
+    counters in a single broadcast NumPy call.
+
+    Args:
+        equationCompiler (EquationCompiler): The compiler of the sequence equations.
+        equationName (str): The name of the equation.
+        loopRanges (list): Ranges of the loops around the step.
+
+    Returns:
+        ndarray: The values of the equation.
+    """
+    counterValues = {}
+    for levelIndex, loopRange in enumerate(loopRanges):
+        shape = [1] * len(loopRanges)
+        shape[levelIndex] = loopRange
+        counterValues[levelIndex + 1] = np.arange(loopRange).reshape(shape)
+    return np.asarray(equationCompiler.evaluate(equationName, counterValues),
+                      dtype = float)
+
+def getArrayLimits(sequence_data):
+    """
+    Computes the peak value and the largest step between two samples of each
+    gradient array.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to check.
+
+    Returns:
+        dict: (peak, largest step) indexed by array name.
+    """
+    arrayLimits = {}
+    for arrayName, array in sequence_data.arrays.items():
+        if array.type == "complex_float":
+            continue
+        data = np.asarray(array.data, dtype = float)
+        if data.size == 0:
+            arrayLimits[arrayName] = (0.0, 0.0)
+        else:
+            arrayLimits[arrayName] = (float(np.abs(data).max()),
+                                      float(np.abs(np.diff(data)).max(initial = 0)))
+    return arrayLimits
+
+def isOnRaster(values, raster):
+    """
+    Checks whether values are multiples of a raster time, with the tolerance
+    of the pypulseq timing check.
+
+    Args:
+        values (ndarray): Times in seconds.
+        raster (float): Raster time in seconds.
+
+    Returns:
+        ndarray: True for the aligned values.
+    """
+    ratios = np.asarray(values, dtype = float) / raster
+    return np.abs(ratios - np.round(ratios)) < 1e-6
+
+def checkSequenceLimits(sequence_data, system):
+    """
+    Checks the raster alignment, the RF and ADC dead times and the gradient
+    amplitude and slew rate limits of an SDL sequence.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to check.
+        system (pypulseq.Opts): The system limits, with gradients in Hz/m and
+                                slew rates in Hz/m/s.
+
+    Returns:
+        tuple: True if no error was found, and the list of errors, each of
+               them a dict with the block, step, check and message. The step
+               of the steps nested in loops is the list of the step indexes
+               from the block down to the step.
+    """
+    equationCompiler = EquationCompiler(sequence_data.equations,
+                                        sequence_data.settings)
+    arrayLimits = getArrayLimits(sequence_data)
+    blockLoopRanges = collectLoopRanges(sequence_data)
+    errorReport = []
+
+    def reportError(blockName, stepIndex, check, message):
+        errorReport.append({"block": blockName, "step": stepIndex,
+                            "check": check, "message": message})
+
+    ## Objects: durations and dwell times
+    for objectName, currentObject in sequence_data.objects.items():
+        if currentObject.type == "rf":
+            dwellTime = currentObject.duration * 1e-6 / \
+                        sequence_data.arrays[currentObject.array].size
+            if not isOnRaster(dwellTime, system.rf_raster_time):
+                reportError(None, None, "RASTER", f"RF object {objectName}: dwell "
+                            f"time {dwellTime*1e6:g} us is not on the RF raster.")
+        elif currentObject.type == "adc":
+            dwellTime = currentObject.duration * 1e-6 / \
+                        (currentObject.samples * sequence_data.settings.readout_os)
+            if not isOnRaster(dwellTime, system.adc_raster_time):
+                reportError(None, None, "RASTER", f"ADC object {objectName}: dwell "
+                            f"time {dwellTime*1e9:g} ns is not on the ADC raster.")
+
+    def checkSteps(blockName, blockSteps, stepPath, stepLoopRanges):
+        """
+        Checks the steps of a block or of a loop body, which the converter
+        partitions into Pulseq blocks on its own, and recurses into the 
+        loops they contain.
+
+        Args:
+            blockName (str): The name of the block.
+            blockSteps (list): The steps to check.
+            stepPath (list): The indexes of the enclosing loop steps.
+            stepLoopRanges (list): The loop ranges of each path reaching
+                                   the steps, ctr(N) of the loops of the 
+                                   block following the ones of the path.
+        """
+        ## Steps nested in loops are reported by their path from the block
+        def stepReference(stepIndex):
+            return stepPath + [stepIndex] if stepPath != [] else stepIndex
+
+        steps = [(stepIndex, step) for stepIndex, step in enumerate(blockSteps)
+                 if "time" in dict(step)]
+        stepTimes = []
+        for stepIndex, step in steps:
+            if type(step.time) == EquationRef:
+                try:
+                    stepTimes.append(float(equationCompiler.evaluate(step.time.equation)))
+                except (KeyError, ValueError) as error:
+                    reportError(blockName, stepReference(stepIndex), "EQUATION", str(error))
+                    stepTimes.append(np.nan)
+            else:
+                stepTimes.append(step.time)
+        stepTimes = np.array(stepTimes, dtype = float) * 1e-6
+        actions = np.array([step.action for _, step in steps])
+        blockEnd = stepTimes[actions == "mark"].max() if np.any(actions == "mark") \
+                   else None
+
+        ## Raster alignment of all the steps of the block at once
+        rasters = np.array([{"rf": system.rf_raster_time,
+                             "adc": system.adc_raster_time,
+                             "mark": system.block_duration_raster
+                            }.get(action, system.grad_raster_time)
+                            for action in actions])
+        for position in np.flatnonzero(~isOnRaster(stepTimes, rasters) &
+                                       ~np.isnan(stepTimes)):
+            reportError(blockName, stepReference(steps[position][0]), "RASTER",
+                        f"{actions[position]} at {stepTimes[position]*1e6:g} us "
+                        "is not on its raster.")
+
+        for position, (stepIndex, step) in enumerate(steps):
+            startTime = stepTimes[position]
+            if step.action == "rf":
+                endTime = startTime + sequence_data.objects[step.object].duration*1e-6
+                if startTime < system.rf_dead_time - timeTolerance:
+                    reportError(blockName, stepReference(stepIndex), "RF_DEAD_TIME",
+                                f"RF starts at {startTime*1e6:g} us, before the "
+                                f"RF dead time ({system.rf_dead_time*1e6:g} us).")
+                if blockEnd is not None and \
+                   endTime + system.rf_ringdown_time > blockEnd + timeTolerance:
+                    reportError(blockName, stepReference(stepIndex), "RF_RINGDOWN_TIME",
+                                f"RF ends at {endTime*1e6:g} us, less than the "
+                                "ringdown time before the end of the block.")
+            elif step.action == "adc":
+                endTime = startTime + sequence_data.objects[step.object].duration*1e-6
+                if startTime < system.adc_dead_time - timeTolerance:
+                    reportError(blockName, stepReference(stepIndex), "ADC_DEAD_TIME",
+                                f"ADC starts at {startTime*1e6:g} us, before the "
+                                f"ADC dead time ({system.adc_dead_time*1e6:g} us).")
+                if blockEnd is not None and \
+                   endTime + system.adc_dead_time > blockEnd + timeTolerance:
+                    reportError(blockName, stepReference(stepIndex), "POST_ADC_DEAD_TIME",
+                                f"ADC ends at {endTime*1e6:g} us, less than the "
+                                "dead time before the end of the block.")
+            elif step.action == "grad":
+                currentObject = sequence_data.objects[step.object]
+                peak, largestStep = arrayLimits[currentObject.array]
+                if type(getattr(step, "amplitude", None)) == EquationRef:
+                    try:
+                        amplitudes = np.concatenate([np.ravel(evaluateOverLoops(
+                                                         equationCompiler,
+                                                         step.amplitude.equation,
+                                                         loopRanges))
+                                     for loopRanges in stepLoopRanges])
+                    except (KeyError, ValueError) as error:
+                        reportError(blockName, stepReference(stepIndex), "EQUATION", str(error))
+                        continue
+                    amplitude = float(np.abs(amplitudes).max(initial = 0))
+                else:
+                    amplitude = abs(currentObject.amplitude)
+                amplitude *= gyromagneticRatio
+                if amplitude * peak > system.max_grad:
+                    reportError(blockName, stepReference(stepIndex), "GRADIENT_AMPLITUDE",
+                                f"Gradient {step.object} reaches "
+                                f"{amplitude*peak/gyromagneticRatio:g} mT/m, above "
+                                f"{system.max_grad/gyromagneticRatio:g} mT/m.")
+                slewRate = amplitude * largestStep / system.grad_raster_time
+                if slewRate > system.max_slew:
+                    reportError(blockName, stepReference(stepIndex), "SLEW_RATE",
+                                f"Gradient {step.object} reaches "
+                                f"{slewRate/gyromagneticRatio*1e-3:g} T/m/s, above "
+                                f"{system.max_slew/gyromagneticRatio*1e-3:g} T/m/s.")
+
+        for stepIndex, step in enumerate(blockSteps):
+            if step.action == "loop":
+                checkSteps(blockName, step.steps, stepPath + [stepIndex],
+                           [loopRanges + [step.range] for loopRanges in stepLoopRanges])
+
+    for blockName, block in sequence_data.instructions.items():
+        ## Blocks never executed from main are not checked
+        if blockName not in blockLoopRanges:
+            continue
+        checkSteps(blockName, block.steps, [], blockLoopRanges[blockName])
+
+    return errorReport == [], errorReport
@@ -0,0 +1,171 @@
+################################################################################
+### mtrk project - Streaming writer of SDL files. Writes a PulseSequence     ###
+###                object section by section with the formatting of the      ###
+###                former jsbeautifier-based writer (4-space indentation,    ###
+###                objects of lists starting on new lines, arrays on one     ###
+###                line).                                                    ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import json
+from pydantic import BaseModel
+
+indentStep = "    "
+## Separator between two objects of a list, the former writer replaced
+## "}, {" by this string after beautifying the file (purely aesthetic)
+objectSeparator = ",\n            "
+
+def dumpScalar(value):
+    """
+    Formats a JSON scalar (string, number, boolean or null).
+
+    Args:
+        value: The value to format.
+
+    Returns:
+        str: The JSON text of the value.
+    """
+    text = json.dumps(value)
+    if type(value) == str:
+        text = text.replace("}, {", "}" + objectSeparator + "{")
+    return text
+
+def writeJsonValue(value, fileHandle, indent = ""):
+    """
+    Writes a JSON value (output of model_dump(mode="json")) to a file.
+
+    Args:
+        value: The value to write.
+        fileHandle (file): The file handle to write to.
+        indent (str): The indentation of the line where the value starts.
+
+    Returns:
+        None
+    """
+    if type(value) == dict:
+        writeJsonObject(value, fileHandle, indent)
+    elif type(value) == list:
+        writeJsonList(value, fileHandle, indent)
+    else:
+        fileHandle.write(dumpScalar(value))
+
+def writeJsonObject(value, fileHandle, indent):
+    """
+    Writes a JSON object with one key per line.
+
+    Args:
+        value (dict): The object to write.
+        fileHandle (file): The file handle to write to.
+        indent (str): The indentation of the line where the object starts.
+
+    Returns:
+        None
+    """
+    if value == {}:
+        fileHandle.write("{}")
+        return
+    itemIndent = indent + indentStep
+    separator = "{\n"
+    for key, item in value.items():
+        fileHandle.write(separator + itemIndent + dumpScalar(str(key)) + ": ")
+        writeJsonValue(item, fileHandle, itemIndent)
+        separator = ",\n"
+    fileHandle.write("\n" + indent + "}")
+
+def writeJsonList(value, fileHandle, indent):
+    """
+    Writes a JSON list. Lists of numbers are written on one line, lists of
+    objects start each object on a new line and lists containing lists put
+    each element on its own line.
+
+    Args:
+        value (list): The list to write.
+        fileHandle (file): The file handle to write to.
+        indent (str): The indentation of the line where the list starts.
+
+    Returns:
+        None
+    """
+    if value == []:
+        fileHandle.write("[]")
+        return
+    if any(type(item) == list for item in value):
+        itemIndent = indent + indentStep
+        separator = "[\n"
+        for item in value:
+            fileHandle.write(separator + itemIndent)
+            writeJsonValue(item, fileHandle, itemIndent)
+            separator = ",\n"
+        fileHandle.write("\n" + indent + "]")
+    elif any(type(item) == dict for item in value):
+        fileHandle.write("[")
+        for itemIndex in range(0, len(value)):
+            if itemIndex > 0:
+                if type(value[itemIndex - 1]) == dict and \
+                   type(value[itemIndex]) == dict:
+                    fileHandle.write(objectSeparator)
+                else:
+                    fileHandle.write(", ")
+            writeJsonValue(value[itemIndex], fileHandle, indent)
+        fileHandle.write("]")
+    elif any(type(item) == str for item in value):
+        fileHandle.write("[" + ", ".join(dumpScalar(item) for item in value) + "]")
+    else:
+        fileHandle.write(json.dumps(value))
+
+def writeSdlToFileHandle(sequence_data, fileHandle):
+    """
+    Writes a PulseSequence object to an open file, one section and one array
+    at a time.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to write.
+        fileHandle (file): The text file handle to write to.
+
+    Returns:
+        None
+    """
+    separator = "{\n"
+    for sectionName in type(sequence_data).model_fields:
+        fileHandle.write(separator + indentStep + dumpScalar(sectionName) + ": ")
+        separator = ",\n"
+        if sectionName != "arrays":
+            section = sequence_data.model_dump(mode = "json",
+                                               include = {sectionName})
+            writeJsonValue(section[sectionName], fileHandle, indentStep)
+            continue
+        ## arrays are dumped one by one to limit the memory used
+        if sequence_data.arrays == {}:
+            fileHandle.write("{}")
+            continue
+        arraySeparator = "{\n"
+        arrayIndent = indentStep * 2
+        for arrayName, array in sequence_data.arrays.items():
+            fileHandle.write(arraySeparator + arrayIndent +
+                             dumpScalar(arrayName) + ": ")
+            ## Tools editing the sections may store arrays as plain dicts
+            if isinstance(array, BaseModel):
+                arrayData = array.model_dump(mode = "json")
+            else:
+                arrayData = sequence_data.model_dump(
+                              mode = "json", include = {"arrays": {arrayName}}
+                              )["arrays"][arrayName]
+            writeJsonValue(arrayData, fileHandle, arrayIndent)
+            arraySeparator = ",\n"
+        fileHandle.write("\n" + indentStep + "}")
+    fileHandle.write("\n}" if separator == ",\n" else "{}")
+
+def writeSdlFile(sequence_data, fileName):
+    """
+    Writes a PulseSequence object to a JSON SDL file (.mtrk).
+
+    Args:
+        sequence_data (PulseSequence): The sequence to write.
+        fileName (str): The path of the file to create.
+
+    Returns:
+        None
+    """
+    with open(fileName, "w") as sdlFileOut:
+        writeSdlToFileHandle(sequence_data, sdlFileOut)
@@ -5,12 +5,11 @@
 ################################################################################  
 
 import json
-import jsbeautifier
-import re
 import ast
 from pprint import pprint
 from numpy import add
 from sdlFileCreator import *
+from SDL_read_write.sdlWriter import writeSdlFile
 import os
 import copy
 
@@ -40,11 +39,8 @@ def create_sdl_from_ui_inputs(block_to_box_objects, block_structure,
         None
     """
     ### Initialize SDL file
-    ## TO DO - need to intialize without loading file
-    file_path = os.path.abspath("mtrk_designer_api/init_data/miniflash.mtrk")
-    with open(file_path) as sdlFile:
-        sdlData = json.load(sdlFile)
-        sequence_data = PulseSequence(**sdlData)
+    ## All the sections are reset below, so no template file is read
+    sequence_data = PulseSequence()
     sdlInitialize(sequence_data)
 
     sequence_data.file = File()
@@ -72,13 +68,7 @@ def create_sdl_from_ui_inputs(block_to_box_objects, block_structure,
                   block_to_duration)
     
     ### writing of json schema to SDL file with formatting options
-    with open('output.mtrk', 'w') as sdlFileOut:
-        options = jsbeautifier.default_options()
-        options.indent_size = 4
-        data_to_print = jsbeautifier.beautify(\
-                     json.dumps(sequence_data.model_dump(mode="json")), options)
-        sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) 
-        #purely aesthetic
+    writeSdlFile(sequence_data, 'output.mtrk')
 
 def updateSDLFile(sequence_data, boxes, configurations, 
                   block_number_to_block_object, block_to_loops, block_structure,
@@ -0,0 +1,253 @@
+################################################################################
+### mtrk project - Batch conversion of SDL files to Pulseq. The files are    ###
+###                converted in parallel worker processes, each of them      ###
+###                importing pypulseq once, and files whose Pulseq output is ###
+###                up to date are skipped.                                   ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+## Extensions of the SDL files found in the input directories
+sdlFileExtensions = [".mtrk", ".mtrkb"]
+
+def findSdlFiles(inputs):
+    """
+    Lists the SDL files to convert.
+
+    Args:
+        inputs (list): Files, directories (all their SDL files are converted)
+                       or glob patterns.
+
+    Returns:
+        list: The sorted paths of the SDL files, without duplicates.
+    """
+    sdlFiles = set()
+    for inputPath in inputs:
+        if os.path.isdir(inputPath):
+            for fileName in os.listdir(inputPath):
+                if os.path.splitext(fileName)[1] in sdlFileExtensions:
+                    sdlFiles.add(os.path.join(inputPath, fileName))
+        elif os.path.isfile(inputPath):
+            sdlFiles.add(inputPath)
+        else:
+            sdlFiles.update(fileName for fileName in glob.glob(inputPath)
+                            if os.path.isfile(fileName))
+    return sorted(sdlFiles)
+
+def getOutputFileName(fileToConvert, outputDirectory = None):
+    """
+    Gives the name of the Pulseq file created from an SDL file.
+
+    Args:
+        fileToConvert (str): The SDL file.
+        outputDirectory (str): Directory of the Pulseq files, None to write
+                               them next to the SDL files.
+
+    Returns:
+        str: The path of the .seq file.
+    """
+    outputFile = os.path.splitext(fileToConvert)[0] + ".seq"
+    if outputDirectory is not None:
+        outputFile = os.path.join(outputDirectory, os.path.basename(outputFile))
+    return outputFile
+
+def isUpToDate(fileToConvert, outputFile):
+    """
+    Checks whether a Pulseq file is more recent than its SDL file.
+
+    Args:
+        fileToConvert (str): The SDL file.
+        outputFile (str): The Pulseq file.
+
+    Returns:
+        bool: True if the Pulseq file exists and is up to date.
+    """
+    return os.path.exists(outputFile) and \
+           os.path.getmtime(outputFile) >= os.path.getmtime(fileToConvert)
+
+def convertFile(fileToConvert, outputFile, fastArrayLoading = False,
+                streamingWriter = False, cacheDirectory = None):
+    """
+    Converts one SDL file, in a worker process. The Pulseq file is written
+    under a unique temporary name and renamed once complete, so that a failed
+    conversion never leaves an output considered up to date.
+
+    Args:
+        fileToConvert (str): The SDL file.
+        outputFile (str): The Pulseq file to create.
+        fastArrayLoading (bool): See mtrkToPulseqConverter.
+        streamingWriter (bool): See mtrkToPulseqConverter.
+        cacheDirectory (str): See mtrkToPulseqConverter.
+
+    Returns:
+        dict: The file names, the status ("converted" or "failed"), the
+              conversion time in seconds, and the error and the conversion
+              log of failed conversions.
+    """
+    from mtrkToPulseqConverter import mtrkToPulseqConverter
+    result = {"file": fileToConvert, "output": outputFile}
+    conversionLog = io.StringIO()
+    startTime = time.perf_counter()
+    partialFileHandle, partialFile = tempfile.mkstemp(
+                                         dir = os.path.dirname(os.path.abspath(outputFile)),
+                                         prefix = os.path.basename(outputFile) + ".",
+                                         suffix = ".partial.seq")
+    os.close(partialFileHandle)
+    ## mkstemp creates the file readable by its owner only
+    umask = os.umask(0)
+    os.umask(umask)
+    os.chmod(partialFile, 0o666 & ~umask)
+    try:
+        with contextlib.redirect_stdout(conversionLog):
+            mtrkToPulseqConverter(fileToConvert, partialFile,
+                                  fastArrayLoading = fastArrayLoading,
+                                  streamingWriter = streamingWriter,
+                                  cacheDirectory = cacheDirectory)
+        os.replace(partialFile, outputFile)
+        result["status"] = "converted"
+    except Exception:
+        if os.path.exists(partialFile):
+            os.remove(partialFile)
+        result["status"] = "failed"
+        result["error"] = traceback.format_exc()
+        result["log"] = conversionLog.getvalue()
+    result["time"] = time.perf_counter() - startTime
+    return result
+
+def importConverter():
+    """
+    Imports the converter and pypulseq once when a worker process starts.
+    """
+    import mtrkToPulseqConverter
+
+def batchMtrkToPulseqConverter(inputs, outputDirectory = None, numberOfWorkers = None,
+                               force = False, fastArrayLoading = False,
+                               streamingWriter = False, cacheDirectory = None):
+    """
+    Converts a batch of SDL files to Pulseq format in parallel.
+
+    Args:
+        inputs (list): Files, directories or glob patterns of the SDL files.
+        outputDirectory (str): Directory of the Pulseq files, None to write
+                               them next to the SDL files.
+        numberOfWorkers (int): Number of worker processes (number of CPUs by
+                               default).
+        force (bool): Converts the files whose output is up to date too.
+        fastArrayLoading (bool): See mtrkToPulseqConverter.
+        streamingWriter (bool): See mtrkToPulseqConverter.
+        cacheDirectory (str): See mtrkToPulseqConverter.
+
+    Returns:
+        list: The result of each file (see convertFile), skipped files have
+              the "skipped" status.
+    """
+    if outputDirectory is not None:
+        os.makedirs(outputDirectory, exist_ok = True)
+    results = []
+    filesToConvert = []
+    sdlFiles = findSdlFiles(inputs)
+    outputFiles = [getOutputFileName(fileToConvert, outputDirectory)
+                   for fileToConvert in sdlFiles]
+    ## SDL files sharing an output (foo.mtrk and foo.mtrkb, or same names in
+    ## different input directories) would overwrite each other
+    outputUsers = {}
+    for fileToConvert, outputFile in zip(sdlFiles, outputFiles):
+        outputKey = os.path.normcase(os.path.abspath(outputFile))
+        outputUsers.setdefault(outputKey, []).append(fileToConvert)
+    for fileToConvert, outputFile in zip(sdlFiles, outputFiles):
+        otherFiles = [otherFile for otherFile 
+                      in outputUsers[os.path.normcase(os.path.abspath(outputFile))]
+                      if otherFile != fileToConvert]
+        if otherFiles != []:
+            results.append({"file": fileToConvert, "output": outputFile,
+                            "status": "failed", "time": 0.0,
+                            "error": f"{outputFile} is also the output of "
+                                     f"{', '.join(otherFiles)}.", "log": ""})
+            print(f"failed     {fileToConvert} (output shared with "
+                  f"{', '.join(otherFiles)})")
+        elif not force and isUpToDate(fileToConvert, outputFile):
+            results.append({"file": fileToConvert, "output": outputFile,
+                            "status": "skipped", "time": 0.0})
+            print(f"skipped    {fileToConvert} (up to date)")
+        else:
+            filesToConvert.append((fileToConvert, outputFile))
+    if filesToConvert == []:
+        return results
+
+    numberOfWorkers = min(numberOfWorkers or os.cpu_count() or 1, len(filesToConvert))
+    with ProcessPoolExecutor(max_workers = numberOfWorkers,
+                             initializer = importConverter) as executor:
+        futures = [executor.submit(convertFile, fileToConvert, outputFile,
+                                   fastArrayLoading, streamingWriter, 
+                                   cacheDirectory)
+                   for fileToConvert, outputFile in filesToConvert]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"{result['status']:10s} {result['file']} ({result['time']:.2f} s)")
+            if result["status"] == "failed":
+                print(result["error"])
+    return results
+
+def printSummary(results):
+    """
+    Prints the number of converted, skipped and failed files.
+
+    Args:
+        results (list): The results of batchMtrkToPulseqConverter.
+    """
+    statuses = [result["status"] for result in results]
+    conversionTime = sum(result["time"] for result in results)
+    print(f"{statuses.count('converted')} converted, "
+          f"{statuses.count('skipped')} skipped, "
+          f"{statuses.count('failed')} failed "
+          f"({conversionTime:.2f} s of conversion)")
+    for result in results:
+        if result["status"] == "failed":
+            print("Failed: ", result["file"])
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Converts SDL files to Pulseq "
+                                                   "format in parallel.")
+    parser.add_argument("inputs", nargs = "+",
+                        help = "SDL files, directories or glob patterns.")
+    parser.add_argument("--output-directory",
+                        help = "Directory of the Pulseq files (next to the SDL "
+                               "files by default).")
+    parser.add_argument("--workers", type = int,
+                        help = "Number of worker processes.")
+    parser.add_argument("--force", action = "store_true",
+                        help = "Converts the files whose output is up to date.")
+    parser.add_argument("--fast-array-loading", action = "store_true",
+                        help = "Loads the arrays of .mtrk files as NumPy buffers.")
+    parser.add_argument("--streaming-writer", action = "store_true",
+                        help = "Writes the blocks to disk during the conversion.")
+    parser.add_argument("--cache-directory",
+                        help = "Directory of the conversion cache.")
+    parser.add_argument("--report", help = "JSON file where the results are saved.")
+    arguments = parser.parse_args()
+
+    results = batchMtrkToPulseqConverter(arguments.inputs,
+                                         outputDirectory = arguments.output_directory,
+                                         numberOfWorkers = arguments.workers,
+                                         force = arguments.force,
+                                         fastArrayLoading = arguments.fast_array_loading,
+                                         streamingWriter = arguments.streaming_writer,
+                                         cacheDirectory = arguments.cache_directory)
+    printSummary(results)
+    if arguments.report is not None:
+        with open(arguments.report, "w") as reportFile:
+            json.dump(results, reportFile, indent = 4)
+    sys.exit(1 if any(result["status"] == "failed" for result in results) else 0)
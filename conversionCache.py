@@ -0,0 +1,164 @@
+################################################################################
+### mtrk project - Persistent cache of the Pulseq files converted from SDL.  ###
+###                Entries are keyed by a canonical hash of the sequence,    ###
+###                the system limits and the converter version, and the      ###
+###                least recently used ones are evicted above a size limit.  ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+from pydantic import BaseModel
+
+## Default maximum size of the cache in bytes
+defaultCacheSize = 1 << 30
+
+def getSequenceHash(sequence_data):
+    """
+    Computes a canonical hash of a sequence. Arrays are hashed as float64
+    buffers so that a sequence gives the same hash whether its arrays were
+    loaded as lists or as NumPy buffers.
+
+    Args:
+        sequence_data (PulseSequence): The sequence.
+
+    Returns:
+        hashlib: The sha256 of the sequence, to be updated with other inputs.
+    """
+    sequenceHash = hashlib.sha256()
+    sequenceHash.update(json.dumps(sequence_data.model_dump(mode = "json",
+                                                            exclude = {"arrays"}),
+                                   sort_keys = True).encode())
+    for arrayName in sorted(sequence_data.arrays):
+        array = sequence_data.arrays[arrayName]
+        ## Arrays inserted by the readout generators are plain dicts
+        arrayFields = dict(array) if isinstance(array, BaseModel) else array
+        arrayHeader = {key: value for key, value in arrayFields.items() if key != "data"}
+        sequenceHash.update(json.dumps([arrayName, arrayHeader], sort_keys = True).encode())
+        sequenceHash.update(np.ascontiguousarray(arrayFields["data"],
+                                                 dtype = np.float64).tobytes())
+    return sequenceHash
+
+def getConversionKey(sequence_data, system, converterVersion):
+    """
+    Builds the cache key of a conversion.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to convert.
+        system (pypulseq.Opts): The system limits used for the conversion.
+        converterVersion (str): The version of the converter, changing it
+                                invalidates the cached files.
+
+    Returns:
+        str: The hexadecimal key of the conversion.
+    """
+    conversionHash = getSequenceHash(sequence_data)
+    conversionHash.update(json.dumps(sorted((key, repr(value)) for key, value
+                                            in vars(system).items())).encode())
+    conversionHash.update(converterVersion.encode())
+    return conversionHash.hexdigest()
+
+class ConversionCache():
+    """
+    Directory of converted .seq files named after their conversion key. The
+    modification time of an entry is its last use, used for the LRU eviction.
+    """
+    def __init__(self, directory, maximumSize = defaultCacheSize):
+        self.directory = directory
+        self.maximumSize = maximumSize
+        os.makedirs(directory, exist_ok = True)
+
+    def getEntryName(self, key):
+        """
+        Returns the path of the entry of a conversion key.
+
+        Args:
+            key (str): The conversion key.
+
+        Returns:
+            str: The path of the cached .seq file.
+        """
+        return os.path.join(self.directory, key + ".seq")
+
+    def lookup(self, key, outputFile):
+        """
+        Copies a cached Pulseq file to the output file.
+
+        Args:
+            key (str): The conversion key.
+            outputFile (str): The Pulseq file to create.
+
+        Returns:
+            bool: True if the conversion was cached.
+        """
+        entryName = self.getEntryName(key)
+        try:
+            shutil.copyfile(entryName, outputFile)
+            os.utime(entryName)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def store(self, key, seqFile):
+        """
+        Adds a converted Pulseq file to the cache and evicts the least
+        recently used entries if the cache is full. The entry is copied under
+        a temporary name first so that readers never see a partial file.
+
+        Args:
+            key (str): The conversion key.
+            seqFile (str): The converted Pulseq file.
+
+        Returns:
+            None
+        """
+        temporaryFile, temporaryName = tempfile.mkstemp(dir = self.directory,
+                                                        suffix = ".partial")
+        os.close(temporaryFile)
+        try:
+            shutil.copyfile(seqFile, temporaryName)
+            os.replace(temporaryName, self.getEntryName(key))
+        except BaseException:
+            os.remove(temporaryName)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache size is
+        below its maximum size.
+
+        Returns:
+            None
+        """
+        entries = []
+        with os.scandir(self.directory) as directoryEntries:
+            for entry in directoryEntries:
+                if entry.name.endswith(".seq"):
+                    entryStat = entry.stat()
+                    entries.append((entryStat.st_mtime, entryStat.st_size, entry.path))
+        cacheSize = sum(size for _, size, _ in entries)
+        for _, size, entryName in sorted(entries):
+            if cacheSize <= self.maximumSize:
+                break
+            try:
+                os.remove(entryName)
+            except FileNotFoundError:
+                pass
+            cacheSize -= size
+
+    def clear(self):
+        """
+        Removes all the entries of the cache.
+
+        Returns:
+            None
+        """
+        for fileName in os.listdir(self.directory):
+            if fileName.endswith(".seq"):
+                os.remove(os.path.join(self.directory, fileName))
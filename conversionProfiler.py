@@ -0,0 +1,186 @@
+################################################################################
+### mtrk project - Stage-level profiling of the conversion tools. A profiler ###
+###                records the duration of named stages, event counters and  ###
+###                the peak memory, and emits a JSON report.                 ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import contextlib
+import json
+import os
+import sys
+import time
+
+## Enables profiling when no argument is given: "1" writes the reports to
+## stderr, any other value is the path of a file the reports are appended to
+## (one JSON report per line).
+profileEnvironmentVariable = "MTRK_PROFILE"
+
+def getPeakMemory():
+    """
+    Returns the peak resident memory of the current process.
+
+    Returns:
+        float: The peak RSS in MB, None if it is not available (Windows).
+    """
+    if os.path.exists("/proc/self/status"):
+        with open("/proc/self/status") as statusFile:
+            for line in statusFile:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    ## resource only exists on Unix
+    try:
+        import resource
+    except ImportError:
+        return None
+    peakMemory = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    ## ru_maxrss is in bytes on macOS and in kB on Linux
+    return peakMemory / 1024**2 if sys.platform == "darwin" else peakMemory / 1024
+
+class ConversionProfiler():
+    """
+    Records the durations of the stages of a conversion and its counters.
+    Stages can be nested, each stage duration includes its nested stages.
+    """
+    def __init__(self, name, destination):
+        self.name = name
+        self.destination = destination
+        self.startTime = time.perf_counter()
+        self.stages = {}
+        self.counters = {}
+
+    @contextlib.contextmanager
+    def stage(self, stageName):
+        """
+        Times the code run in the context as a stage. Repeated stages are
+        accumulated.
+
+        Args:
+            stageName (str): The name of the stage.
+        """
+        startTime = time.perf_counter()
+        try:
+            yield self
+        finally:
+            stage = self.stages.setdefault(stageName, {"time": 0.0, "calls": 0})
+            stage["time"] += time.perf_counter() - startTime
+            stage["calls"] += 1
+            stage["peakMemory"] = getPeakMemory()
+
+    def count(self, counterName, increment = 1):
+        """
+        Increments a counter.
+
+        Args:
+            counterName (str): The name of the counter.
+            increment (int): The value to add.
+        """
+        self.counters[counterName] = self.counters.get(counterName, 0) + increment
+
+    def setCounter(self, counterName, value):
+        """
+        Sets a counter.
+
+        Args:
+            counterName (str): The name of the counter.
+            value (int): The value of the counter.
+        """
+        self.counters[counterName] = value
+
+    def report(self):
+        """
+        Returns the report of the profiler.
+
+        Returns:
+            dict: Name, total time (s), peak memory (MB), stages and counters.
+        """
+        return {"name": self.name,
+                "time": time.perf_counter() - self.startTime,
+                "peakMemory": getPeakMemory(),
+                "stages": self.stages,
+                "counters": self.counters}
+
+    def emit(self):
+        """
+        Writes the JSON report to stderr or appends it to the report file.
+        """
+        report = json.dumps(self.report())
+        if self.destination is True:
+            print(report, file = sys.stderr)
+        else:
+            with open(self.destination, "a") as reportFile:
+                reportFile.write(report + "\n")
+
+class DisabledProfiler():
+    """
+    Profiler doing nothing, used when profiling is disabled.
+    """
+    def stage(self, stageName):
+        return contextlib.nullcontext(self)
+
+    def count(self, counterName, increment = 1):
+        pass
+
+    def setCounter(self, counterName, value):
+        pass
+
+disabledProfiler = DisabledProfiler()
+## Profilers of the conversions being run, the last one is the active one
+profilerStack = []
+
+def activeProfiler():
+    """
+    Returns the profiler of the conversion being run.
+
+    Returns:
+        ConversionProfiler: The active profiler, or a disabled one.
+    """
+    return profilerStack[-1] if profilerStack != [] else disabledProfiler
+
+def getProfileDestination(profile = None):
+    """
+    Finds where the reports are written.
+
+    Args:
+        profile (bool or str): True for stderr, a file path, False to disable
+                               profiling or None to use MTRK_PROFILE.
+
+    Returns:
+        True, str or None: stderr, the report file or None if disabled.
+    """
+    if profile is None:
+        profile = os.environ.get(profileEnvironmentVariable, "")
+        if profile in ["", "0"]:
+            return None
+        if profile == "1":
+            return True
+    if profile is False:
+        return None
+    return profile
+
+@contextlib.contextmanager
+def profiling(name, profile = None):
+    """
+    Profiles the code run in the context and emits the report at the end.
+    Inside a profiled conversion, the active profiler is reused so that a
+    conversion calling another one gives a single report.
+
+    Args:
+        name (str): The name of the conversion.
+        profile (bool or str): See getProfileDestination.
+
+    Yields:
+        ConversionProfiler: The profiler (or a disabled one).
+    """
+    destination = getProfileDestination(profile)
+    if profilerStack != [] or destination is None:
+        yield activeProfiler()
+        return
+    profiler = ConversionProfiler(name, destination)
+    profilerStack.append(profiler)
+    try:
+        yield profiler
+    finally:
+        profilerStack.pop()
+        profiler.emit()
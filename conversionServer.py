@@ -0,0 +1,289 @@
+################################################################################
+### mtrk project - Local conversion server for the web UI backend. A pool of ###
+###                worker processes keeps pypulseq and the SDL models loaded ###
+###                between requests, and the results of recent requests are  ###
+###                kept in memory.                                           ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import argparse
+import collections
+import contextlib
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import numpy as np
+
+## Number of request latencies kept for the percentiles of each endpoint
+latencyHistorySize = 10000
+## Number of results kept in memory
+resultCacheSize = 128
+
+################################################################################
+## Functions run by the worker processes
+################################################################################
+
+def warmWorker():
+    """
+    Imports the converter and the SDL models when a worker process starts.
+    """
+    global mtrkToPulseqConverter, PulseSequence
+    import mtrkToPulseqConverter
+    from SDL_read_write.pydanticSDLHandler import PulseSequence
+
+def convertSdl(sdlText):
+    """
+    Converts an SDL sequence to Pulseq format.
+
+    Args:
+        sdlText (bytes): The SDL file content (JSON).
+
+    Returns:
+        tuple: The .seq file content and the timing check results (ok and
+               number of errors).
+    """
+    sequence_data = PulseSequence(**json.loads(sdlText))
+    with contextlib.redirect_stdout(io.StringIO()):
+        seq = mtrkToPulseqConverter.fillSequence(sequence_data, plot = False,
+                                                 write_seq = False,
+                                                 timingCheck = False,
+                                                 limitsCheck = False)
+    ok, error_report = seq.check_timing()
+    with tempfile.TemporaryDirectory() as temporaryDirectory:
+        seqFileName = os.path.join(temporaryDirectory, "sequence.seq")
+        mtrkToPulseqConverter.writeSequence(seq, sequence_data, seqFileName,
+                                            check_timing = False)
+        with open(seqFileName, "rb") as seqFile:
+            seqContent = seqFile.read()
+    return seqContent, {"ok": ok, "errors": len(error_report)}
+
+def checkSdl(sdlText):
+    """
+    Checks an SDL sequence against the system limits and converts it to
+    check the timing of the Pulseq blocks.
+
+    Args:
+        sdlText (bytes): The SDL file content (JSON).
+
+    Returns:
+        dict: Results of the SDL limits check and of the timing check.
+    """
+    sequence_data = PulseSequence(**json.loads(sdlText))
+    limitsOk, limitsReport = mtrkToPulseqConverter.checkSequenceLimits(
+                                sequence_data, mtrkToPulseqConverter.getSystemLimits())
+    with contextlib.redirect_stdout(io.StringIO()):
+        seq = mtrkToPulseqConverter.fillSequence(sequence_data, plot = False,
+                                                 write_seq = False,
+                                                 timingCheck = False,
+                                                 limitsCheck = False)
+    timingOk, timingReport = seq.check_timing()
+    return {"limits": {"ok": limitsOk, "errors": limitsReport},
+            "timing": {"ok": timingOk,
+                       "errors": [str(error) for error in timingReport]}}
+
+def previewSdl(sdlText, timeRange = None):
+    """
+    Computes the gradient and RF waveforms of an SDL sequence.
+
+    Args:
+        sdlText (bytes): The SDL file content (JSON).
+        timeRange (list): Start and end times in seconds, None for the whole
+                          sequence.
+
+    Returns:
+        dict: Times (s) and amplitudes of the x, y and z gradients (Hz/m)
+              and of the RF magnitude (Hz).
+    """
+    sequence_data = PulseSequence(**json.loads(sdlText))
+    with contextlib.redirect_stdout(io.StringIO()):
+        seq = mtrkToPulseqConverter.fillSequence(sequence_data, plot = False,
+                                                 write_seq = False,
+                                                 timingCheck = False,
+                                                 limitsCheck = False)
+    waveforms = seq.waveforms(append_RF = True, time_range = timeRange)
+    preview = {}
+    for channelName, waveform in zip(["x", "y", "z", "rf"], waveforms):
+        preview[channelName] = {"time": np.real(waveform[0]).tolist(),
+                                "amplitude": np.abs(waveform[1]).tolist()
+                                             if channelName == "rf"
+                                             else np.real(waveform[1]).tolist()}
+    return preview
+
+################################################################################
+## Server
+################################################################################
+
+class ConversionServer(ThreadingHTTPServer):
+    """
+    HTTP server dispatching the requests to a pool of warm worker processes.
+    Requests beyond the number of workers plus maximumPendingRequests are
+    rejected with 503 instead of queuing indefinitely.
+    """
+    daemon_threads = True
+
+    def __init__(self, address, numberOfWorkers = 2, maximumPendingRequests = 16):
+        super().__init__(address, ConversionRequestHandler)
+        self.executor = ProcessPoolExecutor(max_workers = numberOfWorkers,
+                                            initializer = warmWorker)
+        ## Starts the workers now so that the first request is warm too
+        for future in [self.executor.submit(time.sleep, 0)
+                       for _ in range(numberOfWorkers)]:
+            future.result()
+        self.requestSlots = threading.BoundedSemaphore(numberOfWorkers +
+                                                       maximumPendingRequests)
+        self.latencies = collections.defaultdict(
+                                lambda: collections.deque(maxlen = latencyHistorySize))
+        self.resultCache = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, key, function, *args):
+        """
+        Submits a request to the workers. Identical requests share the same
+        future, whether they are running or already done.
+
+        Args:
+            key (str): The hash of the request.
+            function (callable): The worker function.
+            *args: The arguments of the worker function.
+
+        Returns:
+            Future: The future of the result.
+        """
+        with self.lock:
+            if key in self.resultCache:
+                self.resultCache.move_to_end(key)
+                return self.resultCache[key]
+            future = self.executor.submit(function, *args)
+            self.resultCache[key] = future
+            if len(self.resultCache) > resultCacheSize:
+                self.resultCache.popitem(last = False)
+            return future
+
+    def discard(self, key):
+        with self.lock:
+            self.resultCache.pop(key, None)
+
+    def recordLatency(self, endpoint, latency):
+        with self.lock:
+            self.latencies[endpoint].append(latency)
+
+    def getStatistics(self):
+        """
+        Computes the latency percentiles of each endpoint.
+
+        Returns:
+            dict: Number of requests and p50, p90 and p99 latencies in
+                  milliseconds indexed by endpoint.
+        """
+        with self.lock:
+            latencies = {endpoint: np.array(values) * 1e3
+                         for endpoint, values in self.latencies.items()}
+        statistics = {}
+        for endpoint, values in latencies.items():
+            p50, p90, p99 = np.percentile(values, [50, 90, 99])
+            statistics[endpoint] = {"requests": len(values), "p50": p50,
+                                    "p90": p90, "p99": p99}
+        return statistics
+
+    def server_close(self):
+        super().server_close()
+        self.executor.shutdown()
+
+class ConversionRequestHandler(BaseHTTPRequestHandler):
+    """
+    Endpoints:
+        POST /convert: SDL JSON in, .seq file out (timing check result and
+                       number of errors in the X-Timing-Check header).
+        POST /check: SDL JSON in, limits and timing check results out.
+        POST /preview[?start=..&end=..]: SDL JSON in, waveforms out.
+        GET /stats: latency percentiles of each endpoint.
+    """
+    def log_message(self, format, *args):
+        pass
+
+    def sendResponse(self, status, content, contentType = "application/json",
+                     headers = None):
+        if contentType == "application/json":
+            content = json.dumps(content).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", contentType)
+        self.send_header("Content-Length", str(len(content)))
+        for header, value in (headers or {}).items():
+            self.send_header(header, value)
+        self.end_headers()
+        self.wfile.write(content)
+
+    def do_GET(self):
+        if urlparse(self.path).path == "/stats":
+            self.sendResponse(200, self.server.getStatistics())
+        else:
+            self.sendResponse(404, {"error": "Unknown endpoint."})
+
+    def do_POST(self):
+        startTime = time.perf_counter()
+        url = urlparse(self.path)
+        if url.path not in ["/convert", "/check", "/preview"]:
+            self.sendResponse(404, {"error": "Unknown endpoint."})
+            return
+        sdlText = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.server.requestSlots.acquire(blocking = False):
+            self.sendResponse(503, {"error": "Too many pending requests."})
+            return
+        try:
+            self.handleRequest(url, sdlText)
+        finally:
+            self.server.requestSlots.release()
+        self.server.recordLatency(url.path, time.perf_counter() - startTime)
+
+    def handleRequest(self, url, sdlText):
+        key = hashlib.sha256(url.path.encode() + url.query.encode() + sdlText).hexdigest()
+        if url.path == "/convert":
+            future = self.server.submit(key, convertSdl, sdlText)
+        elif url.path == "/check":
+            future = self.server.submit(key, checkSdl, sdlText)
+        else:
+            query = parse_qs(url.query)
+            timeRange = [float(query["start"][0]), float(query["end"][0])] \
+                        if "start" in query and "end" in query else None
+            future = self.server.submit(key, previewSdl, sdlText, timeRange)
+        try:
+            result = future.result()
+        except Exception:
+            ## Failed requests are not cached
+            self.server.discard(key)
+            self.sendResponse(400, {"error": traceback.format_exc()})
+            return
+        if url.path == "/convert":
+            seqContent, timingCheck = result
+            self.sendResponse(200, seqContent, "application/octet-stream",
+                              {"X-Timing-Check": json.dumps(timingCheck)})
+        else:
+            self.sendResponse(200, result)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Local SDL to Pulseq "
+                                                   "conversion server.")
+    parser.add_argument("--port", type = int, default = 8765)
+    parser.add_argument("--workers", type = int, default = 2,
+                        help = "Number of worker processes.")
+    parser.add_argument("--pending", type = int, default = 16,
+                        help = "Maximum number of requests waiting for a worker.")
+    arguments = parser.parse_args()
+    server = ConversionServer(("127.0.0.1", arguments.port), arguments.workers,
+                              arguments.pending)
+    print(f"mtrk conversion server listening on http://127.0.0.1:{arguments.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
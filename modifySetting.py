@@ -5,10 +5,9 @@
 ################################################################################   
 
 import json
-import jsbeautifier
-import re
 
 from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlWriter import writeSdlFile
 
 def modifySetting(inputFileName = 'se2d.mtrk', key = "TE", value = 20):
     """
@@ -27,11 +26,7 @@ def modifySetting(inputFileName = 'se2d.mtrk', key = "TE", value = 20):
     if key in str(sequence_data.settings):
         sequence_data.settings.set(key, value)
 
-    with open(inputFileName, 'w') as sdlFileOut:
-        options = jsbeautifier.default_options()
-        options.indent_size = 4
-        data_to_print = jsbeautifier.beautify(json.dumps(sequence_data.model_dump(mode="json")), options)
-        sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) #purely aesthetic 
+    writeSdlFile(sequence_data, inputFileName)
 
 ## Test
 #modifySetting(inputFileName='se2d.mtrk', key='TE', value=20000)
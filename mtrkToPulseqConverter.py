@@ -9,18 +9,49 @@ import re
 import math 
 import pypulseq
 import json
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
 from SDL_read_write.pydanticSDLHandler import *
+from SDL_read_write.sdlEquationCompiler import EquationCompiler
+from SDL_read_write.sdlArrayLoader import loadSdlFileWithArrays
+from SDL_read_write.sdlBinaryContainer import isBinarySdlFile, readSequenceFile
+from SDL_read_write.sdlLimitsChecker import checkSequenceLimits
+from pulseqStreamWriter import StreamingSequence
+from conversionProfiler import activeProfiler, profiling
+from conversionCache import ConversionCache, getConversionKey
 
 ## Name of the file to convert from mtrk to Pulseq format
 fileToConvert = 'C:/Users/artiga02/Downloads/output_sdl_file_radial.mtrk'
 outputFile = 'C:/Users/artiga02/Downloads/output_sdl_file_radial.seq'
 
-def mtrkToPulseqConverter(fileToConvert = "test.mtrk", outputFile = "test.seq"):
+## Version of the conversion, to be increased when the Pulseq output of a 
+## sequence changes (invalidates the conversion cache)
+converterVersion = "0.2.0"
+
+def mtrkToPulseqConverter(fileToConvert = "test.mtrk", outputFile = "test.seq",
+                          fastArrayLoading = False, numberOfWorkers = 1,
+                          streamingWriter = False, profile = None,
+                          cacheDirectory = None):
     """
     Converts the given sequence data to a Pulseq format.
 
     Args:
         sequence_data (dict): The sequence data to be converted.
+        fastArrayLoading (bool): Loads the arrays data of a .mtrk file as 
+                                 NumPy buffers (.mtrkb files always are).
+        numberOfWorkers (int): Number of processes converting the iterations
+                               of the outer loop in parallel.
+        streamingWriter (bool): Writes the blocks to disk during the 
+                                conversion instead of keeping them in memory.
+        profile (bool or str): Reports the duration of each stage of the
+                               conversion as JSON, to stderr (True) or to the
+                               given file. None uses the MTRK_PROFILE
+                               environment variable.
+        cacheDirectory (str): Directory of the conversion cache. The Pulseq
+                              file is copied from the cache if the sequence
+                              was already converted with the same system 
+                              limits and converter version. None disables 
+                              the cache.
 
     Returns:
         None
@@ -29,19 +60,61 @@ def mtrkToPulseqConverter(fileToConvert = "test.mtrk", outputFile = "test.seq"):
     print("mtrk file to convert: ", fileToConvert)
     print("Pulseq file to create: ", outputFile)
 
-    with open(fileToConvert) as sdlFile:
-        sdlData = json.load(sdlFile)
-        sequence_data = PulseSequence(**sdlData)
+    with profiling("mtrkToPulseqConverter", profile) as profiler:
+        with profiler.stage("load"):
+            if fastArrayLoading and not isBinarySdlFile(fileToConvert):
+                sequence_data = loadSdlFileWithArrays(fileToConvert)
+            else:
+                sequence_data = readSequenceFile(fileToConvert)
+
+        if cacheDirectory is not None:
+            ## pypulseq adds the .seq extension to the written file
+            if not outputFile.endswith(".seq"):
+                outputFile += ".seq"
+            with profiler.stage("cacheLookup"):
+                conversionCache = ConversionCache(cacheDirectory)
+                conversionKey = getConversionKey(sequence_data, getSystemLimits(),
+                                                 converterVersion + "/pypulseq " +
+                                                 pypulseq.__version__)
+                if conversionCache.lookup(conversionKey, outputFile):
+                    print("Pulseq file copied from the conversion cache")
+                    return
+
+        fillSequence(sequence_data, 
+                     plot=False, 
+                     write_seq=True,
+                     seq_filename=outputFile,
+                     numberOfWorkers=numberOfWorkers,
+                     streamingWriter=streamingWriter)
 
-    fillSequence(sequence_data, 
-                 plot=False, 
-                 write_seq=True,
-                 seq_filename=outputFile)
+        if cacheDirectory is not None:
+            conversionCache.store(conversionKey, outputFile)
+
+def getSystemLimits():
+    """
+    Returns the system specifications used for the conversion.
+
+    Returns:
+        pypulseq.Opts: The system specifications.
+    """
+    ## TO DO add these info to SDL
+    return pypulseq.Opts(max_grad = 28,
+                         grad_unit = "mT/m",
+                         max_slew = 200000,
+                         slew_unit = "T/m/s",
+                         rf_ringdown_time = 20e-6,
+                         rf_dead_time = 100e-6,
+                         adc_dead_time = 10e-6)
 
 def fillSequence(sequence_data, 
                  plot: bool, 
                  write_seq: bool, 
-                 seq_filename: str = "test.seq"):
+                 seq_filename: str = "test.seq",
+                 numberOfWorkers: int = 1,
+                 streamingWriter: bool = False,
+                 profile = None,
+                 timingCheck: bool = True,
+                 limitsCheck: bool = True):
     """
     Fills the sequence object with instructions and parameters based on the given sequence data.
 
@@ -50,107 +123,177 @@ def fillSequence(sequence_data,
         plot: A boolean indicating whether to plot the sequence.
         write_seq: A boolean indicating whether to write the sequence in Pulseq .seq format.
         seq_filename: The filename to use when writing the sequence in Pulseq .seq format.
+        numberOfWorkers: Number of processes converting the iterations of the 
+                         outer loop in parallel (1 for a serial conversion).
+        streamingWriter: A boolean indicating whether to write the blocks to disk
+                         during the conversion, keeping only the unique events 
+                         in memory. The sequence cannot be plotted in this mode.
+        profile: Reports the duration of each stage, the counters of the 
+                 conversion and the peak memory as JSON, to stderr (True) or 
+                 to the given file. None uses the MTRK_PROFILE environment 
+                 variable.
+        timingCheck: A boolean indicating whether to run the pypulseq timing 
+                     check and print its report.
+        limitsCheck: A boolean indicating whether to check the SDL description
+                     against the system limits and print its report.
 
     Returns:
-        None
+        pypulseq.Sequence: The converted sequence.
     """
 
-    ############################################################################
-    ## Creating new sequence object and system specifications
-    ############################################################################
+    with profiling("fillSequence", profile) as profiler:
+        ########################################################################
+        ## Creating new sequence object and system specifications
+        ########################################################################
 
-    seq = pypulseq.Sequence()
+        if streamingWriter:
+            if plot:
+                raise ValueError("The sequence cannot be plotted with the streaming writer.")
+            seq = StreamingSequence()
+        else:
+            seq = pypulseq.Sequence()
+        system = getSystemLimits()
 
-    ## TO DO add these info to SDL
-    system = pypulseq.Opts(max_grad = 28,
-                           grad_unit = "mT/m",
-                           max_slew = 200000,
-                           slew_unit = "T/m/s",
-                           rf_ringdown_time = 20e-6,
-                           rf_dead_time = 100e-6,
-                           adc_dead_time = 10e-6)
-
-    ############################################################################
-    ## Creating sequence structure from the SDL file
-    ############################################################################
+        ########################################################################
+        ## Checking the SDL description against the system limits
+        ########################################################################
 
-    loopCountersList = []
-    mainBlock = sequence_data.instructions["main"]
+        if limitsCheck:
+            with profiler.stage("limitsCheck"):
+                ok, error_report = checkSequenceLimits(sequence_data, system)
+            if ok:
+                print("SDL limits check passed successfully")
+            else:
+                print("SDL limits check failed. Error listing follows:")
+                [print(e) for e in error_report]
 
-    variables = sequence_data.settings
+        ########################################################################
+        ## Creating sequence structure from the SDL file
+        ########################################################################
+
+        loopCountersList = []
+        mainBlock = sequence_data.instructions["main"]
+
+        variables = sequence_data.settings
+
+        ## Equations are parsed once and evaluated from their compiled form
+        equationCompiler = EquationCompiler(sequence_data.equations, variables)
     
-    stepInfoList = extractStepInformation(
-                                        sequence_data = sequence_data, 
-                                        currentBlock = mainBlock, 
-                                        system = system,
-                                        loopCountersList = loopCountersList,
-                                        variables = variables,
-                                        seq = seq)
+        with profiler.stage("structureExtraction"):
+            stepInfoList = extractStepInformation(
+                                                sequence_data = sequence_data, 
+                                                currentBlock = mainBlock, 
+                                                system = system,
+                                                loopCountersList = loopCountersList,
+                                                variables = variables,
+                                                seq = seq,
+                                                equationCompiler = equationCompiler)
     
-    ## TO DO stabilize the code for the case a block contains only blocks/loops
-    counterRangeList = extractSequenceStructure(  
-                                        stepInfoList = stepInfoList, 
-                                        counterRange = 0, 
-                                        blockName = "main", 
-                                        counterRangeList = [])
-
-    executeLoopingStructure(counterRangeList, 
-                            [],
-                            variables, 
-                            seq, 
-                            system, 
-                            loopCountersList, 
-                            stepInfoList, 
-                            sequence_data,
-                            ctrList=[])
+            ## TO DO stabilize the code for the case a block contains only blocks/loops
+            counterRangeList = extractSequenceStructure(  
+                                                stepInfoList = stepInfoList, 
+                                                counterRange = 0, 
+                                                blockName = "main", 
+                                                counterRangeList = [])
+
+        ## Each block is compiled once and replayed for every counter value
+        blockCache = {}
+
+        with profiler.stage("blockBuilding"):
+            if numberOfWorkers > 1 and findParallelLoop(counterRangeList) is not None:
+                convertInParallel(sequence_data, counterRangeList, seq, numberOfWorkers)
+            else:
+                executeLoopingStructure(counterRangeList, 
+                                        [],
+                                        variables, 
+                                        seq, 
+                                        system, 
+                                        loopCountersList, 
+                                        stepInfoList, 
+                                        sequence_data,
+                                        ctrList=[],
+                                        blockCache=blockCache,
+                                        equationCompiler=equationCompiler)
+        profiler.setCounter("blocksAdded", seq.next_free_block_ID - 1)
+        profiler.setCounter("compiledBlocks", len(blockCache))
+        profiler.setCounter("equationsEvaluated", equationCompiler.numberOfEvaluations)
+        profiler.setCounter("loopValuesCacheHits", equationCompiler.loopValuesCacheHits)
     
-    ############################################################################
-    ## Checking timing
-    ############################################################################
+        ########################################################################
+        ## Checking timing
+        ########################################################################
 
-    ok, error_report = seq.check_timing()
-    if ok:
-        print("Timing check passed successfully")
-    else:
-        print("Timing check failed. Error listing follows:")
-        [print(e) for e in error_report]
+        if timingCheck:
+            with profiler.stage("timingCheck"):
+                ok, error_report = seq.check_timing()
+            if ok:
+                print("Timing check passed successfully")
+            else:
+                print("Timing check failed. Error listing follows:")
+                [print(e) for e in error_report]
     
-    ############################################################################
-    ## Plotting and reporting
-    ############################################################################
-    if plot:
-        seq.plot()
+        ########################################################################
+        ## Plotting and reporting
+        ########################################################################
+        if plot:
+            with profiler.stage("plot"):
+                seq.plot()
    
-    # seq.calculate_kspace()
+        # seq.calculate_kspace()
+
+        # Very optional slow step, but useful for testing during development e.g. 
+        # for the real TE, TR or for staying within slew-rate limits
+        # rep = seq.test_report()
+        # print(rep)
 
-    # Very optional slow step, but useful for testing during development e.g. 
-    # for the real TE, TR or for staying within slew-rate limits
-    # rep = seq.test_report()
-    # print(rep)
+        ########################################################################
+        ## Writitng the sequence in Pulseq .seq format
+        ########################################################################
 
-    ############################################################################
-    ## Writitng the sequence in Pulseq .seq format
-    ############################################################################
+        if write_seq:
+            ## The timing was already checked above
+            with profiler.stage("write"):
+                writeSequence(seq, sequence_data, seq_filename, 
+                              check_timing = not timingCheck)
 
+        return seq
+
+def writeSequence(seq, sequence_data, seq_filename, check_timing = True):
+    """
+    Sets the definitions of a converted sequence and writes it in Pulseq 
+    .seq format.
+
+    Args:
+        seq (pypulseq.Sequence): The converted sequence.
+        sequence_data (PulseSequence): The SDL sequence it was converted from.
+        seq_filename (str): The filename of the .seq file.
+        check_timing (bool): Runs the pypulseq timing check before writing.
+
+    Returns:
+        None
+    """
     slice_thickness = sequence_data.objects["rf_excitation"].thickness*1e-3
     fov = sequence_data.infos.fov*1e-3
-    if write_seq:
-        # Prepare the sequence output for the scanner
-        seq.set_definition(key="FOV", value=[fov, fov, slice_thickness])
-        seq.set_definition(key="Name", value=sequence_data.infos.seqstring)
-        seq.set_definition(key="EPI", value=1)
-        # seq.set_definition(key="RadiofrequencyRasterTime", value=seq.rfRasterTime)
-        # seq.set_definition(key="GradientRasterTime", value=1e-5)
-        # seq.set_definition(key="GradientRasterTime", value=seq.grad_raster_time)
-        # seq.set_definition(key="AdcRasterTime", value=seq.adc_raster_time)
-
-        seq.write(seq_filename)
+    # Prepare the sequence output for the scanner
+    seq.set_definition(key="FOV", value=[fov, fov, slice_thickness])
+    seq.set_definition(key="Name", value=sequence_data.infos.seqstring)
+    seq.set_definition(key="EPI", value=1)
+    # seq.set_definition(key="RadiofrequencyRasterTime", value=seq.rfRasterTime)
+    # seq.set_definition(key="GradientRasterTime", value=1e-5)
+    # seq.set_definition(key="GradientRasterTime", value=seq.grad_raster_time)
+    # seq.set_definition(key="AdcRasterTime", value=seq.adc_raster_time)
+
+    seq.write(seq_filename, check_timing = check_timing)
 
 ################################################################################
 ## Functions to convert from SDL to Pulseq
 ################################################################################
 
-def executeLoopingStructure(counterRangeList, indexList, variables, seq, system, loopCountersList, stepInfoList, sequence_data, ctrList):
+def executeLoopingStructure(counterRangeList, indexList, variables, seq, system, loopCountersList, stepInfoList, sequence_data, ctrList, blockCache = None, equationCompiler = None):
+    if blockCache is None:
+        blockCache = {}
+    if equationCompiler is None:
+        equationCompiler = EquationCompiler(sequence_data.equations, variables)
     if type(counterRangeList[0]) == int: 
         counterID = counterRangeList[0]
         counterRange = counterRangeList[1]
@@ -159,7 +302,7 @@ def executeLoopingStructure(counterRangeList, indexList, variables, seq, system,
         # print("+-+-+ Executing loop on counter ", counterID, " with range ", counterRange)
         for index2 in range(0, counterRange):
             indexList2 = indexList + [index2]
-            executeLoopingStructure(newCounterRangeList, indexList2, variables, seq, system, loopCountersList, stepInfoList, sequence_data, ctrList)
+            executeLoopingStructure(newCounterRangeList, indexList2, variables, seq, system, loopCountersList, stepInfoList, sequence_data, ctrList, blockCache, equationCompiler)
     else:
         for counterRange in counterRangeList:
             ctrID = counterRange[0]
@@ -170,17 +313,46 @@ def executeLoopingStructure(counterRangeList, indexList, variables, seq, system,
                                               system = system, 
                                               seq = seq, 
                                               variables = variables,
-                                              loopCountersList = loopCountersList)
+                                              loopCountersList = loopCountersList,
+                                              blockCache = blockCache,
+                                              equationCompiler = equationCompiler)
                 # print("+-+-+ Building Pulseq sequence for action index ", index)
                 buildPulseqSequence(seq = seq,
                                 indexList = indexList, 
                                 actionList = actionList, 
                                 stepInfoList = stepInfoList,
-                                ctrList = ctrList)
+                                ctrList = ctrList,
+                                equationCompiler = equationCompiler)
+
+
+def partitionOverlappingEvents(eventSignatureList):
+    """
+    Sorts events in blocks according to their overlapping. The earliest 
+    remaining event starts a block gathering all the remaining events starting
+    before its end. As the events are sorted by start time, each block is the
+    next slice of the list, found with a binary search on the start times.
+
+    Args:
+        eventSignatureList (list): [eventIndex, startTime, endTime] of each 
+                                   event, sorted by start time.
 
+    Returns:
+        list: The indexes of the events of each block, in start time order.
+    """
+    startTimes = [signature[1] for signature in eventSignatureList]
+    eventIndexBlockList = []
+    blockStart = 0
+    while blockStart < len(eventSignatureList):
+        blockEnd = bisect_left(startTimes, eventSignatureList[blockStart][2], 
+                               lo = blockStart + 1)
+        eventIndexBlockList.append([signature[0] for signature 
+                                    in eventSignatureList[blockStart:blockEnd]])
+        blockStart = blockEnd
+    return eventIndexBlockList
 
 def extractStepInformation(sequence_data, currentBlock, system, 
-                           loopCountersList, variables, seq):
+                           loopCountersList, variables, seq,
+                           equationCompiler = None):
     """
     Extracts step information from the given sequence data and current block.
 
@@ -190,11 +362,14 @@ def extractStepInformation(sequence_data, currentBlock, system,
         system (System): The system object representing the MRI system.
         loopCountersList (list): The list of loop counters.
         seq (Sequence): The sequence object.
+        equationCompiler (EquationCompiler): The compiler of the sequence equations.
 
     Returns:
         list: A list containing the extracted step information, including event list, RF spoiling list,
               equations list, variable events list, RF spoiling increment, and event index block list.
     """
+    if equationCompiler is None:
+        equationCompiler = EquationCompiler(sequence_data.equations, variables)
     eventList = []
     rfSpoilingList = []
     allEquationsList = []
@@ -207,15 +382,7 @@ def extractStepInformation(sequence_data, currentBlock, system,
         if "time" in dict(currentBlock.steps[stepIndex]):
             if type(currentBlock.steps[stepIndex].time) == EquationRef:
                 equationName = currentBlock.steps[stepIndex].time.equation
-                equationString = sequence_data.equations[equationName].equation
-                equationString = re.sub(r'set\((\w+)\)',
-                       lambda m: str(int(getattr(variables, m.group(1), f"<missing:{m.group(1)}>"))),
-                       equationString)
-                equationString = equationString.replace("cos",
-                                                        "np.cos")
-                equationString = equationString.replace("sin",
-                                                        "np.sin")
-                delay = eval(equationString)
+                delay = equationCompiler.evaluate(equationName)
             else:
                 delay = currentBlock.steps[stepIndex].time
         if "object" in dict(currentBlock.steps[stepIndex]):
@@ -234,7 +401,8 @@ def extractStepInformation(sequence_data, currentBlock, system,
                                    system = system,
                                    loopCountersList = loopCountersList,
                                    variables = variables,
-                                   seq = seq)
+                                   seq = seq,
+                                   equationCompiler = equationCompiler)
                 loopEvent = ["loop", loopCounter, loopRange, loopStepInfoList]
                 eventList.append(loopEvent)
 
@@ -247,7 +415,8 @@ def extractStepInformation(sequence_data, currentBlock, system,
                                    system = system,
                                    loopCountersList = loopCountersList,
                                    variables = variables,
-                                   seq = seq)
+                                   seq = seq,
+                                   equationCompiler = equationCompiler)
                 eventList.append(["run_block", blockToRun, blockStepInfoList])
 
             case "calc":
@@ -308,10 +477,8 @@ def extractStepInformation(sequence_data, currentBlock, system,
                     else: 
                         equationName = \
                             currentBlock.steps[stepIndex].amplitude.equation
-                        equationString = \
-                            sequence_data.equations[equationName].equation                      
                         gradientAmplitude = 1
-                        allEquationsList.append(equationString)
+                        allEquationsList.append(equationName)
                         variableAmplitudeFlag = True
                 ## TO DO avoid the name dependency
                 for value in currentArray.data:
@@ -384,21 +551,7 @@ def extractStepInformation(sequence_data, currentBlock, system,
     eventSignatureList = sorted(eventSignatureList, key=lambda x: x[1])
 
     ## Sorting all events in blocks according to their overlapping
-    eventIndexBlockList = []
-    while eventSignatureList != []:
-        signature = eventSignatureList[0]
-        overlappingList = [signature[0]]
-        eventSignatureList.remove(signature)
-        for otherSignature in eventSignatureList:
-            if signature[1] <= otherSignature[2] and \
-               signature[2] > otherSignature[1]:
-                overlappingList.append(otherSignature[0])
-        for overlappingEventIndex in overlappingList:
-            for signatureFound in eventSignatureList:
-                if signatureFound[0] == overlappingEventIndex:
-                    eventSignatureList.remove(signatureFound)
-        eventIndexBlockList.append(overlappingList)
-
+    eventIndexBlockList = partitionOverlappingEvents(eventSignatureList)
 
     ## Modifying delays
     elapsedDurationList = []
@@ -415,13 +568,15 @@ def extractStepInformation(sequence_data, currentBlock, system,
             if eventList[eventIndex].delay < seq.grad_raster_time:
                 eventList[eventIndex].delay = 0.0
 
+    activeProfiler().count("eventsCreated", len([event for event in eventList
+                                                 if type(event) != list]))
     stepInfoList =  [eventList, rfSpoilingList, 
                      allEquationsList, variableEventsList, 
                      rfSpoilingInc, eventIndexBlockList]
     return stepInfoList
 
 def buildPulseqSequenceBlocks(indexList, seq, stepInfoList, normalizedWaveforms, 
-                              rf_inc, rf_phase, ctrList):
+                              rf_inc, rf_phase, ctrList, equationCompiler):
     """
     Builds Pulseq sequence blocks based on the given parameters.
 
@@ -432,6 +587,8 @@ def buildPulseqSequenceBlocks(indexList, seq, stepInfoList, normalizedWaveforms,
         normalizedWaveforms (ndarray): The normalized waveforms of variable events.
         rf_inc (float): The RF increment.
         rf_phase (float): The RF phase.
+        ctrList (list): The [counter, range] pairs of the executed loops.
+        equationCompiler (EquationCompiler): The compiler of the sequence equations.
 
     Returns:
         tuple: A tuple containing the updated stepInfoList, rf_inc, and rf_phase.
@@ -439,38 +596,33 @@ def buildPulseqSequenceBlocks(indexList, seq, stepInfoList, normalizedWaveforms,
     ## stepInfoList =  [eventList, rfSpoilingList, 
     ##                  allEquationsList, variableEventsList, 
     ##                  rfSpoilingInc, eventIndexBlockList]
+    ## ctr(N) takes the index of the N-th executed loop level
+    counterValues = {}
+    for levelIndex in range(0, len(indexList)):
+        counterValues[levelIndex+1] = indexList[levelIndex]
+    innerCounter = len(indexList)
+    for variableAmplitudeEventIndex in range(0, len(stepInfoList[3])):
+        equationName = stepInfoList[2][variableAmplitudeEventIndex]
+        ## The amplitudes of the whole innermost loop are evaluated at once
+        if innerCounter > 0 and len(ctrList) >= innerCounter:
+            amplitude = equationCompiler.evaluateInLoop(
+                                        equationName,
+                                        counterValues,
+                                        innerCounter,
+                                        ctrList[innerCounter-1][1])
+        else:
+            amplitude = equationCompiler.evaluate(equationName, counterValues)
+        variableAmplitudeEvent = \
+           stepInfoList[3][variableAmplitudeEventIndex]
+        gyromagneticRatio = 42577 # Hz/T converting mT/m to Hz/m
+        amplitude = amplitude*gyromagneticRatio
+        variableAmplitudeEvent.waveform = amplitude*(normalizedWaveforms[variableAmplitudeEventIndex])
+        ## Every non-zero amplitude reuses the shape registered for the first one
+        if hasattr(variableAmplitudeEvent, "normalizedShapeIDs") and amplitude != 0:
+            variableAmplitudeEvent.shape_IDs = variableAmplitudeEvent.normalizedShapeIDs
+        elif hasattr(variableAmplitudeEvent, "shape_IDs"):
+            del variableAmplitudeEvent.shape_IDs
     for blockList in stepInfoList[5]:
-        if stepInfoList[3] != []:
-            for variableAmplitudeEventIndex in range(0, len(stepInfoList[3])):
-                equationString = stepInfoList[2][variableAmplitudeEventIndex]
-                # print("+-+-+ Evaluating equation: ", equationString)
-                # print("     with counter values: ", ctrList)
-                counterNumberFound = False
-                stringCounterIndex = 0
-                while counterNumberFound == False:
-                    # print("+-+-+ Searching for counter ", stringCounterIndex)
-                    if "ctr(" + str(stringCounterIndex) + ")" in \
-                                                                 equationString:
-                        stringToReplace = \
-                                     str("ctr(" + str(stringCounterIndex) + ")")
-                        counterNumberFound = True
-                    stringCounterIndex += 1
-                # print("+-+-+ Replacing ", stringToReplace)
-                # print("+-+-+ index: ", indexList)
-                # print("+-+-+ stringToReplace: ", stringToReplace)
-                # print("+-+-+ replacement value: ", indexList[stringCounterIndex-2])
-                index = indexList[stringCounterIndex-2]
-                equationString = equationString.replace(stringToReplace,
-                                                            "index")
-                equationString = equationString.replace("cos",
-                                                        "np.cos")
-                equationString = equationString.replace("sin",
-                                                        "np.sin")
-                variableAmplitudeEvent = \
-                   stepInfoList[3][variableAmplitudeEventIndex]
-                gyromagneticRatio = 42577 # Hz/T converting mT/m to Hz/m
-                amplitude = eval(equationString)*gyromagneticRatio
-                variableAmplitudeEvent.waveform = amplitude*(normalizedWaveforms[variableAmplitudeEventIndex])
         listToAdd = []
         for blockIndex in range(0, len(blockList)):
             if stepInfoList[0][blockList[blockIndex]].type == "rf" and \
@@ -493,7 +645,32 @@ def buildPulseqSequenceBlocks(indexList, seq, stepInfoList, normalizedWaveforms,
                 seq.system.max_slew = seq.system.max_slew * 1e3
             listToAdd.append(stepInfoList[0][blockList[blockIndex]])
         seq.add_block(*listToAdd)
+        for variableAmplitudeEvent in stepInfoList[3]:
+            if any(variableAmplitudeEvent is event for event in listToAdd) and \
+               not hasattr(variableAmplitudeEvent, "shape_IDs") and \
+               np.any(variableAmplitudeEvent.waveform != 0):
+                variableAmplitudeEvent.normalizedShapeIDs = \
+                       getRegisteredShapeIDs(seq, variableAmplitudeEvent.channel)
     return stepInfoList, rf_inc, rf_phase
+
+def getRegisteredShapeIDs(seq, channel):
+    """
+    Returns the shape IDs of the gradient registered on a channel in the last
+    block of the sequence.
+
+    Args:
+        seq (Sequence): The Pulseq sequence object.
+        channel (str): The gradient channel ("x", "y" or "z").
+
+    Returns:
+        list: The waveform and time shape IDs of the gradient.
+    """
+    if isinstance(seq, StreamingSequence):
+        lastBlock = seq.lastBlock[1]
+    else:
+        lastBlock = seq.block_events[seq.next_free_block_ID - 1]
+    gradID = lastBlock[2 + ["x", "y", "z"].index(channel)]
+    return list(seq.grad_library.data[gradID][1:3])
                     
 def extractSequenceStructure(stepInfoList, counterRange, blockName, counterRangeList):
     """
@@ -572,24 +749,46 @@ def extractSequenceStructure(stepInfoList, counterRange, blockName, counterRange
 
     return counterRangeList
 
-def organizePulseqBlocks(sequence_data, counterRangeList, system, variables, seq, 
-                         loopCountersList):
+def getBlockCacheKey(blockName, variables):
+    """
+    Builds the key identifying a compiled block in the block cache.
+
+    Args:
+        blockName (str): The name of the instruction to compile.
+        variables (Settings): The sequence settings used in the block equations.
+
+    Returns:
+        tuple: The block name followed by the sorted settings items.
+    """
+    return (blockName, tuple(sorted(variables.model_dump().items())))
+
+def organizePulseqBlocks(sequence_data, counterRangeList, system, variables, seq,
+                         loopCountersList, blockCache = None,
+                         equationCompiler = None):
     """
     Organizes the Pulseq blocks based on the given sequence data, counter range list,
     system, sequence, and loop counters list.
 
+    Blocks are compiled once (events, block partition and delays) and stored in
+    blockCache, later calls with the same block and settings replay the cached
+    events instead of recreating them.
+
     Args:
         sequence_data (SequenceData): The sequence data containing instructions.
         counterRangeList (list): A list of counter ranges.
         system (System): The system information.
         seq (Sequence): The sequence information.
         loopCountersList (list): A list of loop counters.
+        blockCache (dict): Compiled blocks indexed by getBlockCacheKey.
+        equationCompiler (EquationCompiler): The compiler of the sequence equations.
 
     Returns:
         list: A list of action lists containing the counters, block step information,
               and normalized waveform.
 
     """
+    if blockCache is None:
+        blockCache = {}
     actionList = []
     for counter in counterRangeList:
         selected_action_index = 0
@@ -599,23 +798,32 @@ def organizePulseqBlocks(sequence_data, counterRangeList, system, variables, seq
             actionList.append([counter])
         elif sequence_data.instructions[counter[2]].steps[selected_action_index].action == "run_block":
             actionList.append([counter])
-        else: 
-            blockStepInfoList = extractStepInformation(
-                   sequence_data = sequence_data, 
-                   currentBlock = sequence_data.instructions[counter[2]], 
-                   system = system,
-                   loopCountersList = loopCountersList,
-                   variables = variables,
-                   seq = seq)
-            normalizedWaveforms = [] ## ???
-            if blockStepInfoList[3] != []:
-                for variableAmplitudeEvent in blockStepInfoList[3]:
-                    normalizedWaveforms.append(variableAmplitudeEvent.waveform)
+        else:
+            cacheKey = getBlockCacheKey(counter[2], variables)
+            if cacheKey not in blockCache:
+                activeProfiler().count("blockCacheMisses")
+                blockStepInfoList = extractStepInformation(
+                       sequence_data = sequence_data,
+                       currentBlock = sequence_data.instructions[counter[2]],
+                       system = system,
+                       loopCountersList = loopCountersList,
+                       variables = variables,
+                       seq = seq,
+                       equationCompiler = equationCompiler)
+                normalizedWaveforms = [] ## ???
+                if blockStepInfoList[3] != []:
+                    for variableAmplitudeEvent in blockStepInfoList[3]:
+                        normalizedWaveforms.append(variableAmplitudeEvent.waveform)
+                blockCache[cacheKey] = [blockStepInfoList, normalizedWaveforms]
+            else:
+                activeProfiler().count("blockCacheHits")
+            blockStepInfoList, normalizedWaveforms = blockCache[cacheKey]
             actionList.append([counter, blockStepInfoList, normalizedWaveforms])
 
     return actionList
 
-def buildPulseqSequence(seq, indexList, actionList, stepInfoList, ctrList):
+def buildPulseqSequence(seq, indexList, actionList, stepInfoList, ctrList,
+                        equationCompiler = None):
     """
     Builds a Pulseq sequence based on the given parameters.
 
@@ -624,6 +832,7 @@ def buildPulseqSequence(seq, indexList, actionList, stepInfoList, ctrList):
         actionIndex (int): The index of the current action in the actionList.
         actionList (list): The list of actions to be performed.
         stepInfoList (list): The list of step information.
+        equationCompiler (EquationCompiler): The compiler of the sequence equations.
 
     Returns:
         None
@@ -638,8 +847,225 @@ def buildPulseqSequence(seq, indexList, actionList, stepInfoList, ctrList):
             normalizedWaveforms = actionList[0][2], 
             rf_inc = rf_inc, 
             rf_phase = rf_phase,
-            ctrList = ctrList)
+            ctrList = ctrList,
+            equationCompiler = equationCompiler)
             
+################################################################################
+## Parallel conversion of the outer loop iterations
+################################################################################
+
+class FragmentSequence(pypulseq.Sequence):
+    """
+    Pulseq sequence converting a part of the outer loop in a worker process.
+    It records the order in which the events of each block are registered so
+    that the blocks can be merged in the final sequence with the same event 
+    and shape IDs as a serial conversion.
+    """
+    def __init__(self):
+        super().__init__()
+        self.eventOrders = []
+        self.gradientEventCount = 0
+
+    def add_block(self, *args):
+        eventSlots = []
+        for event in args:
+            if isinstance(event, float) or event.type == "delay":
+                continue
+            if event.type == "rf":
+                eventSlots.append(1)
+            elif event.type in ["grad", "trap"]:
+                eventSlots.append(2 + ["x", "y", "z"].index(event.channel))
+                if event.type == "grad":
+                    self.gradientEventCount += 1
+            elif event.type == "adc":
+                eventSlots.append(5)
+            else:
+                raise ValueError("Event type " + str(event.type) + 
+                                 " is not supported by the parallel conversion.")
+        self.eventOrders.append(eventSlots)
+        super().add_block(*args)
+
+def findParallelLoop(counterRangeList):
+    """
+    Finds the first loop level with more than one iteration, the level whose
+    iterations are split between the worker processes.
+
+    Args:
+        counterRangeList (list): The nested loop structure of the sequence.
+
+    Returns:
+        tuple: The [counter, range] pairs of the single-iteration levels above
+               it and the loop level itself, or None if there is no such level.
+    """
+    outerCounters = []
+    while type(counterRangeList[0]) == int:
+        if counterRangeList[1] > 1:
+            return outerCounters, counterRangeList
+        outerCounters.append([counterRangeList[0], counterRangeList[1]])
+        counterRangeList = counterRangeList[2]
+    return None
+
+def convertLoopIterations(sequence_data, startIndex, stopIndex, maxSlewUpdates):
+    """
+    Converts a range of iterations of the parallel loop level into a fragment
+    of Pulseq sequence. Runs in a worker process.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to convert.
+        startIndex (int): First iteration to convert.
+        stopIndex (int): Iteration after the last one to convert.
+        maxSlewUpdates (int): Number of gradient events converted before 
+                              startIndex, each of them scaling max_slew by 1e3.
+
+    Returns:
+        dict: The blocks and event libraries of the fragment.
+    """
+    seq = FragmentSequence()
+    for update in range(0, maxSlewUpdates):
+        if math.isinf(seq.system.max_slew):
+            break
+        seq.system.max_slew = seq.system.max_slew * 1e3
+    system = getSystemLimits()
+    loopCountersList = []
+    variables = sequence_data.settings
+    equationCompiler = EquationCompiler(sequence_data.equations, variables)
+    stepInfoList = extractStepInformation(
+                                        sequence_data = sequence_data, 
+                                        currentBlock = sequence_data.instructions["main"], 
+                                        system = system,
+                                        loopCountersList = loopCountersList,
+                                        variables = variables,
+                                        seq = seq,
+                                        equationCompiler = equationCompiler)
+    counterRangeList = extractSequenceStructure(stepInfoList = stepInfoList, 
+                                                counterRange = 0, 
+                                                blockName = "main", 
+                                                counterRangeList = [])
+    outerCounters, parallelLoop = findParallelLoop(counterRangeList)
+    ctrList = outerCounters + [[parallelLoop[0], parallelLoop[1]]]
+    blockCache = {}
+    for loopIndex in range(startIndex, stopIndex):
+        executeLoopingStructure(parallelLoop[2], 
+                                [0]*len(outerCounters) + [loopIndex],
+                                variables, 
+                                seq, 
+                                system, 
+                                loopCountersList, 
+                                stepInfoList, 
+                                sequence_data,
+                                ctrList=ctrList,
+                                blockCache=blockCache,
+                                equationCompiler=equationCompiler)
+
+    return {"blockEvents": list(seq.block_events.values()),
+            "blockDurations": list(seq.block_durations.values()),
+            "eventOrders": seq.eventOrders,
+            "gradientEventCount": seq.gradientEventCount,
+            "rfLibrary": (seq.rf_library.data, seq.rf_library.type),
+            "gradLibrary": (seq.grad_library.data, seq.grad_library.type),
+            "adcLibrary": seq.adc_library.data,
+            "shapeLibrary": seq.shape_library.data}
+
+def mergeSequenceFragment(seq, fragment):
+    """
+    Appends the blocks of a fragment to a sequence. Events and shapes are 
+    registered in the sequence libraries in block order, in the order they 
+    were registered in the fragment, which gives the same IDs as converting 
+    the blocks directly in the sequence.
+
+    Args:
+        seq (Sequence): The Pulseq sequence to complete.
+        fragment (dict): The fragment returned by convertLoopIterations.
+
+    Returns:
+        None
+    """
+    rfData, rfTypes = fragment["rfLibrary"]
+    gradData, gradTypes = fragment["gradLibrary"]
+    shapeIDs = {0: 0}
+    rfIDs = {}
+    gradIDs = {}
+    adcIDs = {}
+
+    def getShapeID(shapeID):
+        if shapeID not in shapeIDs:
+            shapeIDs[shapeID], _ = seq.shape_library.find_or_insert(
+                                            fragment["shapeLibrary"][shapeID])
+        return shapeIDs[shapeID]
+
+    for blockIndex in range(0, len(fragment["blockEvents"])):
+        fragmentBlock = fragment["blockEvents"][blockIndex]
+        if fragmentBlock[6] != 0:
+            raise ValueError("Block extensions are not supported by the "
+                             "parallel conversion.")
+        newBlock = np.zeros(7, dtype=np.int32)
+        for eventSlot in fragment["eventOrders"][blockIndex]:
+            eventID = fragmentBlock[eventSlot]
+            if eventSlot == 1:
+                if eventID not in rfIDs:
+                    data = rfData[eventID]
+                    data = (data[0], getShapeID(data[1]), getShapeID(data[2]), 
+                            getShapeID(data[3]), *data[4:])
+                    rfIDs[eventID], _ = seq.rf_library.find_or_insert(
+                                        new_data=data, data_type=rfTypes[eventID])
+                newBlock[eventSlot] = rfIDs[eventID]
+            elif eventSlot == 5:
+                if eventID not in adcIDs:
+                    adcIDs[eventID], _ = seq.adc_library.find_or_insert(
+                                                     new_data=fragment["adcLibrary"][eventID])
+                newBlock[eventSlot] = adcIDs[eventID]
+            else:
+                if eventID not in gradIDs:
+                    data = gradData[eventID]
+                    if gradTypes[eventID] == "g":
+                        data = (data[0], getShapeID(data[1]), getShapeID(data[2]), 
+                                *data[3:])
+                    gradIDs[eventID], _ = seq.grad_library.find_or_insert(
+                                        new_data=data, data_type=gradTypes[eventID])
+                newBlock[eventSlot] = gradIDs[eventID]
+        if isinstance(seq, StreamingSequence):
+            seq.appendBlock(newBlock, fragment["blockDurations"][blockIndex])
+        else:
+            seq.block_events[seq.next_free_block_ID] = newBlock
+            seq.block_durations[seq.next_free_block_ID] = fragment["blockDurations"][blockIndex]
+            seq.next_free_block_ID += 1
+
+def convertInParallel(sequence_data, counterRangeList, seq, numberOfWorkers):
+    """
+    Converts the iterations of the first loop level with more than one 
+    iteration in worker processes and merges them in order in the sequence.
+    The RF spoiling phase is reset for each executed block, as in the serial 
+    conversion, so no phase state has to be passed between workers.
+
+    Args:
+        sequence_data (PulseSequence): The sequence to convert.
+        counterRangeList (list): The nested loop structure of the sequence.
+        seq (Sequence): The Pulseq sequence to fill.
+        numberOfWorkers (int): Number of worker processes.
+
+    Returns:
+        None
+    """
+    loopRange = findParallelLoop(counterRangeList)[1][1]
+    ## The first iteration gives the number of gradient events per iteration
+    firstFragment = convertLoopIterations(sequence_data, 0, 1, 0)
+    gradientEventsPerIteration = firstFragment["gradientEventCount"]
+    chunkSize = math.ceil((loopRange - 1) / numberOfWorkers)
+    chunkStarts = list(range(1, loopRange, chunkSize))
+    with ProcessPoolExecutor(max_workers = numberOfWorkers) as executor:
+        futures = [executor.submit(convertLoopIterations, sequence_data, 
+                                   chunkStart, 
+                                   min(chunkStart + chunkSize, loopRange),
+                                   chunkStart * gradientEventsPerIteration)
+                   for chunkStart in chunkStarts]
+        fragments = [firstFragment] + [future.result() for future in futures]
+    for fragment in fragments:
+        mergeSequenceFragment(seq, fragment)
+    for update in range(0, loopRange * gradientEventsPerIteration):
+        if math.isinf(seq.system.max_slew):
+            break
+        seq.system.max_slew = seq.system.max_slew * 1e3
+
 ################################################################################
 ## Converting the file from mtrk to Pulseq format using command line for input
 ################################################################################
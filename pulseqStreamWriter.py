@@ -0,0 +1,302 @@
+################################################################################
+### mtrk project - Pulseq sequence writing its blocks to disk as they are    ###
+###                added. Only the event and shape libraries, which grow     ###
+###                with the number of unique events, are kept in memory.     ###
+### Version 0.2.0                                                            ###
+### Anais Artiges and the mtrk project team at NYU - 10/18/2026              ###
+################################################################################
+
+import hashlib
+import math
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from warnings import warn
+import numpy as np
+import pypulseq
+from pypulseq.Sequence.block import block_to_events
+from pypulseq.Sequence.write_seq import write as write_seq
+
+## Number of [BLOCKS] rows buffered before spilling them to disk
+blockBufferSize = 4096
+
+class StreamingSequence(pypulseq.Sequence):
+    """
+    Pulseq sequence writing its [BLOCKS] rows to a temporary file instead of
+    keeping them in block_events. Events are registered in the pypulseq
+    libraries like in add_block, without the gradient continuity checks, and
+    write() gives the same file as pypulseq.Sequence.write().
+    """
+    def __init__(self, system = None):
+        super().__init__(system = system)
+        ## Columns: rounded duration, rf, gx, gy, gz, adc, extensions
+        self.blockBuffer = []
+        self.blockSpill = tempfile.TemporaryFile()
+        self.numberOfBlocks = 0
+        self.totalDuration = 0
+        self.lastBlock = None
+        ## First block number of each unique block, for the timing check
+        self.uniqueBlocks = {}
+
+    def add_block(self, *args):
+        """
+        Registers the events of a block and spills the block to disk.
+
+        Args:
+            *args (SimpleNamespace): The events of the block.
+
+        Returns:
+            None
+        """
+        newBlock = np.zeros(7, dtype=np.int32)
+        duration = 0
+        for event in block_to_events(*args):
+            if isinstance(event, float):
+                duration = max(duration, event)
+            elif event.type == "rf":
+                newBlock[1], _ = self.register_rf_event(event)
+                duration = max(duration,
+                               event.shape_dur + event.delay + event.ringdown_time)
+            elif event.type == "grad":
+                newBlock[2 + ["x", "y", "z"].index(event.channel)], _ = \
+                                                   self.register_grad_event(event)
+                duration = max(duration, event.delay +
+                               math.ceil(event.tt[-1] / self.grad_raster_time - 1e-10)
+                               * self.grad_raster_time)
+            elif event.type == "trap":
+                newBlock[2 + ["x", "y", "z"].index(event.channel)] = \
+                                                      self.register_grad_event(event)
+                duration = max(duration, event.delay + event.rise_time +
+                               event.flat_time + event.fall_time)
+            elif event.type == "adc":
+                newBlock[5] = self.register_adc_event(event)
+                duration = max(duration,
+                               event.delay + event.num_samples * event.dwell +
+                               event.dead_time)
+            elif event.type == "delay":
+                duration = max(duration, event.delay)
+            else:
+                raise ValueError("Event type " + str(event.type) +
+                                 " is not supported by the streaming writer.")
+        self.appendBlock(newBlock, float(duration))
+
+    def appendBlock(self, newBlock, duration):
+        """
+        Appends a block whose events are already registered.
+
+        Args:
+            newBlock (ndarray): Library IDs of the events of the block, as in
+                                block_events.
+            duration (float): The block duration in seconds.
+
+        Returns:
+            None
+        """
+        roundedDuration = round(duration / self.block_duration_raster)
+        if abs(roundedDuration - duration / self.block_duration_raster) >= 1e-6:
+            raise ValueError("Block duration " + str(duration) + " s is not a "
+                             "multiple of the block duration raster.")
+        blockID = self.next_free_block_ID
+        self.blockBuffer.append([roundedDuration, *newBlock[1:]])
+        if len(self.blockBuffer) == blockBufferSize:
+            self.flushBlocks()
+        blockKey = (newBlock.tobytes(), duration)
+        if blockKey not in self.uniqueBlocks:
+            self.uniqueBlocks[blockKey] = (blockID, newBlock.copy(), duration)
+        self.lastBlock = (blockID, newBlock.copy(), duration)
+        self.totalDuration += duration
+        self.numberOfBlocks += 1
+        self.next_free_block_ID += 1
+
+    def flushBlocks(self):
+        """
+        Spills the buffered blocks to the temporary file.
+
+        Returns:
+            None
+        """
+        if self.blockBuffer != []:
+            np.array(self.blockBuffer, dtype=np.int64).tofile(self.blockSpill)
+            self.blockBuffer = []
+
+    def setTemporaryBlocks(self, blocks):
+        """
+        Sets the block_events of the sequence to the given blocks, to use the
+        pypulseq tools reading blocks on them.
+
+        Args:
+            blocks (list): (blockID, newBlock, duration) of each block.
+
+        Returns:
+            None
+        """
+        self.block_events = {blockID: newBlock for blockID, newBlock, _ in blocks}
+        self.block_durations = {blockID: duration for blockID, _, duration in blocks}
+        self.block_cache = {}
+
+    def check_timing(self, print_errors = False):
+        """
+        Checks the timing of each unique block once. Errors refer to the first
+        block with the same events and duration.
+
+        Args:
+            print_errors (bool): Prints the error report.
+
+        Returns:
+            tuple: Whether the timing is correct and the error report.
+        """
+        self.setTemporaryBlocks(self.uniqueBlocks.values())
+        try:
+            return super().check_timing(print_errors = print_errors)
+        finally:
+            self.setTemporaryBlocks([])
+
+    def removeDuplicates(self):
+        """
+        Rounds and deduplicates the libraries like
+        pypulseq.Sequence.remove_duplicates.
+
+        Returns:
+            tuple: The deduplicated rf, gradient, ADC and shape libraries and
+                   the ID mappings of the rf, gradient and ADC libraries.
+        """
+        shapeLibrary, shapeMapping = self.shape_library.remove_duplicates(9)
+        gradLibrary = pypulseq.event_lib.EventLibrary()
+        for gradID, data in self.grad_library.data.items():
+            if self.grad_library.type[gradID] == "g":
+                data = (data[0],) + (shapeMapping[data[1]], shapeMapping[data[2]]) \
+                       + data[3:]
+            gradLibrary.insert(gradID, data, self.grad_library.type[gradID])
+        rfLibrary = pypulseq.event_lib.EventLibrary()
+        for rfID, data in self.rf_library.data.items():
+            data = (data[0],) + (shapeMapping[data[1]], shapeMapping[data[2]],
+                                 shapeMapping[data[3]]) + data[4:]
+            rfLibrary.insert(rfID, data, self.rf_library.type[rfID])
+        gradLibrary, gradMapping = gradLibrary.remove_duplicates((6, -6, -6, -6, -6, -6))
+        rfLibrary, rfMapping = rfLibrary.remove_duplicates((6, 0, 0, 0, 6, 6, 6))
+        adcLibrary, adcMapping = self.adc_library.remove_duplicates((0, -9, -6, 6, 6, 6))
+        return rfLibrary, gradLibrary, adcLibrary, shapeLibrary, \
+               rfMapping, gradMapping, adcMapping
+
+    def writeBlocks(self, outputFile, columnMappings):
+        """
+        Writes the [BLOCKS] rows from the temporary file.
+
+        Args:
+            outputFile (file): The .seq file, opened in text mode.
+            columnMappings (list): Lookup arrays giving the written ID of each
+                                   library ID, for the rf, gx, gy, gz and ADC
+                                   columns.
+
+        Returns:
+            None
+        """
+        id_format_str = "{:" + str(len(str(self.numberOfBlocks))) + "d}" + \
+                        " {:3d} {:3d} {:3d} {:3d} {:3d} {:2d} {:2d}\n"
+        self.flushBlocks()
+        self.blockSpill.seek(0)
+        blockID = 1
+        while True:
+            blocks = np.fromfile(self.blockSpill, dtype=np.int64,
+                                 count=7*blockBufferSize).reshape(-1, 7)
+            if blocks.size == 0:
+                break
+            for column in range(0, 5):
+                blocks[:, column + 1] = columnMappings[column][blocks[:, column + 1]]
+            rows = "".join([id_format_str.format(blockID + rowIndex, *row)
+                            for rowIndex, row in enumerate(blocks.tolist())])
+            outputFile.write(rows)
+            blockID += len(blocks)
+
+    def write(self, name, create_signature = True, remove_duplicates = True,
+              check_timing = True):
+        """
+        Writes the sequence in Pulseq .seq format. The libraries and the
+        header are written by pypulseq and the [BLOCKS] rows are streamed
+        from the temporary file.
+
+        Args:
+            name (str): The name of the .seq file.
+            create_signature (bool): Adds the md5 signature of the file.
+            remove_duplicates (bool): Must be True, events are always
+                                      deduplicated as in pypulseq.
+            check_timing (bool): Warns about timing errors.
+
+        Returns:
+            str: The md5 signature if create_signature is True, None otherwise.
+        """
+        if not remove_duplicates:
+            raise ValueError("The streaming writer always removes duplicates.")
+        if check_timing:
+            is_ok, error_report = self.check_timing()
+            if not is_ok:
+                warn(f"write(): {len(error_report)} timing errors found in the sequence",
+                     stacklevel=2)
+        self.set_definition("TotalDuration", self.totalDuration)
+
+        self.setTemporaryBlocks([self.lastBlock])
+        lastBlock = self.get_block(self.lastBlock[0])
+        for channel, event in zip(("x", "y", "z"), (lastBlock.gx, lastBlock.gy, lastBlock.gz)):
+            if event is not None and event.type == "grad" and \
+               abs(event.last) > self.system.max_slew * self.system.grad_raster_time:
+                warn(f"write(): Gradient on channel {channel} in last sequence block "
+                     "does not ramp down to 0", stacklevel=2)
+        self.setTemporaryBlocks([])
+
+        rfLibrary, gradLibrary, adcLibrary, shapeLibrary, \
+                            rfMapping, gradMapping, adcMapping = self.removeDuplicates()
+        columnMappings = []
+        for mapping in [rfMapping, gradMapping, gradMapping, gradMapping, adcMapping]:
+            lookup = np.zeros(max(mapping) + 1, dtype=np.int64)
+            lookup[list(mapping.keys())] = list(mapping.values())
+            columnMappings.append(lookup)
+
+        fileName = Path(name)
+        if fileName.suffix != ".seq":
+            fileName = fileName.with_suffix(fileName.suffix + ".seq")
+
+        ## pypulseq writes the header and libraries of a block-less sequence
+        libraries = (self.rf_library, self.grad_library, self.adc_library,
+                     self.shape_library)
+        self.rf_library, self.grad_library, self.adc_library, self.shape_library = \
+                                      rfLibrary, gradLibrary, adcLibrary, shapeLibrary
+        temporaryDirectory = tempfile.mkdtemp()
+        try:
+            libraryFileName = os.path.join(temporaryDirectory, "libraries.seq")
+            write_seq(self, libraryFileName, create_signature = False,
+                      remove_duplicates = False)
+            with open(libraryFileName) as libraryFile:
+                header, libraries_text = libraryFile.read().split("[BLOCKS]\n", 1)
+        finally:
+            self.rf_library, self.grad_library, self.adc_library, self.shape_library = \
+                                                                               libraries
+            shutil.rmtree(temporaryDirectory)
+
+        with open(fileName, "w") as outputFile:
+            outputFile.write(header + "[BLOCKS]\n")
+            self.writeBlocks(outputFile, columnMappings)
+            outputFile.write(libraries_text)
+        if not create_signature:
+            return None
+
+        md5 = hashlib.md5()
+        with open(fileName, "rb") as outputFile:
+            for chunk in iter(lambda: outputFile.read(1 << 20), b""):
+                md5.update(chunk)
+        signature = md5.hexdigest()
+        with open(fileName, "a") as outputFile:
+            outputFile.write("\n[SIGNATURE]\n")
+            outputFile.write("# This is the hash of the Pulseq file, calculated right "
+                             "before the [SIGNATURE] section was added\n")
+            outputFile.write("# It can be reproduced/verified with md5sum if the file "
+                             "trimmed to the position right above [SIGNATURE]\n")
+            outputFile.write("# The new line character preceding [SIGNATURE] BELONGS "
+                             "to the signature (and needs to be stripped away for "
+                             "recalculating/verification)\n")
+            outputFile.write("Type md5\n")
+            outputFile.write(f"Hash {signature}\n")
+        self.signature_type = "md5"
+        self.signature_file = "text"
+        self.signature_value = signature
+        return signature
@@ -7,9 +7,7 @@
 from SDL_read_write.pydanticSDLHandler import *
 from simpleWaveformGenerator import *
 from ReadoutBlocks.mtrkReadoutBlockGenerator import add_cartesian_readout
-import json
-import jsbeautifier
-import re
+from SDL_read_write.sdlWriter import writeSdlFile
 
 def se2d_generator():
     """
@@ -425,8 +423,4 @@ se2d = se2d_generator()
 
 ### writing of json schema to SDL file with formatting options
 ## WARNING - The path needs to be adapted to your local implementation. 
-with open('se2d.mtrk', 'w') as sdlFileOut:
-    options = jsbeautifier.default_options()
-    options.indent_size = 4
-    data_to_print = jsbeautifier.beautify(json.dumps(se2d.model_dump(mode="json")), options)
-    sdlFileOut.write(re.sub(r'}, {', '},\n            {', data_to_print)) #purely aesthetic 
\ No newline at end of file
+writeSdlFile(se2d, 'se2d.mtrk') 
\ No newline at end of file
@@ -1,8 +1,8 @@
 import numpy as np
-import matplotlib.pyplot as plt
 # from sympy import rf
 from External import adiabatic
-from External import slr 
+## matplotlib and External.slr (scipy, sigpy) are imported where they are 
+## used to keep the import of the waveform designers light
 # print(slr.__file__)
 
 ## Adapted and extended from the Pulpy library by J.B. Martin (https://github.com/jonbmartin/pulpy/tree/master)
@@ -189,6 +189,7 @@ def ramp_sampled_trap_grad(area, gmax, slew, dt, *args):
     return np.expand_dims(normalized_trap, axis=0), amplitude, int(ramp_up_time), int(ramp_down_time), int(plateau_time)
 
 def test_trap_grad():
+    import matplotlib.pyplot as plt
     trap, ampl, ramp_up_time, ramp_down_time, plateau_duration = trap_grad(200, 200, 2560, 1e-5)
     # print(f"Ramp Up Time: {ramp_up_time} us, Ramp Down Time: {ramp_down_time} us, Plateau Time: {plateau_duration} us")
     plt.plot(trap[0]*ampl)
@@ -198,6 +199,7 @@ def test_trap_grad():
     plt.show()
 
 def test_min_trap_grad():   
+    import matplotlib.pyplot as plt
     morm_trap, ampl, ramp_up_time, ramp_down_time, plateau_duration = min_trap_grad(200e-5, 20, 200, 1e-5)
     # print(f"Ramp Up Time: {ramp_up_time} us, Ramp Down Time: {ramp_down_time} us, Plateau Time: {plateau_duration} us")
     plt.plot(morm_trap[0]*ampl)
@@ -207,6 +209,7 @@ def test_min_trap_grad():
     plt.show()
 
 def test_ramp_sampled_trap_grad():      
+    import matplotlib.pyplot as plt
     norm_trap, ampl, ramp_up_time, ramp_down_time, plateau_duration = ramp_sampled_trap_grad(200e-5, 20, 200, 1e-5)
     # print(f"Ramp Up Time: {ramp_up_time} us, Ramp Down Time: {ramp_down_time} us, Plateau Time: {plateau_duration} us")
     plt.plot(norm_trap[0]*ampl)
@@ -236,6 +239,8 @@ def pulse_designer(pulse_type, args):
         None: This function currently does not return any value.
     """
     print(f"Designing {pulse_type} RF pulse with arguments: {args}")
+    if pulse_type in ['slr', 'sinc']:
+        from External import slr
     match pulse_type:
         case 'slr':
             tb = args[0]        # RF pulse time-bandwidth product